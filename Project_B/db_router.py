@@ -0,0 +1,99 @@
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Set for the duration of views marked with @replica_reads
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+# [pinned] for the scope of a request (ReplicaPinMiddleware) or a use_replica() block, None outside of
+# one. Pinned for clients that wrote recently, and flipped in place by a write so the rest of that
+# scope reads its own writes; the flag goes away with the scope, so nothing carries over to later work.
+_primary_pin = contextvars.ContextVar('primary_pin', default=None)
+
+
+def replica_enabled():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """
+        Let reads inside the block go to the replica (when one is configured).
+        """
+    token = _replica_reads.set(True)
+    # Without an enclosing request scope, writes in the block pin the rest of the block only
+    pin_token = _primary_pin.set([False]) if _primary_pin.get() is None else None
+    try:
+        yield
+    finally:
+        if pin_token is not None:
+            _primary_pin.reset(pin_token)
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary(pinned=True):
+    """
+        Force every read inside the block onto the primary. Writes made inside the block
+        also pin, and leave the outer state untouched once it exits.
+        """
+    token = _primary_pin.set([pinned])
+    try:
+        yield
+    finally:
+        _primary_pin.reset(token)
+
+
+def replica_reads(view):
+    """
+        Mark a read-only view (function, or a CBV method via method_decorator) as safe to
+        serve from the replica.
+        """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+        Primary/replica router.
+
+        Reads go to the replica only inside views marked with @replica_reads, and never:
+        - inside a transaction on the primary (checkout, StockService, select_for_update),
+        - after this request has written anything,
+        - for clients pinned by ReplicaPinMiddleware after a recent POST.
+        Everything else, including all writes, Celery tasks and migrations, uses the primary.
+        """
+
+    def db_for_read(self, model, **hints):
+        pin = _primary_pin.get()
+        if not _replica_reads.get() or (pin and pin[0]) or not replica_enabled():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Read your own writes for the rest of the request; outside of any scope there is nothing to pin
+        pin = _primary_pin.get()
+        if pin is not None:
+            pin[0] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly
+        return db == DEFAULT_DB_ALIAS
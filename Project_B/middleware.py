@@ -1,6 +1,16 @@
+import cProfile
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
 from django.contrib import messages
+from django.db import connections
 from django.shortcuts import redirect
 
+from Project_B.db_router import pinned_to_primary, replica_enabled
+from src.core import profiling
+
 # Define a mapping of URL prefixes to required permissions
 # Each tuple contains a URL prefix and the permission codename required to access it
 URL_PERMISSIONS = [
@@ -42,14 +52,64 @@ LOGGED_OUT_ONLY_PATHS = [
 EXEMPT_PATHS_EXACT = ['/', '/about/']
 EXEMPT_PATHS_PREFIX = ['/media/', '/static/', '/__reload__/', '/reset/', '/activate/']
 
+SKIP_PREFIXES = ['/admin/', '/media/', '/__reload__/']
+
+# Access policies a path can be classified into
+PUBLIC = 'public'  # never looks at request.user
+GUEST_ONLY = 'guest_only'  # logged-out users only
+ADMIN = 'admin'  # superusers only
+CUSTOMER = 'customer'  # authenticated, non-staff users only
+AUTHENTICATED = 'authenticated'  # any logged-in user
+
+
+class RouteClassifier:
+    """
+        Maps a request path to an access policy with one pre-compiled regex.
+
+        Exact paths are tried before prefixes and longer prefixes before shorter ones,
+        so an exact exemption such as '/about/' wins over the '/about/' customer prefix.
+        """
+
+    def __init__(self, exact, prefixes, default):
+        alternatives = []
+        self.policies = {}
+
+        routes = [(path, policy, True) for path, policy in exact]
+        routes += sorted(((path, policy, False) for path, policy in prefixes), key=lambda r: -len(r[0]))
+
+        for index, (path, policy, is_exact) in enumerate(routes):
+            group = f"r{index}"
+            self.policies[group] = policy
+            # \Z, not $: '$' also matches before a trailing newline, so '/login/\n' would pass as '/login/'
+            end = r'\Z' if is_exact else ''
+            alternatives.append(f"(?P<{group}>{re.escape(path)}{end})")
+
+        self.pattern = re.compile("|".join(alternatives))
+        self.default = default
+
+    def classify(self, path):
+        match = self.pattern.match(path)
+        if match is None:
+            return self.default
+        return self.policies[match.lastgroup]
+
+
+ROUTE_CLASSIFIER = RouteClassifier(
+    exact=[(p, PUBLIC) for p in EXEMPT_PATHS_EXACT] + [(p, GUEST_ONLY) for p in LOGGED_OUT_ONLY_PATHS],
+    prefixes=[(p, PUBLIC) for p in SKIP_PREFIXES + EXEMPT_PATHS_PREFIX]
+             + [(p, ADMIN) for p in ADMIN_PREFIXES]
+             + [(p, CUSTOMER) for p in CUSTOMER_ONLY_PATHS],
+    default=AUTHENTICATED,
+)
+
 
 class PermissionMiddleware:
     """
         Middleware to enforce permission checks on URL requests.
-        - Allows superadmins (is_superadmin=True) to access all URLs.
+        - Classifies the path once with ROUTE_CLASSIFIER; public paths never touch request.user.
+        - Allows superadmins (is_superadmin=True) to access all non-customer URLs.
         - Redirects unauthenticated users to the login page.
-        - Skips checks for admin, media, and debug reload URLs.
-        - For other URLs, checks permissions; if none defined, allows authenticated users.
+        - Keeps staff/superusers out of customer routes and non-superusers out of the admin panel.
         """
 
     def __init__(self, get_response):
@@ -59,68 +119,58 @@ class PermissionMiddleware:
     def __call__(self, request):
         """
                 Process each request before it reaches the view.
-                - Skips checks for specific paths (admin, media, reload).
+                - Skips checks for public paths (admin, media, static, reload, exempt pages).
                 - Enforces authentication and permission rules.
                 """
-        path = request.path
+        policy = ROUTE_CLASSIFIER.classify(request.path)
 
-        # print("Path is these", path)
-        # 1. Skip admin, media, reload
-        if self.should_skip_checks(path):
+        # 1. Public paths: no session or user lookup at all
+        if policy == PUBLIC:
             return self.get_response(request)
 
+        user = request.user
+
         # 2. Allow superusers
-        if request.user.is_authenticated and request.user.is_superuser:
-            # print("super user")
-            if any(path.startswith(p) for p in CUSTOMER_ONLY_PATHS):
+        if user.is_authenticated and user.is_superuser:
+            if policy == CUSTOMER:
                 messages.warning(request, "Superusers cannot access customer routes.")
                 return redirect('admin-book-list')
             return self.get_response(request)
 
         # Allow logged-out-only paths only for unauthenticated users
-        if path in LOGGED_OUT_ONLY_PATHS:
-            if request.user.is_authenticated:
+        if policy == GUEST_ONLY:
+            if user.is_authenticated:
                 return redirect('home')  # logged-in users can't access these
             return self.get_response(request)
 
-        # Allow fully exempt paths for everyone
-        if path in EXEMPT_PATHS_EXACT or any(path.startswith(p) for p in EXEMPT_PATHS_PREFIX):
-            return self.get_response(request)
-
         #  Require authentication for other pages
-
-        if not request.user.is_authenticated:
+        if not user.is_authenticated:
             return redirect('login_view')
 
         # 6. Require extra permissions for admin-panel paths
-        if any(path.startswith(p) for p in ADMIN_PREFIXES):
+        if policy == ADMIN:
             # required_perm = self.get_required_permission(path)
             # if required_perm and not request.user.has_perm(required_perm):
             #     return HttpResponseForbidden("You don't have permission.")
-            if not request.user.is_superuser:
-                messages.error(request, "You are not allowed to access the admin panel.")
-                return redirect('home')
-
-                # return HttpResponseForbidden("You are not allowed to access the admin panel.")
+            messages.error(request, "You are not allowed to access the admin panel.")
+            return redirect('home')
 
         # 7. Check other permission-based URLs (optional)
         # required_perm = self.get_required_permission(path)
         # if required_perm and not request.user.has_perm(required_perm):
         #     return HttpResponseForbidden("You don't have permission.")
 
-        # Block staff/superusers from customer-facing routes
-        if request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser):
-            # print("Hello superuser or staff")
-            if any(path.startswith(p) for p in CUSTOMER_ONLY_PATHS):
-                messages.warning(request, "Admins and staff cannot access customer routes.")
-                return redirect('admin:index')
+        # Block staff from customer-facing routes
+        if policy == CUSTOMER and user.is_staff:
+            messages.warning(request, "Admins and staff cannot access customer routes.")
+            return redirect('admin:index')
 
         # 8. Fallback
         return self.get_response(request)
 
     @staticmethod
     def should_skip_checks(path):
-        return any(path.startswith(p) for p in ['/admin/', '/media/', '/__reload__/'])
+        return ROUTE_CLASSIFIER.classify(path) == PUBLIC
 
     @staticmethod
     def get_required_permission(path):
@@ -128,3 +178,72 @@ class PermissionMiddleware:
             if path.startswith(prefix):
                 return perm
         return None
+
+
+class ReplicaPinMiddleware:
+    """
+        Read-your-writes for ReplicaRouter.
+        - After an unsafe request (POST, PUT, DELETE, ...) the client gets a short lived cookie.
+        - While the cookie lives, all of that client's reads stay on the primary.
+        - Every request starts unpinned otherwise, whatever the previous request on this thread did.
+        """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_enabled():
+            return self.get_response(request)
+
+        with pinned_to_primary(settings.REPLICA_PIN_COOKIE in request.COOKIES):
+            response = self.get_response(request)
+
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class RequestProfilingMiddleware:
+    """
+        Runs cProfile over a request when src.core.profiling.profiling_trigger says so.
+        - Staff requests (query flag or signed header) always get a Server-Timing header with
+          db, cache, template and python time, and their profile is kept.
+        - Sampled requests never see the header; their profile is kept only when slower than
+          PROFILING_SLOW_MS.
+        Profiles are listed under "Request profiles" in the Django admin.
+        """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = profiling.profiling_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries = profiling.QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this thread
+                return self.get_response(request)
+            start = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+
+        ms = profiling.timings(profiler, seconds, queries)
+        if trigger == 'staff' or ms['total'] >= settings.PROFILING_SLOW_MS:
+            profiling.save_profile(request, response, profiler, trigger, ms, queries)
+        if trigger == 'staff':
+            response['Server-Timing'] = profiling.server_timing_header(ms)
+        return response
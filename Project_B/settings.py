@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -51,7 +52,6 @@ INSTALLED_APPS = [
     # 'src.users.apps.UsersConfig',
     'tailwind',
     'theme',
-    "debug_toolbar",
 
 ]
 AUTH_USER_MODEL = 'users.User'
@@ -62,6 +62,7 @@ NPM_BIN_PATH = "C:/nvm4w/nodejs/npm.cmd"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Project_B.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -69,15 +70,19 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'Project_B.middleware.PermissionMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
 ]
 
+# Profiles staff-flagged and sampled requests (src.core.profiling); needs request.user
+MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+                  'Project_B.middleware.RequestProfilingMiddleware')
+
 if DEBUG:
-    # Add django_browser_reload only in DEBUG mode
-    INSTALLED_APPS += ['django_browser_reload']
+    # Add django_browser_reload and the debug toolbar only in DEBUG mode
+    INSTALLED_APPS += ['django_browser_reload', 'debug_toolbar']
 
-    # Add django_browser_reload middleware only in DEBUG mode
+    # Add django_browser_reload and debug toolbar middleware only in DEBUG mode
     MIDDLEWARE += [
+        "debug_toolbar.middleware.DebugToolbarMiddleware",
         "django_browser_reload.middleware.BrowserReloadMiddleware",
     ]
 
@@ -127,8 +132,53 @@ DATABASES = {
     }
 }
 
+# Connection pooling (psycopg 3 + psycopg_pool through Django's OPTIONS['pool']).
+# Web and Celery processes get separately sized pools; DB_POOL_ROLE overrides the detection.
+DB_POOL_ROLE = os.getenv('DB_POOL_ROLE') or ('celery' if os.path.basename(sys.argv[0]).startswith('celery') else 'web')
+DB_POOL_SIZES = {
+    'web': (int(os.getenv('DB_POOL_WEB_MIN_SIZE', 2)), int(os.getenv('DB_POOL_WEB_MAX_SIZE', 10))),
+    'celery': (int(os.getenv('DB_POOL_CELERY_MIN_SIZE', 1)), int(os.getenv('DB_POOL_CELERY_MAX_SIZE', 4))),
+}
+
+# Validate a connection before handing it out (pool check / persistent connection ping)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if os.getenv('DB_POOL_ENABLED', '1') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_SIZES[DB_POOL_ROLE][0],
+            'max_size': DB_POOL_SIZES[DB_POOL_ROLE][1],
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),  # seconds to wait for a free connection
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),  # close connections idle this long
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),  # recycle connections this old
+        },
+    }
+else:
+    # Without a pool, keep connections open between requests instead
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+# Optional read replica: set DB_REPLICA_HOST and/or DB_REPLICA_NAME to enable it.
+# Only views marked with Project_B.db_router.replica_reads read from it.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['Project_B.db_router.ReplicaRouter']
+# Clients read from the primary for this long after a POST (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+REPLICA_PIN_COOKIE = 'db_pin'
+
 # smtp configurations
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Outgoing mail is buffered in core.OutgoingEmail and delivered in batches by the flush-email-outbox task
+EMAIL_BACKEND = 'src.core.mail.QueuedEmailBackend'
+EMAIL_DELIVERY_BACKEND = os.getenv('EMAIL_DELIVERY_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -136,6 +186,14 @@ EMAIL_HOST_USER = os.getenv('host_email')
 EMAIL_HOST_PASSWORD = os.getenv('host_password')
 DEFAULT_FROM_EMAIL = os.getenv('host_email')
 
+# email outbox (src.core.mail.flush_outbox)
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 100))
+EMAIL_RATE_LIMIT_PER_SECOND = float(os.getenv('EMAIL_RATE_LIMIT_PER_SECOND', 10))  # 0 disables
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+EMAIL_RETRY_BACKOFF_SECONDS = int(os.getenv('EMAIL_RETRY_BACKOFF_SECONDS', 60))
+EMAIL_SEND_LEASE_SECONDS = int(os.getenv('EMAIL_SEND_LEASE_SECONDS', 300))  # a claimed batch must be sent by then
+EMAIL_CONNECTION_MAX_AGE = int(os.getenv('EMAIL_CONNECTION_MAX_AGE', 300))
+
 # celery
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -144,6 +202,8 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'  # Match your TIME_ZONE setting
 USER_EXPIRATION_HOURS = float(os.getenv("USER_EXPIRATION_HOURS", 24))
+# Expired users notified and deleted per transaction by cleanup_expired_users
+USER_CLEANUP_BATCH_SIZE = int(os.getenv("USER_CLEANUP_BATCH_SIZE", 200))
 # USER_EXPIRATION_SECONDS = int(os.environ.get("USER_EXPIRATION_SECONDS", 3600 * 24))
 
 # Schedule periodic tasks with Celery Beat
@@ -154,10 +214,102 @@ CELERY_BEAT_SCHEDULE = {
         # For testing: run every 10 seconds
         'schedule': 10.0,  # seconds
     },
+    'flush-email-outbox': {
+        'task': 'src.core.tasks.flush_email_outbox',
+        'schedule': 5.0,  # seconds
+    },
+    'refresh-sales-rollups': {
+        'task': 'src.orders.tasks.refresh_sales_rollups',
+        'schedule': 300.0,  # every 5 minutes
+    },
+    'purge-recycle-bin': {
+        'task': 'src.books.tasks.purge_recycle_bin',
+        'schedule': crontab(hour=3, minute=0),  # daily, off peak
+    },
 }
 
+# Recycle bin: soft deleted rows are hard deleted this many days after deletion
+RECYCLE_BIN_RETENTION_DAYS = {
+    'books.Book': int(os.getenv("BOOK_RETENTION_DAYS", 30)),
+    'stock.Stock': int(os.getenv("STOCK_RETENTION_DAYS", 30)),
+}
+RECYCLE_BIN_PURGE_BATCH_SIZE = int(os.getenv("RECYCLE_BIN_PURGE_BATCH_SIZE", 100))
+
+# Sales rollups (src.orders.services.refresh_sales_rollups)
+SALES_ROLLUP_BATCH_SIZE = int(os.getenv("SALES_ROLLUP_BATCH_SIZE", 1000))
+# Sold events younger than this are picked up on the next run
+SALES_ROLLUP_SETTLE_SECONDS = int(os.getenv("SALES_ROLLUP_SETTLE_SECONDS", 60))
+
 # Site URL for activation links (use domain in production)
 SITE_URL = 'http://localhost:8000'  # Change to 'https://yourdomain.com' in prod
+# Cache (sessions, cached auth users)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+
+# Catalog reads (src.core.cache): a per-process LRU in front of the default cache
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))  # seconds a value stays fresh
+CATALOG_CACHE_STALE_SECONDS = int(os.getenv("CATALOG_CACHE_STALE_SECONDS", 60))  # served stale during a refresh
+CATALOG_CACHE_LOCK_SECONDS = int(os.getenv("CATALOG_CACHE_LOCK_SECONDS", 10))  # longest wait for another worker
+CATALOG_CACHE_LOCAL_ENTRIES = int(os.getenv("CATALOG_CACHE_LOCAL_ENTRIES", 1000))
+CATALOG_CACHE_LOCAL_TTL = int(os.getenv("CATALOG_CACHE_LOCAL_TTL", 30))
+CATALOG_CACHE_GENERATION_TTL = float(os.getenv("CATALOG_CACHE_GENERATION_TTL", 1))  # how late a process sees a bump
+
+# Storefront price slider statistics (src.stock.pricing), refreshed by price and availability changes
+PRICE_HISTOGRAM_BUCKETS = int(os.getenv("PRICE_HISTOGRAM_BUCKETS", 20))
+PRICE_STATS_TIMEOUT = int(os.getenv("PRICE_STATS_TIMEOUT", 3600))
+FACET_LIMIT = int(os.getenv("FACET_LIMIT", 10))  # storefront facet values shown per facet, besides picked ones
+CHOICE_PAGE_SIZE = int(os.getenv("CHOICE_PAGE_SIZE", 30))  # options per page of the book form's remote selects
+
+# Rendered storefront cards and pagination (src.books.fragments), keyed by the rows they show
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", 86400))
+FRAGMENT_CACHE_LOCAL_ENTRIES = int(os.getenv("FRAGMENT_CACHE_LOCAL_ENTRIES", 2000))
+
+# Bulk catalog import (src.books.importer): rows resolved and inserted per chunk, one transaction each
+CATALOG_IMPORT_CHUNK_SIZE = int(os.getenv("CATALOG_IMPORT_CHUNK_SIZE", 2000))
+CATALOG_IMPORT_REJECTS_DIR = os.getenv("CATALOG_IMPORT_REJECTS_DIR", "catalog_imports")  # under default storage
+# Admin uploads larger than this are stored and imported by a Celery task, which emails the results
+CATALOG_IMPORT_INLINE_MAX_BYTES = int(os.getenv("CATALOG_IMPORT_INLINE_MAX_BYTES", 5 * 1024 * 1024))
+
+# Cover and profile image derivatives (src.books.images): WebP and JPEG copies at each width, in pixels
+IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "160,320,640").split(',')]
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", 80))
+
+# Typeahead (src.books.autocomplete): prefix indexes over titles, authors, publishers and genres, built by a
+# beat task into the cache and loaded by each process
+AUTOCOMPLETE_LIMIT = int(os.getenv("AUTOCOMPLETE_LIMIT", 10))  # most suggestions one request gets
+AUTOCOMPLETE_SCAN_LIMIT = int(os.getenv("AUTOCOMPLETE_SCAN_LIMIT", 2000))  # larger matches are ranked at build time
+AUTOCOMPLETE_SYNC_SECONDS = float(os.getenv("AUTOCOMPLETE_SYNC_SECONDS", 1))  # how late a process sees a change
+AUTOCOMPLETE_DELTA_LIMIT = int(os.getenv("AUTOCOMPLETE_DELTA_LIMIT", 5000))  # changed rows before a rebuild
+AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", 3600))  # rebuild to refresh scores
+AUTOCOMPLETE_BUILD_TIMEOUT = int(os.getenv("AUTOCOMPLETE_BUILD_TIMEOUT", 600))  # lock of a process building a snapshot
+AUTOCOMPLETE_WARM_ON_START = os.getenv("AUTOCOMPLETE_WARM_ON_START", '1') == '1'  # load when a worker starts
+CELERY_BEAT_SCHEDULE['publish-autocomplete-snapshots'] = {
+    'task': 'src.books.tasks.publish_autocomplete_snapshots',
+    'schedule': float(AUTOCOMPLETE_REBUILD_SECONDS),
+}
+
+# Request profiling (Project_B.middleware.RequestProfilingMiddleware)
+PROFILING_QUERY_FLAG = '_profile'  # ?_profile=1 from a logged in staff member
+PROFILING_HEADER = 'X-Profile-Token'  # signed token from the "Request profiles" admin page
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE", 3600))
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))  # share of all requests, 0 disables
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", 500))  # sampled requests faster than this are dropped
+PROFILING_DIR = os.getenv("PROFILING_DIR", os.path.join(BASE_DIR, 'profiles'))
+PROFILING_KEEP = int(os.getenv("PROFILING_KEEP", 200))
+
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Users and their permission sets are cached by CachedModelBackend (src.users.backends). ModelBackend stays
+# listed for sessions signed in before it, which store its path; drop it once those have expired
+# (SESSION_COOKIE_AGE), as it also checks the password again after a failed login.
+AUTHENTICATION_BACKENDS = ['src.users.backends.CachedModelBackend', 'django.contrib.auth.backends.ModelBackend']
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", 300))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
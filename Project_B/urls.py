@@ -9,13 +9,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from debug_toolbar.toolbar import debug_toolbar_urls
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.urls import path, include
 
+from src.core.views import db_pool_stats
 from src.users.views import UserCreateView, UserLoginView, activate
 from . import views
 from .views import home_view, Dashboard
@@ -29,6 +29,7 @@ urlpatterns = [
                   path('admin-panel/', include('src.books.admin_urls')),
                   path('admin-panel/', include('src.orders.admin_urls')),
                   path('admin-panel/', include('src.stock.admin_urls')),
+                  path('admin-panel/db-pool/', db_pool_stats, name='db_pool_stats'),
                   path('users/', include('src.users.urls')),
                   path('carts/', include('src.cart.urls')),
                   path('delivery/', include('src.shipping.urls')),
@@ -49,10 +50,12 @@ urlpatterns = [
                   path('reset_password_complete/',
                        auth_views.PasswordResetCompleteView.as_view(template_name='users/password_reset_complete.html'),
                        name='password_reset_complete'),
-              ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + debug_toolbar_urls()
+              ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 if settings.DEBUG:
-    # Include django_browser_reload URLs only in DEBUG mode
+    # Include django_browser_reload and debug toolbar URLs only in DEBUG mode
+    from debug_toolbar.toolbar import debug_toolbar_urls
+
     urlpatterns += [
         path("__reload__/", include("django_browser_reload.urls")),
-    ]
+    ] + debug_toolbar_urls()
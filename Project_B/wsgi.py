@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Project_B.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AUTOCOMPLETE_WARM_ON_START:
+    # Load the shared typeahead indexes in the background as each worker loads the application
+    from src.books.autocomplete import warm  # noqa: E402
+
+    warm()
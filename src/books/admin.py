@@ -1,3 +1,18 @@
 from django.contrib import admin
 
+from src.books.models import Book
+from src.core.admin import SafeDeleteAdmin, DeletedListFilter
+
+
 # Register your models here.
+@admin.register(Book)
+class BookAdmin(SafeDeleteAdmin):
+    list_display = ('title', 'publisher', 'publication_date', 'isbn', 'deleted_at')
+    list_filter = (DeletedListFilter, 'language')
+    list_select_related = ('publisher',)
+    search_fields = ('title', 'isbn')
+    filter_horizontal = ('authors', 'genres')
+
+    def get_queryset(self, request):
+        # Book.__str__ (the row checkbox label) lists the authors
+        return super().get_queryset(request).prefetch_related('authors')
@@ -18,6 +18,12 @@ urlpatterns = [
     path('books/recycle-bin/', views.BookRecycleBinListView.as_view(), name='book_recycle_bin'),
     path('books/restore/<uuid:uuid>/', views.BookRestoreView.as_view(), name='book_restore'),
     path('book/permanent-delete/<uuid:uuid>/', views.BookPermanentDeleteView.as_view(), name='book_permanent_delete'),
+    path('books/import/', views.BookImportView.as_view(), name='book_import'),
+    path('books/import/rejects/<str:name>', views.book_import_rejects, name='book_import_rejects'),
+
+    # Before the '<uuid>' detail routes, which would otherwise take 'authors/options'
+    path("<str:field_name>/options", views.field_options, name="field-options"),
+    path("choices/<str:field_name>", views.choice_options, name="choice_options"),
 
     path('search/authors', views.search_authors, name='search_authors'),
     # path('authors', AuthorView.as_view(), name="create_author"),
@@ -34,9 +40,9 @@ urlpatterns = [
     path('publishers/edit/<uuid>', PublisherView.as_view(), name='publisher_view'),
     path('publishers/<uuid>', PublisherDetailView.as_view(), name='publisher_detail_view'),
 
-    path("<str:field_name>/options", views.field_options, name="field-options"),
 
     path('search/genres', views.search_genres, name='search_genres'),
+    path('autocomplete/<str:kind>', views.autocomplete, name='admin_autocomplete'),
     # path('genres', GenreView.as_view(), name="create_genres"),
     # path('manage/genre/list/', GenreListView.as_view(), name="admin_genre_list"),
     path('genres/', GenreListView.as_view(), name="admin_genre_list"),
@@ -0,0 +1,414 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from src.books.models import Author, Book, Genre, Publisher
+
+_NON_WORD = re.compile(r'\W+')
+# Ends every label in the joined strings; sorts before any character a normalized label can hold
+_END = '\0'
+# A change log entry for rows changed in bulk (soft_delete_changed): replay is not possible
+_BULK = '*'
+
+
+def normalize(text):
+    """
+        Case folded, accents and punctuation dropped, single spaces: 'Café-Society!' -> 'cafe society'.
+        """
+    text = unicodedata.normalize('NFKD', text or '').casefold()
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def _matches(key, prefix):
+    # A word of the normalized label starts with `prefix`
+    return key.startswith(prefix) or f' {prefix}' in key
+
+
+class Source:
+    """
+        One kind of suggestion: the active rows, the field shown and the annotation they rank by.
+        """
+
+    def __init__(self, queryset, field, score):
+        self._queryset = queryset
+        self.field = field
+        self.score = score
+
+    def queryset(self):
+        return self._queryset()
+
+    def rows(self, pks=None):
+        """
+            (pk, uuid, label, score) of every active row, or of those in `pks`.
+            """
+        queryset = self.queryset()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        return queryset.order_by().values_list('pk', 'uuid', self.field, self.score).iterator(chunk_size=10000)
+
+    def fallback(self, query, limit):
+        """
+            Suggestions straight from the database, for a process whose index is still being built.
+            On PostgreSQL the trigram indexes of migration 0004 serve both lookups, and matches are
+            ranked by trigram word similarity first.
+            """
+        field = self.field
+        queryset = self.queryset().filter(
+            Q(**{f'{field}__istartswith': query}) | Q(**{f'{field}__icontains': f' {query}'})
+        )
+        ordering = [f'-{self.score}', field]
+        if connections[queryset.db].vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            queryset = queryset.annotate(similarity=TrigramWordSimilarity(query, field))
+            ordering.insert(0, '-similarity')
+        return [
+            {'uuid': str(uuid), 'label': label}
+            for uuid, label in queryset.order_by(*ordering).values_list('uuid', field)[:limit]
+        ]
+
+
+def _book_count():
+    return Count('books', filter=Q(books__deleted_at__isnull=True))
+
+
+SOURCES = {
+    # Titles rank by units sold (DailyBookSales), the others by how many active books they hold
+    'titles': Source(lambda: Book.all_objects.filter(deleted_at__isnull=True)
+                     .annotate(score=Coalesce(Sum('daily_sales__units'), 0)), 'title', 'score'),
+    'authors': Source(lambda: Author.objects.annotate(score=_book_count()), 'name', 'score'),
+    'publishers': Source(lambda: Publisher.objects.annotate(score=_book_count()), 'name', 'score'),
+    'genres': Source(lambda: Genre.objects.with_subtree_book_counts(), 'name', 'subtree_book_count'),
+}
+KINDS_BY_MODEL = {Book: 'titles', Author: 'authors', Publisher: 'publishers', Genre: 'genres'}
+
+
+class PrefixIndex:
+    """
+        Read-only prefix index over (pk, uuid, label, score) rows, held in flat arrays rather than
+        one object per row. The normalized labels are joined into one string; every word start in
+        it is an entry, and the entries are sorted by the text that follows them, so the matches
+        of a prefix are one contiguous block found with two bisects. Blocks larger than
+        `scan_limit` entries get their best `top_size` rows precomputed; smaller ones are scanned.
+        """
+
+    def __init__(self, rows, top_size, scan_limit):
+        self.top_size = top_size
+        self.scan_limit = scan_limit
+        self.pks = array('q')
+        self.scores = array('d')
+        self.uuids = bytearray()
+        self.label_starts = array('q', [0])
+        labels, keys, starts, owners = [], [], array('q'), array('q')
+        label_length = text_length = 0
+        for pk, uuid, label, score in rows:
+            key = normalize(label)
+            if not key:
+                continue
+            owner = len(self.pks)
+            self.pks.append(pk)
+            self.scores.append(score or 0)
+            self.uuids += uuid.bytes
+            labels.append(label)
+            label_length += len(label) + 1
+            self.label_starts.append(label_length)
+            starts.append(text_length)
+            owners.append(owner)
+            for space in re.finditer(' ', key):
+                starts.append(text_length + space.end())
+                owners.append(owner)
+            keys.append(key)
+            text_length += len(key) + 1
+        self.labels = _END.join(labels) + _END
+        self.text = _END.join(keys) + _END
+
+        text = self.text
+        order = sorted(range(len(starts)), key=lambda entry: text[starts[entry]:text.index(_END, starts[entry])])
+        self.starts = array('q', (starts[entry] for entry in order))
+        self.owners = array('q', (owners[entry] for entry in order))
+        self.top = {}
+        if self.starts:
+            self._precompute(0, len(self.starts), '')
+
+    def __len__(self):
+        return len(self.pks)
+
+    def _prefix_key(self, length):
+        # The first `length` characters from an entry on; may run past its label into _END,
+        # which keeps the comparison consistent with the sort order
+        text, starts = self.text, self.starts
+        return lambda entry: text[starts[entry]:starts[entry] + length]
+
+    def _best(self, owners, size):
+        scores = self.scores
+        return heapq.nlargest(size, set(owners), key=lambda owner: (scores[owner], -owner))
+
+    def _precompute(self, lo, hi, prefix):
+        """
+            Best rows of the block entries[lo:hi] (all starting with `prefix`), stored in
+            self.top when the block is too large to scan at query time.
+            """
+        if hi - lo <= self.scan_limit:
+            return self._best(self.owners[lo:hi], self.top_size)
+        entries, key, best = range(len(self.starts)), self._prefix_key(len(prefix) + 1), []
+        while lo < hi:
+            child = key(lo)
+            end = bisect_right(entries, child, lo, hi, key=key)
+            if child.endswith(_END):
+                # Labels that end right here: all equal to `prefix`, nothing longer to split on
+                best.extend(self._best(self.owners[lo:end], self.top_size))
+            else:
+                best.extend(self._precompute(lo, end, child))
+            lo = end
+        self.top[prefix] = self._best(best, self.top_size)
+        return self.top[prefix]
+
+    def search(self, prefix, size, skip=()):
+        """
+            Owners (row numbers) of the best `size` rows with a word starting with `prefix`,
+            leaving out rows whose pk is in `skip`.
+            """
+        entries, key = range(len(self.starts)), self._prefix_key(len(prefix))
+        lo = bisect_left(entries, prefix, key=key)
+        hi = bisect_right(entries, prefix, lo, key=key)
+        if hi - lo > self.scan_limit:
+            candidates = self.top[prefix]
+        else:
+            candidates = self.owners[lo:hi]
+        pks = self.pks
+        return self._best([owner for owner in candidates if pks[owner] not in skip], size)
+
+    def row(self, owner):
+        label = self.labels[self.label_starts[owner]:self.label_starts[owner + 1] - 1]
+        return self.pks[owner], UUID(bytes=bytes(self.uuids[owner * 16:owner * 16 + 16])), label, self.scores[owner]
+
+
+def _log_key(kind):
+    return f"autocomplete:{kind}:log"
+
+
+def _log_position(kind):
+    key = _log_key(kind)
+    position = shared_cache.get(key)
+    if position is None:
+        # Start from the clock, so a log that was evicted never looks caught up
+        shared_cache.add(key, int(time.time() * 1000), None)
+        position = shared_cache.get(key)
+    return position
+
+
+def record_change(kind, pks):
+    """
+        Append changed pks (None: rows changed in bulk) to the shared change log of `kind`,
+        which every process's index replays.
+        """
+    key = _log_key(kind)
+    try:
+        position = shared_cache.incr(key)
+    except ValueError:
+        _log_position(kind)
+        position = shared_cache.incr(key)
+    shared_cache.set(f"{key}:{position}", _BULK if pks is None else list(pks), settings.AUTOCOMPLETE_REBUILD_SECONDS)
+
+
+def _snapshot_key(kind):
+    return f"autocomplete:{kind}:snapshot"
+
+
+def publish_snapshot(kind):
+    """
+        Build the PrefixIndex of `kind` from the database and share it in the cache for every
+        process to load. The snapshot key holds (change log position, build time, key of the
+        index), so processes can tell whether it is newer than theirs without fetching the index.
+        Run by the publish_autocomplete_snapshots beat task, so the ranking queries and the sort
+        run once per AUTOCOMPLETE_REBUILD_SECONDS rather than once per worker.
+        """
+    position = _log_position(kind)
+    index = PrefixIndex(SOURCES[kind].rows(), settings.AUTOCOMPLETE_LIMIT * 2, settings.AUTOCOMPLETE_SCAN_LIMIT)
+    built_at = time.time()
+    index_key = f"{_snapshot_key(kind)}:{built_at}"
+    shared_cache.set(index_key, index, settings.AUTOCOMPLETE_REBUILD_SECONDS * 3)
+    snapshot = (position, built_at, index_key)
+    shared_cache.set(_snapshot_key(kind), snapshot, None)
+    return snapshot, index
+
+
+class LiveIndex:
+    """
+        A PrefixIndex plus the rows changed since it was built. Each process loads the shared
+        snapshot (publish_snapshot) in a background thread (suggestions come from the database
+        meanwhile), replays the shared change log at most every AUTOCOMPLETE_SYNC_SECONDS, and
+        reloads when the changes pile up past AUTOCOMPLETE_DELTA_LIMIT or the scores are
+        AUTOCOMPLETE_REBUILD_SECONDS old.
+        Only when there is no snapshot newer than its own, and the shared one is missing, more
+        than twice AUTOCOMPLETE_REBUILD_SECONDS old (no beat running) or behind the change log,
+        does a process build one itself; a cache lock lets one process at a time do so.
+        """
+
+    def __init__(self, kind, source):
+        self.kind = kind
+        self.source = source
+        self.index = None
+        self.built_at = 0
+        # pk -> (uuid, label, normalized label, score), or None once the row is gone.
+        # Replaced, never mutated, so readers can use it without the lock.
+        self.changed = {}
+        self.position = 0
+        self.checked_at = 0
+        self._lock = threading.Lock()
+        self._building = False
+
+    def build(self, behind=False):
+        """
+            Load the shared snapshot if it is newer than this index, else build and publish one
+            when it is missing or too old, or when `behind` (the change log outran this index).
+            Leaves the index as it is while another process holds the build lock.
+            """
+        snapshot = shared_cache.get(_snapshot_key(self.kind))
+        index = None
+        if snapshot is not None and snapshot[1] > self.built_at:
+            index = shared_cache.get(snapshot[2])
+        elif snapshot is not None and not behind:
+            if time.time() - snapshot[1] < settings.AUTOCOMPLETE_REBUILD_SECONDS * 2:
+                # Nothing newer yet; the beat task publishes the next one
+                return
+        if index is None:
+            lock = f"{_snapshot_key(self.kind)}:lock"
+            if not shared_cache.add(lock, 1, settings.AUTOCOMPLETE_BUILD_TIMEOUT):
+                return
+            try:
+                snapshot, index = publish_snapshot(self.kind)
+            finally:
+                shared_cache.delete(lock)
+        position, built_at, _ = snapshot
+        with self._lock:
+            self.index, self.changed, self.position, self.built_at = index, {}, position, built_at
+            self.checked_at = time.monotonic()
+
+    def build_in_background(self, behind=False):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._build_thread, args=(behind,), name=f"autocomplete-{self.kind}",
+                         daemon=True).start()
+
+    def _build_thread(self, behind):
+        try:
+            self.build(behind)
+        finally:
+            self._building = False
+            connections.close_all()
+
+    def sync(self):
+        now = time.monotonic()
+        if now - self.checked_at < settings.AUTOCOMPLETE_SYNC_SECONDS:
+            return
+        self.checked_at = now
+        if time.time() - self.built_at > settings.AUTOCOMPLETE_REBUILD_SECONDS:
+            self.build_in_background()
+
+        position = _log_position(self.kind)
+        if position == self.position:
+            return
+        pending = range(self.position + 1, position + 1)
+        if not pending or len(pending) > settings.AUTOCOMPLETE_DELTA_LIMIT:
+            self.build_in_background(behind=True)
+            return
+        entries = shared_cache.get_many([f"{_log_key(self.kind)}:{n}" for n in pending])
+        if len(entries) < len(pending) or _BULK in entries.values():
+            self.build_in_background(behind=True)
+            return
+
+        pks = {pk for changed in entries.values() for pk in changed}
+        found = {pk: (uuid, label, normalize(label), score) for pk, uuid, label, score in self.source.rows(pks)}
+        with self._lock:
+            self.changed = {**self.changed, **{pk: found.get(pk) for pk in pks}}
+            self.position = position
+        if len(self.changed) > settings.AUTOCOMPLETE_DELTA_LIMIT:
+            self.build_in_background(behind=True)
+
+    def search(self, query, limit):
+        """
+            Up to `limit` {'uuid', 'label'} suggestions, best scores first; None while there
+            is no index yet.
+            """
+        if self.index is None:
+            self.build_in_background()
+            return None
+        self.sync()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        index, changed = self.index, self.changed
+        rows = [index.row(owner) for owner in index.search(prefix, limit, skip=changed)]
+        for pk, row in changed.items():
+            if row is not None and _matches(row[2], prefix):
+                uuid, label, _, score = row
+                rows.append((pk, uuid, label, score))
+        rows.sort(key=lambda row: (-row[3], row[2]))
+        return [{'uuid': str(uuid), 'label': label} for _, uuid, label, _ in rows[:limit]]
+
+
+INDEXES = {kind: LiveIndex(kind, source) for kind, source in SOURCES.items()}
+
+
+def suggest(kind, query, limit):
+    """
+        (suggestions, 'index' or 'database') for `query` among `kind` ('titles', 'authors',
+        'publishers' or 'genres').
+        """
+    results = INDEXES[kind].search(query, limit)
+    if results is not None:
+        return results, 'index'
+    return SOURCES[kind].fallback(query, limit), 'database'
+
+
+def warm():
+    """
+        Start loading every index, so the first requests of a worker do not all fall back.
+        """
+    for index in INDEXES.values():
+        index.build_in_background()
+
+
+def record_change_on_commit(kind, pks, using=None):
+    """
+        record_change() once the current transaction commits. Rows saved in one transaction
+        share a single change log entry.
+        """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if connection.in_atomic_block:
+        for _, func, _ in connection.run_on_commit:
+            if getattr(func, 'change_kind', None) == kind:
+                func.change_pks = None if pks is None or func.change_pks is None else func.change_pks | set(pks)
+                return
+
+    def callback():
+        callback.change_kind = None
+        record_change(kind, callback.change_pks)
+
+    callback.change_kind, callback.change_pks = kind, None if pks is None else set(pks)
+    transaction.on_commit(callback, using=using)
+
+
+def row_changed(sender, instance, using=None, **kwargs):
+    # post_save / post_delete on Book, Author, Publisher and Genre
+    record_change_on_commit(KINDS_BY_MODEL[sender], [instance.pk], using)
+
+
+def rows_changed(sender, using=None, **kwargs):
+    # soft_delete_changed: a bulk update whose rows are not known
+    record_change_on_commit(KINDS_BY_MODEL[sender], None, using)
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from src.books.models import Author, Genre, Publisher
+from src.core.cache import bump_on_commit, get_or_set
+
+# BookForm relation field -> the model its options list ('publishers' is the create popup's name)
+CHOICE_MODELS = {'authors': Author, 'genres': Genre, 'publisher': Publisher, 'publishers': Publisher}
+MULTIPLE = {'authors', 'genres'}
+
+
+def namespace(model):
+    # One cache generation per model: a new author leaves the cached genre options alone
+    return f"choices:{model._meta.label_lower}"
+
+
+def option_page(model, query='', page=1):
+    """
+        One page of options ordered by name, in the shape select2's remote data source reads:
+        {'results': [{'id', 'text'}], 'pagination': {'more'}}. Cached until the model's next write.
+        """
+    size = settings.CHOICE_PAGE_SIZE
+
+    def produce():
+        queryset = model.objects.order_by('name', 'pk')
+        if query:
+            queryset = queryset.filter(name__icontains=query)
+        # One row past the page tells whether another page follows, without a COUNT
+        rows = list(queryset.values_list('pk', 'name')[(page - 1) * size:page * size + 1])
+        return {
+            'results': [{'id': pk, 'text': name} for pk, name in rows[:size]],
+            'pagination': {'more': len(rows) > size},
+        }
+
+    return get_or_set(namespace(model), f"page:{page}:{query}", produce)
+
+
+def selected_choices(model, values):
+    """
+        (pk, name) of the selected rows only: all a remotely searched select has to render.
+        """
+    pks = sorted({int(value) for value in values if str(value).isdigit()})
+    if not pks:
+        return []
+    return list(model.objects.filter(pk__in=pks).order_by('name').values_list('pk', 'name'))
+
+
+def render_options(model, values, is_multiple):
+    """
+        <option> tags for the selected rows, cached per model generation and selection.
+        """
+    pks = sorted({int(value) for value in values if str(value).isdigit()})
+    name = f"options:{int(is_multiple)}:{','.join(map(str, pks))}"
+    return get_or_set(namespace(model), name, lambda: render_to_string(
+        "author/components/field_options.html",
+        {"choices": selected_choices(model, pks), "selected_values": pks, "is_multiple": is_multiple},
+    ))
+
+
+def choices_changed(sender, using=None, **kwargs):
+    # post_save / post_delete / soft_delete_changed on Author, Publisher and Genre
+    bump_on_commit(namespace(sender), using)
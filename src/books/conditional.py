@@ -0,0 +1,67 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib import messages
+from django.views.decorators.http import condition
+
+from src.books.fragments import template_digest
+from src.cart.models import Cart
+from src.core.cache import CATALOG, changed_at, generation
+
+
+def _stamp(value):
+    return int(value.timestamp() * 1_000_000) if value else 0
+
+
+def _viewer(request):
+    """
+        What a storefront response shows besides the catalog: whose it is and their cart, in
+        one query. None while flash messages wait to be shown, so the page is rendered for them.
+        """
+    if len(messages.get_messages(request)):
+        return None
+    user = request.user
+    version, cart_updated_at = 0, None
+    if user.is_authenticated:
+        version, cart_updated_at = (Cart.objects.filter(user=user).values_list('version', 'updated_at').first()
+                                    or (0, None))
+    # Session key and CSRF secret rotate together at login: a page kept from before posts a dead token
+    return {
+        'tag': f"{user.pk}:{_stamp(getattr(user, 'updated_at', None))}:{version}:{request.session.session_key}",
+        'modified': cart_updated_at,
+    }
+
+
+def _cached_viewer(request):
+    # condition() asks for the ETag and Last-Modified separately; look the cart up once
+    if not hasattr(request, '_storefront_viewer'):
+        request._storefront_viewer = _viewer(request)
+    return request._storefront_viewer
+
+
+def catalog_condition(template=None):
+    """
+        condition() for catalog pages: the ETag follows the catalog generation, the viewer,
+        their cart version and `template`, so an unchanged page is answered with a 304
+        before any listing query runs.
+        """
+
+    def etag(request, *args, **kwargs):
+        viewer = _cached_viewer(request)
+        if viewer is None:
+            return None
+        is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        raw = (f"{generation(CATALOG)}|{viewer['tag']}|{template and template_digest(template)}|"
+               f"{int(is_ajax)}|{request.get_full_path()}")
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        viewer = _cached_viewer(request)
+        if viewer is None:
+            return None
+        modified = datetime.fromtimestamp(changed_at(CATALOG), tz=dt_timezone.utc)
+        if viewer['modified']:
+            modified = max(modified, viewer['modified'])
+        return modified
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
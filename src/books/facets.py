@@ -0,0 +1,215 @@
+from uuid import UUID
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+from django.http import QueryDict
+
+from src.books.models import Author, Book, Genre, Publisher
+from src.books.utils import price_bounds, text_search
+from src.core.cache import CATALOG, get_or_set
+from src.stock.pricing import price_stats
+
+# Storefront facets: query parameter -> (title, Book lookup, model the values are uuids of).
+# A genre covers its whole subtree (GenreClosure), so "Fiction" includes every subgenre's books.
+FACETS = {
+    'genre': ('Genre', 'genres__ancestor_links__ancestor__uuid', Genre),
+    'language': ('Language', 'language', None),
+    'author': ('Author', 'authors__uuid', Author),
+    'publisher': ('Publisher', 'publisher__uuid', Publisher),
+}
+
+# Price facet bands, linked as min_price / max_price; None is no upper bound
+PRICE_BANDS = ((0, 500), (500, 1000), (1000, 2000), (2000, 5000), (5000, None))
+
+
+def canonical_params(params):
+    """
+        Query string with keys and values sorted and empty values and 'page' dropped, so every
+        combination of filters has exactly one URL (and one cache key).
+        """
+    canonical = QueryDict(mutable=True)
+    for key in sorted(params):
+        if key == 'page':
+            continue
+        values = sorted({value for value in params.getlist(key) if value})
+        if values:
+            canonical.setlist(key, values)
+    return canonical.urlencode()
+
+
+def _valid_uuids(values):
+    valid = []
+    for value in values:
+        try:
+            valid.append(str(UUID(value)))
+        except ValueError:
+            continue
+    return valid
+
+
+class FacetSelection:
+    """
+        The facet values picked in the query string: OR within a facet, AND across facets.
+        """
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def from_query(cls, params):
+        values = {}
+        for name, (_, _, model) in FACETS.items():
+            picked = [value for value in params.getlist(name) if value]
+            if model is not None:
+                picked = _valid_uuids(picked)
+            if picked:
+                values[name] = sorted(set(picked))
+        return cls(values)
+
+    def canonical(self):
+        return '&'.join(f"{name}={value}" for name in FACETS for value in self.values.get(name, ()))
+
+    def apply(self, queryset, exclude=None):
+        """
+            Filter `queryset` (of books) by every picked facet except `exclude`. Many-to-many
+            facets go through a subquery, so annotations like can_sell()'s Sum see no extra rows.
+            """
+        for name, picked in self.values.items():
+            if name == exclude:
+                continue
+            lookup = FACETS[name][1]
+            if lookup.startswith(('genres__', 'authors__')):
+                queryset = queryset.filter(pk__in=Book.objects.filter(**{f'{lookup}__in': picked}).values('pk'))
+            else:
+                queryset = queryset.filter(**{f'{lookup}__in': picked})
+        return queryset
+
+
+def price_band_ranges():
+    """
+        (low, high, range filtered on) for the price bands the storefront can show. A band's count
+        uses the range price_bounds() turns its link into, so a book priced at a shared bound
+        counts in both bands, as the filter shows it in both. Bands whose lower bound the filter
+        would move (above the highest stocked price) are left out.
+        """
+    stats = price_stats()
+    ranges = []
+    for low, high in PRICE_BANDS:
+        bounds = price_bounds(str(low), str(high or ''), stats)
+        if bounds[0] == low:
+            ranges.append((low, high, bounds))
+    return tuple(ranges)
+
+
+def _grouped(queryset, name, key):
+    return (queryset.order_by().values(key=key).annotate(facet=Value(name), n=Count('pk', distinct=True))
+            .values_list('facet', 'key', 'n'))
+
+
+def compute_facet_counts(selection, query='', price_range=None, bands=None):
+    """
+        Counts for every facet value over the current result set, in one UNION ALL of grouped
+        queries. Each facet is counted with every other filter applied but its own, so picking
+        a genre still shows how many books the other genres would add. `bands` defaults to
+        price_band_ranges().
+        """
+    bands = price_band_ranges() if bands is None else bands
+    books = Book.objects.all()
+    if query:
+        # As a subquery: a join on authors here would be reused by the author facet's GROUP BY
+        books = books.filter(pk__in=Book.objects.filter(text_search(query)).values('pk'))
+    priced = books
+    if price_range:
+        priced = books.filter(stock__current_price__gte=price_range[0], stock__current_price__lte=price_range[1])
+
+    parts = []
+    for name, (_, lookup, model) in FACETS.items():
+        queryset = selection.apply(priced, exclude=name)
+        if model is not None:
+            # Deleted genres, authors and publishers are not offered
+            queryset = queryset.filter(**{lookup.replace('__uuid', '__deleted_at__isnull'): True})
+            key = Cast(F(lookup), output_field=CharField())
+        else:
+            key = F(lookup)
+        parts.append(_grouped(queryset, name, key))
+    selected = selection.apply(books)
+    for low, high, (min_val, max_val) in bands:
+        in_band = selected.filter(stock__current_price__gte=min_val, stock__current_price__lte=max_val)
+        parts.append(_grouped(in_band, 'price', Value(f"{low}-{high or ''}", output_field=CharField())))
+
+    counts = {name: {} for name in (*FACETS, 'price')}
+    for name, key, n in parts[0].union(*parts[1:], all=True):
+        if key is not None:
+            counts[name][key] = n
+
+    facets = {}
+    for name, (_, _, model) in FACETS.items():
+        picked = selection.values.get(name, [])
+        if model is not None:
+            # Cast uuids come back with or without dashes depending on the database
+            found = {str(UUID(key)): n for key, n in counts[name].items()}
+        else:
+            found = counts[name]
+        top = sorted(found, key=lambda value: -found[value])[:settings.FACET_LIMIT]
+        if model is not None:
+            labels = {
+                str(value): label
+                for value, label in model.objects.filter(uuid__in={*top, *picked}).values_list('uuid', 'name')
+            }
+        else:
+            labels = {value: value for value in {*top, *picked}}
+        options = [
+            {'value': value, 'label': labels[value], 'count': found.get(value, 0), 'selected': value in picked}
+            for value in {*top, *picked} if value in labels
+        ]
+        facets[name] = sorted(options, key=lambda option: (not option['selected'], -option['count'],
+                                                           option['label']))
+
+    facets['price'] = [
+        {'value': (low, high), 'label': f"Rs {low} - {high}" if high else f"Over Rs {low}",
+         'count': counts['price'].get(f"{low}-{high or ''}", 0)}
+        for low, high, _ in bands
+    ]
+    return facets
+
+
+def facet_counts(selection, query='', price_range=None):
+    """
+        compute_facet_counts() from the catalog cache, keyed by the canonical filters.
+        """
+    # The band ranges follow the stocked prices, which the catalog generation does not cover
+    bands = price_band_ranges()
+    name = f"facets:{query}|{price_range}|{bands}|{selection.canonical()}"
+    return get_or_set(CATALOG, name, lambda: compute_facet_counts(selection, query, price_range, bands))
+
+
+def facet_groups(facets, params):
+    """
+        Template-ready facets: each option gets the canonical URL that toggles it.
+        """
+    groups = []
+    for name, (title, _, _) in FACETS.items():
+        options = []
+        for option in facets[name]:
+            toggled = params.copy()
+            picked = [value for value in toggled.getlist(name) if value != option['value']]
+            toggled.setlist(name, picked if option['selected'] else [*picked, option['value']])
+            options.append({**option, 'url': '?' + canonical_params(toggled)})
+        if options:
+            groups.append({'name': name, 'title': title, 'options': options})
+
+    options = []
+    for option in facets['price']:
+        low, high = option['value']
+        selected = params.get('min_price') == str(low) and params.get('max_price', '') == str(high or '')
+        toggled = params.copy()
+        if selected:
+            toggled.pop('min_price', None)
+            toggled.pop('max_price', None)
+        else:
+            toggled['min_price'] = str(low)
+            toggled['max_price'] = str(high or '')
+        options.append({**option, 'selected': selected, 'url': '?' + canonical_params(toggled)})
+    groups.append({'name': 'price', 'title': 'Price', 'options': options})
+    return groups
@@ -5,8 +5,10 @@ import re
 from django import forms
 from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.urls import reverse
 from django.utils import timezone
 
+from src.books.choices import MULTIPLE, selected_choices
 from src.books.models import Book, Author, Genre, Publisher
 from src.stock.validators import clean_price, clean_discount_percentage
 
@@ -21,7 +23,6 @@ def clean_spaces_or_none(value: str | None) -> str | None:
 def validate_isbn(isbn: str) -> bool:
     # Validate ISBN-13: strip non-digits, check length 13, starts with 978/979, and checksum.
     d = re.sub(r'\D', '', isbn).strip()
-    print("Digits:", list(d))  # debug
 
     if len(d) != 13 or not d.isdigit():
         return False
@@ -198,10 +199,16 @@ class GenreForm(forms.ModelForm):
         name = cleaned_data.get('name')
         if parent and parent.name == name:
             raise ValidationError("A genre cannot be its own parent.")
+        if parent and self.instance.pk and self.instance.descendants(include_self=True).filter(pk=parent.pk).exists():
+            raise ValidationError("A genre cannot be moved under one of its own subgenres.")
         return cleaned_data
 
 
 class BookForm(forms.ModelForm):
+    # Rendered with only their selected options; the rest are searched through choice_options.
+    # Validation still goes through the field querysets, which look up just the submitted ids.
+    REMOTE_CHOICE_FIELDS = ('authors', 'publisher', 'genres')
+
     isbn = forms.CharField(required=False)  # override, skip default max_length check
     price = forms.DecimalField(
         required=False,
@@ -244,6 +251,16 @@ class BookForm(forms.ModelForm):
 
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.REMOTE_CHOICE_FIELDS:
+            field = self.fields[name]
+            value = self[name].value()
+            values = value if isinstance(value, (list, tuple)) else [value]
+            choices = selected_choices(field.queryset.model, values)
+            field.choices = choices if name in MULTIPLE else [('', field.empty_label), *choices]
+            field.widget.attrs['data-options-url'] = reverse('choice_options', args=[name])
+
     def clean_title(self):
         return clean_spaces_or_none(self.cleaned_data.get('title'))
 
@@ -344,3 +361,17 @@ class BookForm(forms.ModelForm):
                 self.add_error('title', 'A book with this Title, Publication Date, and Publisher already exists.')
 
         return cleaned_data
+
+
+class CatalogImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'From the file extension'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+        ('onix', 'ONIX XML'),
+    ]
+
+    file = forms.FileField(help_text="title, isbn, publication_date, publisher, authors and genres ('|' separated), "
+                                     "price, discount_percentage, quantity, unit_cost, received_date, pages, "
+                                     "language, edition, description")
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
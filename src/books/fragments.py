@@ -0,0 +1,81 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.template.loader import get_template, render_to_string
+
+from src.core.cache import LocalLRU
+
+CARD_TEMPLATE = 'books/components/cards.html'
+PAGINATION_TEMPLATE = 'books/components/pagination_div.html'
+
+# Rendered storefront fragments. Their keys change with the rows they show, so nothing has to
+# invalidate them and they get an LRU of their own rather than crowding out catalog reads.
+fragment_cache = LocalLRU(settings.FRAGMENT_CACHE_LOCAL_ENTRIES, settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def template_digest(name):
+    # In every key, so markup from before a template change is never served
+    return hashlib.md5(get_template(name).template.source.encode()).hexdigest()[:8]
+
+
+def _stamp(value):
+    return int(value.timestamp() * 1_000_000) if value else 0
+
+
+def card_key(book, digest):
+    """
+        Changes whenever the card would: the book, its stock or its publisher saved, the
+        stock running out (can_sell is an annotation that no updated_at follows) or the
+        cover's thumbnails built.
+        """
+    stock = getattr(book, 'stock', None)
+    publisher = book.publisher
+    return (f"fragment:card:{digest}:{book.pk}:{_stamp(book.updated_at)}:"
+            f"{_stamp(stock and stock.updated_at)}:{_stamp(publisher and publisher.updated_at)}:"
+            f"{int(bool(getattr(book, 'can_sell', False)))}:{book.cover_image_derivatives.get('hash', '')}")
+
+
+def cached_fragments(keys, render):
+    """
+        {key: html} for every key: from the local LRU, then one get_many on the shared cache,
+        and render(key) for the rest, stored back with one set_many.
+        """
+    found = {}
+    for key in keys:
+        html = fragment_cache.get(key)
+        if html is not None:
+            found[key] = html
+    missing = [key for key in keys if key not in found]
+    if missing:
+        shared = shared_cache.get_many(missing)
+        rendered = {key: render(key) for key in missing if key not in shared}
+        if rendered:
+            shared_cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+        for key, html in {**shared, **rendered}.items():
+            fragment_cache.set(key, html)
+            found[key] = html
+    return found
+
+
+def render_book_cards(books):
+    """
+        The storefront cards of `books` (from Book.objects.can_sell()) joined in order; only
+        the cards whose book, stock or publisher changed since they were cached are rendered.
+        """
+    digest = template_digest(CARD_TEMPLATE)
+    keys = {card_key(book, digest): book for book in books}
+    fragments = cached_fragments(list(keys), lambda key: render_to_string(CARD_TEMPLATE, {'book': keys[key]}))
+    return ''.join(fragments[key] for key in keys)
+
+
+def render_pagination(paginated_books, query_string, limit):
+    """
+        The AJAX storefront's pagination bar, cached per filters, page, page count and limit.
+        """
+    key = (f"fragment:pagination:{template_digest(PAGINATION_TEMPLATE)}:{paginated_books.number}:"
+           f"{paginated_books.paginator.num_pages}:{limit}:"
+           f"{hashlib.md5(query_string.encode()).hexdigest()}")
+    context = {'paginated_books': paginated_books, 'query_string': query_string, 'is_ajax_page': True,
+               'limit': limit}
+    return cached_fragments([key], lambda _: render_to_string(PAGINATION_TEMPLATE, context))[key]
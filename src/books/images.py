@@ -0,0 +1,152 @@
+import hashlib
+import io
+import logging
+import os
+from functools import partial
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from kombu.exceptions import OperationalError
+
+from src.books.models import Author, Book
+from src.core.cache import CATALOG, bump_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Uploaded image of each model; the manifest of its derivatives is stored in '<field>_derivatives'
+IMAGE_FIELDS = {Book: 'cover_image', Author: 'profile_image'}
+# Derivative file extension -> Pillow format; WebP first, JPEG for browsers without it
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def manifest_field(field_name):
+    return f"{field_name}_derivatives"
+
+
+def derivative_name(source, digest, width, extension):
+    """
+        'book_covers/dune.jpg' -> 'book_covers/derivatives/dune.<hash>.320.webp'. The content hash
+        makes the name unique to the image, so the files can be cached for good.
+        """
+    directory, filename = os.path.split(source)
+    return os.path.join(directory, 'derivatives', f"{os.path.splitext(filename)[0]}.{digest}.{width}.{extension}")
+
+
+def derivative_names(manifest):
+    return [derivative_name(manifest['source'], manifest['hash'], width, extension)
+            for width in manifest['widths'] for extension in FORMATS]
+
+
+def current_manifest(instance, field_name):
+    """
+        The derivative manifest of the image `field_name` holds now, or None if it has none yet.
+        """
+    image = getattr(instance, field_name)
+    manifest = getattr(instance, manifest_field(field_name)) or {}
+    return manifest if image and manifest.get('source') == image.name else None
+
+
+def _flatten(image):
+    # JPEG has no alpha channel: transparent images go on white
+    rgba = image.convert('RGBA')
+    background = Image.new('RGB', rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def render_derivatives(data, source):
+    """
+        Write WebP and JPEG copies of an image (bytes) at each IMAGE_DERIVATIVE_WIDTHS width, up
+        to its own width, and return their manifest. Files that already exist are not written again.
+        """
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    largest = max(settings.IMAGE_DERIVATIVE_WIDTHS)
+    with Image.open(io.BytesIO(data)) as opened:
+        # JPEGs decode straight at a fraction of their size when that still covers the largest width
+        opened.draft('RGB', (largest, largest * opened.height // max(opened.width, 1)))
+        image = ImageOps.exif_transpose(opened)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    widths = sorted({min(width, image.width) for width in settings.IMAGE_DERIVATIVE_WIDTHS})
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, image_format in FORMATS.items():
+            name = derivative_name(source, digest, width, extension)
+            if default_storage.exists(name):
+                continue
+            frame = _flatten(resized) if image_format == 'JPEG' and resized.mode != 'RGB' else resized
+            output = io.BytesIO()
+            frame.save(output, image_format, quality=settings.IMAGE_DERIVATIVE_QUALITY)
+            default_storage.save(name, ContentFile(output.getvalue()))
+    return {'source': source, 'hash': digest, 'widths': widths, 'width': image.width, 'height': image.height}
+
+
+def build_derivatives(model, pk, force=False):
+    """
+        Derivatives of one row's image, and its manifest stored on the row. Returns the manifest,
+        or None when there is no image, it cannot be read, or it was replaced meanwhile (the
+        replacement has a build of its own). `force` checks the files of a current manifest too.
+        The catalog generation is left to the caller, to bump once per batch (build_batch).
+        """
+    field_name = IMAGE_FIELDS[model]
+    instance = model.all_objects.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return None
+    manifest = current_manifest(instance, field_name)
+    if manifest and not force:
+        return manifest
+
+    image = getattr(instance, field_name)
+    try:
+        with image.open('rb') as source:
+            data = source.read()
+        manifest = render_derivatives(data, image.name)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning("%s %s: cannot read %s: %s", model._meta.label, pk, image.name, e)
+        return None
+
+    previous = getattr(instance, manifest_field(field_name)) or {}
+    # Only if the image is still the one just read; a queryset update, so the save signals don't queue it again
+    if not model.all_objects.filter(pk=pk, **{field_name: image.name}).update(**{manifest_field(field_name): manifest}):
+        return None
+    if previous.get('hash') and previous['hash'] != manifest['hash']:
+        for name in derivative_names(previous):
+            default_storage.delete(name)
+    return manifest
+
+
+def build_batch(model, pks, force=False):
+    """
+        build_derivatives() of each row, then one catalog generation bump if any got a manifest:
+        storefront cards key on the manifest, but pages answered with a 304 need the new
+        generation. Returns {pk: manifest or None}.
+        """
+    manifests = {pk: build_derivatives(model, pk, force) for pk in pks}
+    if any(manifests.values()):
+        bump_on_commit(CATALOG)
+    return manifests
+
+
+def queue_derivatives(model, pks):
+    from src.books.tasks import build_image_derivatives
+
+    try:
+        # Not retried: this runs in the upload's request, which should not wait out a broker outage
+        build_image_derivatives.apply_async((model._meta.label, list(pks)), retry=False)
+    except OperationalError as e:
+        # The rows keep their original images until backfill_image_derivatives runs
+        logger.warning("Could not queue derivatives of %s %s: %s", model._meta.label, list(pks), e)
+
+
+def image_saved(sender, instance, using=None, update_fields=None, **kwargs):
+    # post_save on Book and Author: a new or replaced upload gets its derivatives once committed
+    field_name = IMAGE_FIELDS[sender]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    if getattr(instance, field_name) and not current_manifest(instance, field_name):
+        transaction.on_commit(partial(queue_derivatives, sender, [instance.pk]), using=using)
@@ -0,0 +1,474 @@
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import uuid
+import xml.etree.ElementTree as ElementTree
+from collections import Counter, defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from src.books import choices
+from src.books.autocomplete import KINDS_BY_MODEL, record_change_on_commit
+from src.books.forms import clean_spaces_or_none, validate_isbn
+from src.books.models import Author, Book, Genre, GenreClosure, Publisher
+from src.core.bulk import RowWriter, reserve_ids
+from src.core.cache import CATALOG, PRICES, bump_on_commit
+from src.stock.models import PriceHistory, Stock, StockBatch, StockHistory
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.xml': 'onix', '.onix': 'onix'}
+# Several authors or genres in one CSV cell: 'Jane Doe|John Roe'
+LIST_SEPARATOR = '|'
+# AuthorForm requires a nationality; catalog files rarely carry one
+UNKNOWN_NATIONALITY = 'Unknown'
+IMPORT_REASON = 'Catalog import'
+DATE_FORMATS = ('%Y-%m-%d', '%Y%m%d')
+
+# ONIX style <Product> descendants -> row fields, matched without their namespace
+ONIX_FIELDS = {
+    'TitleText': 'title', 'IDValue': 'isbn', 'PublisherName': 'publisher', 'PersonName': 'authors',
+    'SubjectHeadingText': 'genres', 'PublicationDate': 'publication_date', 'PriceAmount': 'price',
+    'NumberOfPages': 'pages', 'EditionStatement': 'edition', 'Text': 'description', 'OnHand': 'quantity',
+}
+ONIX_LISTS = {'authors', 'genres'}
+
+BOOK_DUPLICATE = 'A book with this Title, Publication Date, and Publisher already exists.'
+# What reading a malformed file raises part way through
+MALFORMED = (csv.Error, ElementTree.ParseError, UnicodeDecodeError)
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown catalog file type '{extension}', expected one of {', '.join(sorted(FORMATS))}.")
+    return FORMATS[extension]
+
+
+# Readers yield (line or record number, parsed record, parse errors or None), one record at a time
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        record.pop(None, None)  # cells past the header
+        yield reader.line_num, record, None
+
+
+def read_jsonl(stream):
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as error:
+            yield line, text.rstrip('\n'), [f"Invalid JSON: {error}"]
+            continue
+        if not isinstance(record, dict):
+            yield line, record, ["Each line must be a JSON object."]
+            continue
+        yield line, record, None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_onix(stream):
+    """
+        <Product> elements of an ONIX style XML file, read with iterparse and taken out of the
+        tree once read, so memory stays flat however many products the file holds.
+        """
+    number = 0
+    open_elements = []
+    for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            open_elements.append(element)
+            continue
+        open_elements.pop()
+        if _local_name(element.tag) != 'Product':
+            continue
+        number += 1
+        record = {}
+        for child in element.iter():
+            field = ONIX_FIELDS.get(_local_name(child.tag))
+            text = (child.text or '').strip()
+            if not field or not text:
+                continue
+            if field in ONIX_LISTS:
+                record.setdefault(field, []).append(text)
+            else:
+                record.setdefault(field, text)
+        if open_elements:
+            open_elements[-1].remove(element)
+        yield number, record, None
+
+
+def read_records(stream, file_format):
+    """
+        Records of a binary file object in `file_format` ('csv', 'jsonl' or 'onix').
+        """
+    if file_format == 'onix':
+        return read_onix(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+    return read_csv(text) if file_format == 'csv' else read_jsonl(text)
+
+
+# Cleaning: the checks BookForm runs on a new book, without a query
+
+def _text(record, name, errors, limit=None):
+    value = record.get(name)
+    value = clean_spaces_or_none(str(value)) if value not in (None, '') else None
+    if value and limit and len(value) > limit:
+        errors.append(f"{name}: at most {limit} characters.")
+    return value
+
+
+def _names(record, name, errors):
+    value = record.get(name) or []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    names = {}
+    for item in value:
+        item = clean_spaces_or_none(str(item))
+        if not item:
+            continue
+        if len(item) > 225:
+            errors.append(f"{name}: '{item[:40]}...' is longer than 225 characters.")
+        names.setdefault(item.lower(), item)
+    return list(names.values())
+
+
+def _date(record, name, errors):
+    value = _text(record, name, errors)
+    if not value:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+        if parsed > timezone.localdate():
+            errors.append(f"{name}: cannot be in the future.")
+        return parsed
+    errors.append(f"{name}: '{value}' is not a YYYY-MM-DD date.")
+    return None
+
+
+def _number(record, name, errors, low=None, high=None, integer=False):
+    value = _text(record, name, errors)
+    if value is None:
+        return None
+    try:
+        number = int(value) if integer else Decimal(value)
+    except (ValueError, InvalidOperation):
+        errors.append(f"{name}: '{value}' is not a{'n integer' if integer else ' number'}.")
+        return None
+    if (low is not None and number < low) or (high is not None and number > high):
+        bounds = f"at least {low}" if high is None else f"between {low} and {high}"
+        errors.append(f"{name}: must be {bounds}.")
+    return number
+
+
+def clean_row(record):
+    """
+        (row, errors) for one parsed record: the fields of a new book, its stock and opening
+        batch, cleaned and checked the way BookForm checks them.
+        """
+    errors = []
+    row = {
+        'title': _text(record, 'title', errors, 225),
+        'description': _text(record, 'description', errors),
+        'pages': _number(record, 'pages', errors, low=1, integer=True),
+        'language': _text(record, 'language', errors, 225) or 'English',
+        'isbn': _text(record, 'isbn', errors),
+        'publication_date': _date(record, 'publication_date', errors),
+        'edition': _text(record, 'edition', errors, 50),
+        'publisher': _text(record, 'publisher', errors, 225),
+        'authors': _names(record, 'authors', errors),
+        'genres': _names(record, 'genres', errors),
+        'price': _number(record, 'price', errors, low=0) or Decimal('0.00'),
+        'discount_percentage': _number(record, 'discount_percentage', errors, low=0, high=100) or Decimal('0.00'),
+        'quantity': _number(record, 'quantity', errors, low=0, integer=True) or 0,
+        'unit_cost': _number(record, 'unit_cost', errors, low=0) or Decimal('0.00'),
+        'received_date': _date(record, 'received_date', errors),
+    }
+    for name in ('title', 'publication_date', 'publisher'):
+        if not row[name] and not any(error.startswith(f"{name}:") for error in errors):
+            errors.append(f"{name}: required.")
+    if not row['authors']:
+        errors.append("authors: at least one is required.")
+    if row['language'].isdigit():
+        errors.append("language: cannot be a number.")
+    if row['isbn']:
+        # Stored as digits only, as BookForm.clean_isbn does
+        row['isbn'] = re.sub(r'\D', '', row['isbn'])
+        if not validate_isbn(row['isbn']):
+            errors.append("isbn: invalid ISBN-13 format or checksum.")
+    return row, errors
+
+
+def _insert(model, rows):
+    """
+        Write `rows` (dicts keyed by attname) and return their pks in order. On PostgreSQL the
+        pks are drawn from the table's sequence first and the rows COPYed, as seed_bookstore
+        writes them; elsewhere they go through bulk_create.
+        """
+    if not rows:
+        return []
+    if connection.vendor == 'postgresql':
+        pks = reserve_ids(model, len(rows))
+        writer = RowWriter(len(rows), use_copy=True)
+        for row, pk in zip(rows, pks):
+            writer.add(model, {**row, model._meta.pk.attname: pk})
+        return pks
+    objects = model._base_manager.bulk_create([model(**row) for row in rows])
+    if objects[0].pk is None:
+        # Backends that return no pks from a bulk insert: find them by uuid
+        pks = dict(model._base_manager.filter(uuid__in=[obj.uuid for obj in objects]).values_list('uuid', 'pk'))
+        return [pks[obj.uuid] for obj in objects]
+    return [obj.pk for obj in objects]
+
+
+def _base_row(now):
+    return {'uuid': uuid.uuid4(), 'created_at': now, 'updated_at': now, 'deleted_at': None, 'deleted_by_id': None}
+
+
+class CatalogImport:
+    """
+        Streams parsed records into the catalog a chunk at a time. Each chunk resolves its
+        publishers, authors and genres with one query per model (bulk creating the missing
+        ones), checks duplicates with one query each, then bulk inserts its books, their author
+        and genre links, stocks, opening batches and ledger rows in a single transaction.
+        Rejected rows go to `rejects` as JSON lines carrying the reasons.
+        """
+
+    def __init__(self, rejects=None, user=None, chunk_size=None, keep_rejects=20):
+        self.rejects = rejects
+        self.user = user
+        self.chunk_size = chunk_size or settings.CATALOG_IMPORT_CHUNK_SIZE
+        self.keep_rejects = keep_rejects
+        self.counts = Counter()
+        self.first_rejects = []  # the first `keep_rejects`, for the upload page
+        # Books of earlier chunks, so a file cannot add the same book twice
+        self._isbns = set()
+        self._books = set()
+
+    def run(self, records):
+        chunk = []
+        try:
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= self.chunk_size:
+                    self._import_chunk(chunk)
+                    chunk = []
+        except MALFORMED:
+            # The records read before the error are imported or rejected before it is reported
+            if chunk:
+                self._import_chunk(chunk)
+            raise
+        if chunk:
+            self._import_chunk(chunk)
+        return self.counts
+
+    def reject(self, line, record, errors):
+        self.counts['rejected'] += 1
+        entry = {'line': line, 'errors': errors, 'record': record}
+        if len(self.first_rejects) < self.keep_rejects:
+            self.first_rejects.append(entry)
+        if self.rejects is not None:
+            self.rejects.write(json.dumps(entry, default=str) + '\n')
+
+    def _import_chunk(self, chunk):
+        self.counts['read'] += len(chunk)
+        rows = []
+        for line, record, errors in chunk:
+            row, errors = (None, errors) if errors else clean_row(record)
+            if errors:
+                self.reject(line, record, errors)
+            else:
+                rows.append((line, record, row))
+        if not rows:
+            return
+
+        refused = {}
+        try:
+            with transaction.atomic():
+                books = self._write(rows, refused)
+        except DatabaseError as error:
+            for line, record, _ in rows:
+                self.reject(line, record, refused.get(line, [f"Not imported, its chunk failed: {error}"]))
+            return
+        for line, record, _ in rows:
+            if line in refused:
+                self.reject(line, record, refused[line])
+        self._isbns.update(book['isbn'] for book in books if book['isbn'])
+        self._books.update((book['title'].lower(), book['publication_date'], book['publisher_id']) for book in books)
+        self.counts['imported'] += len(books)
+
+    def _resolve(self, model, names, created):
+        """
+            {name.lower(): pk} of `names`, inserting the missing ones; recycle bin rows map to None.
+            """
+        wanted = {name.lower(): name for name in names}
+        found = self._find(model, wanted)
+        missing = [name for key, name in wanted.items() if key not in found]
+        if missing:
+            defaults = {'nationality': UNKNOWN_NATIONALITY} if model is Author else {}
+            # A concurrent import may insert the same names first: keep theirs and look them up
+            model.all_objects.bulk_create([model(name=name, **defaults) for name in missing], ignore_conflicts=True)
+            new = self._find(model, {name.lower(): name for name in missing})
+            if model is Genre:
+                # New genres are top level; Genre.save() is what links them otherwise
+                GenreClosure.objects.bulk_create(
+                    [GenreClosure(ancestor_id=pk, descendant_id=pk, depth=0) for pk in new.values() if pk],
+                    ignore_conflicts=True)
+            created[model].update(pk for pk in new.values() if pk)
+            found.update(new)
+        return found
+
+    @staticmethod
+    def _find(model, wanted):
+        found = {}
+        rows = (model.all_objects.annotate(lowered=Lower('name')).filter(lowered__in=list(wanted))
+                .order_by('pk').values_list('lowered', 'pk', 'deleted_at'))
+        for lowered, pk, deleted_at in rows:
+            if not found.get(lowered):
+                found[lowered] = None if deleted_at else pk
+        return found
+
+    def _write(self, rows, refused):
+        created = defaultdict(set)
+        publishers = self._resolve(Publisher, {row['publisher'] for _, _, row in rows}, created)
+        authors = self._resolve(Author, {name for _, _, row in rows for name in row['authors']}, created)
+        genres = self._resolve(Genre, {name for _, _, row in rows for name in row['genres']}, created)
+
+        isbns = [row['isbn'] for _, _, row in rows if row['isbn']]
+        taken_isbns = set(Book.all_objects.filter(isbn__in=isbns).values_list('isbn', flat=True)) if isbns else set()
+        # Titles in any case, as BookForm matches them; the publishers keep the lookup on their index
+        taken_books = set(Book.all_objects.annotate(lowered=Lower('title')).filter(
+            lowered__in={row['title'].lower() for _, _, row in rows},
+            publisher_id__in={pk for pk in publishers.values() if pk},
+        ).values_list('lowered', 'publication_date', 'publisher_id'))
+
+        accepted = []
+        chunk_isbns, chunk_books = set(), set()
+        for line, record, row in rows:
+            errors = []
+            links = {}
+            for label, lookup, names in (('Publisher', publishers, [row['publisher']]),
+                                         ('Author', authors, row['authors']), ('Genre', genres, row['genres'])):
+                for name in names:
+                    key = name.lower()
+                    if key not in lookup:
+                        errors.append(f"{label} '{name}' could not be created.")
+                    elif lookup[key] is None:
+                        errors.append(f"{label} '{name}' is in the recycle bin.")
+                    links.setdefault(label, []).append(lookup.get(key))
+            publisher_id = links['Publisher'][0]
+            isbn = row['isbn']
+            if isbn and (isbn in taken_isbns or isbn in self._isbns or isbn in chunk_isbns):
+                errors.append(f"isbn: a book with ISBN {row['isbn']} already exists.")
+            key = (row['title'].lower(), row['publication_date'], publisher_id)
+            if key in taken_books or key in self._books or key in chunk_books:
+                errors.append(BOOK_DUPLICATE)
+            if errors:
+                refused[line] = errors
+                continue
+            chunk_isbns.add(row['isbn'])
+            chunk_books.add(key)
+            accepted.append((row, links))
+        if not accepted:
+            return []
+
+        now = timezone.now()
+        today = timezone.localdate()
+        user_id = self.user.pk if self.user else None
+        books = [{
+            **_base_row(now), 'title': row['title'], 'description': row['description'], 'pages': row['pages'],
+            'language': row['language'], 'isbn': row['isbn'], 'publication_date': row['publication_date'],
+            'edition': row['edition'], 'publisher_id': links['Publisher'][0], 'cover_image': '',
+        } for row, links in accepted]
+        book_ids = _insert(Book, books)
+        _insert(Book.authors.through, [{'book_id': book_id, 'author_id': author_id}
+                                       for book_id, (_, links) in zip(book_ids, accepted)
+                                       for author_id in links['Author']])
+        _insert(Book.genres.through, [{'book_id': book_id, 'genre_id': genre_id}
+                                      for book_id, (_, links) in zip(book_ids, accepted)
+                                      for genre_id in links.get('Genre', [])])
+
+        stock_ids = _insert(Stock, [{
+            **_base_row(now), 'book_id': book_id, 'current_price': row['price'],
+            'current_discount_percentage': row['discount_percentage'],
+            # What Stock.save() would decide
+            'is_available': row['quantity'] > 1 and row['price'] > 1,
+            'last_restock_date': (row['received_date'] or today) if row['quantity'] else None,
+        } for book_id, (row, _) in zip(book_ids, accepted)])
+        stocked = [(stock_id, book, row) for stock_id, book, (row, _) in zip(stock_ids, books, accepted)
+                   if row['quantity']]
+        batch_ids = _insert(StockBatch, [{
+            **_base_row(now), 'stock_id': stock_id, 'initial_quantity': row['quantity'],
+            'remaining_quantity': row['quantity'], 'unit_cost': row['unit_cost'],
+            'received_date': row['received_date'] or today, 'supplier_id': book['publisher_id'],
+            'notes': IMPORT_REASON,
+        } for stock_id, book, row in stocked])
+        _insert(StockHistory, [{
+            **_base_row(now), 'stock_id': stock_id, 'batch_id': batch_id, 'change_type': 'restock',
+            'quantity_change': row['quantity'], 'before_quantity': 0, 'after_quantity': row['quantity'],
+            'changed_by_id': user_id, 'reason': IMPORT_REASON, 'order_id': None,
+        } for batch_id, (stock_id, _, row) in zip(batch_ids, stocked)])
+        _insert(PriceHistory, [{
+            **_base_row(now), 'stock_id': stock_id, 'old_price': Decimal('0.00'), 'new_price': row['price'],
+            'old_discount_percentage': Decimal('0.00'), 'new_discount_percentage': row['discount_percentage'],
+            'changed_by_id': user_id, 'reason': IMPORT_REASON,
+        } for stock_id, (row, _) in zip(stock_ids, accepted) if row['price']])
+
+        # bulk_create sends no signals: do what the catalog's receivers would (src.core.apps)
+        bump_on_commit(CATALOG)
+        bump_on_commit(PRICES)
+        for model in created:
+            bump_on_commit(choices.namespace(model))
+        record_change_on_commit(KINDS_BY_MODEL[Book], book_ids)
+        for label, model in (('Publisher', Publisher), ('Author', Author), ('Genre', Genre)):
+            # Their book counts rank their suggestions
+            record_change_on_commit(KINDS_BY_MODEL[model],
+                                    {pk for _, links in accepted for pk in links.get(label, [])})
+        self.counts['batches'] += len(batch_ids)
+        for model, pks in created.items():
+            self.counts[f"new {model._meta.verbose_name_plural.lower()}"] += len(pks)
+        return books
+
+
+def store_rejects(rejects, name):
+    """
+        Save a rejects file (an open text file) under CATALOG_IMPORT_REJECTS_DIR in the default
+        storage; returns its file name there.
+        """
+    rejects.seek(0)
+    path = default_storage.save(os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, name), File(rejects))
+    return os.path.basename(path)
+
+
+def import_file(source, file_format, user, name):
+    """
+        CatalogImport of a binary file object, its rejects stored (store_rejects) as
+        '<name>.rejects.jsonl'. Returns (job, rejects file name or None, the MALFORMED error
+        that stopped the file part way or None).
+        """
+    rejects_name = error = None
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as rejects:
+        job = CatalogImport(rejects=rejects, user=user)
+        try:
+            job.run(read_records(source, file_format))
+        except MALFORMED as e:
+            error = e
+        if job.counts['rejected']:
+            rejects_name = store_rejects(rejects, f"{name}.rejects.jsonl")
+    return job, rejects_name, error
@@ -1,8 +1,11 @@
 from django.db import models
-from django.db.models import ExpressionWrapper, Case, When, Value, Sum
+from django.db.models import ExpressionWrapper, Case, When, Value, Sum, Count, Q
 from django.db.models.fields import BooleanField
 from django.db.models.functions import Coalesce
 
+from src.core.managers import ActiveObjectsManager
+from src.core.querysets import SafeDeleteQuerySet
+
 
 class BookQuerySet(models.QuerySet):
     def can_sell(self):
@@ -17,6 +20,13 @@ class BookQuerySet(models.QuerySet):
             )
         )
 
+    def in_genre_subtrees(self, genres):
+        """
+            Books filed under any of `genres` (instances, ids or a queryset) or anything below
+            them. A subquery, so it leaves annotations such as can_sell()'s Sum alone.
+            """
+        return self.filter(pk__in=self.model.objects.filter(genres__ancestor_links__ancestor__in=genres).values('pk'))
+
 
 class BookManager(models.Manager):
     def get_queryset(self):
@@ -24,3 +34,57 @@ class BookManager(models.Manager):
 
     def can_sell(self):
         return self.get_queryset().can_sell()
+
+    def in_genre_subtrees(self, genres):
+        return self.get_queryset().in_genre_subtrees(genres)
+
+
+class GenreQuerySet(SafeDeleteQuerySet):
+    """
+        Tree lookups through GenreClosure; each is one indexed join whatever the depth.
+        """
+
+    def descendants_of(self, genre, include_self=False):
+        queryset = self.filter(ancestor_links__ancestor=genre)
+        return queryset if include_self else queryset.exclude(pk=getattr(genre, 'pk', genre))
+
+    def ancestors_of(self, genre, include_self=False):
+        """
+            Root first.
+            """
+        queryset = self.filter(descendant_links__descendant=genre).order_by('-descendant_links__depth')
+        return queryset if include_self else queryset.exclude(pk=getattr(genre, 'pk', genre))
+
+    def roots(self):
+        return self.filter(parent_genre__isnull=True)
+
+    def with_subtree_book_counts(self):
+        """
+            Annotate `subtree_book_count`: active books in the genre or any active subgenre.
+            """
+        return self.annotate(subtree_book_count=Count(
+            'descendant_links__descendant__books', distinct=True,
+            filter=Q(descendant_links__descendant__deleted_at__isnull=True,
+                     descendant_links__descendant__books__deleted_at__isnull=True),
+        ))
+
+
+class GenreManager(ActiveObjectsManager):
+    """
+        Active genres (like ActiveObjectsManager) with the GenreQuerySet tree lookups.
+        """
+
+    def get_queryset(self):
+        return GenreQuerySet(self.model, using=self._db).active()
+
+    def descendants_of(self, genre, include_self=False):
+        return self.get_queryset().descendants_of(genre, include_self)
+
+    def ancestors_of(self, genre, include_self=False):
+        return self.get_queryset().ancestors_of(genre, include_self)
+
+    def roots(self):
+        return self.get_queryset().roots()
+
+    def with_subtree_book_counts(self):
+        return self.get_queryset().with_subtree_book_counts()
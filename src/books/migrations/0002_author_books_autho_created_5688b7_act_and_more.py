@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='books_autho_created_5688b7_act'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['name', 'nationality'], name='books_autho_name_f5e086_act'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='books_book_created_703a90_act'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['title', 'publication_date'], name='books_book_title_cfabdf_act'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='books_genre_created_13ab47_act'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='books_publi_created_1616c6_act'),
+        ),
+    ]
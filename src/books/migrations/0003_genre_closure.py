@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Genre = apps.get_model('books', 'Genre')
+    GenreClosure = apps.get_model('books', 'GenreClosure')
+    parents = dict(Genre.objects.values_list('id', 'parent_genre_id'))
+    rows = []
+    for genre_id in parents:
+        ancestor_id, depth = genre_id, 0
+        while ancestor_id is not None:
+            rows.append(GenreClosure(ancestor_id=ancestor_id, descendant_id=genre_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    GenreClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_author_books_autho_created_5688b7_act_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='books.genre')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='books.genre')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='books_genre_descend_c9e639_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_genre_closure_pair')],
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# GIN trigram indexes on UPPER(column::text), the expression Django's icontains / istartswith
+# compare on PostgreSQL, so the admin searches and the autocomplete fallback can use them
+TRIGRAM_INDEXES = [
+    ('books_book_title_trgm', 'books_book', 'title'),
+    ('books_author_name_trgm', 'books_author', 'name'),
+    ('books_publisher_name_trgm', 'books_publisher', 'name'),
+    ('books_genre_name_trgm', 'books_genre', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_genre_closure'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='profile_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,8 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models import UniqueConstraint
 from django.db.models.functions import Lower
 
-from src.books.managers import BookManager
+from src.books.managers import BookManager, GenreManager
 from src.core.models import AbstractBaseModel
 
 
@@ -14,6 +14,8 @@ class Author(AbstractBaseModel):
     nationality = models.CharField(max_length=225, db_index=True)
     website = models.URLField(blank=True, null=True)
     profile_image = models.ImageField(upload_to='author_profiles', blank=True)
+    # Thumbnails of profile_image (src.books.images): its name, content hash and widths
+    profile_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -59,6 +61,8 @@ class Genre(AbstractBaseModel):
     description = models.TextField(blank=True, null=True)
     parent_genre = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subgenre')
 
+    objects = GenreManager()
+
     def __str__(self):
         return self.name
 
@@ -66,6 +70,108 @@ class Genre(AbstractBaseModel):
         ordering = ['name']
         verbose_name_plural = 'Genres'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() can tell a move from any other edit
+        instance._loaded_parent_id = instance.__dict__.get('parent_genre_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+                Save and keep GenreClosure in step: new genres are linked under their parent's
+                ancestors, moved genres take their whole subtree along.
+                """
+        adding = self._state.adding
+        if adding:
+            moved = False
+        elif hasattr(self, '_loaded_parent_id'):
+            moved = self.parent_genre_id != self._loaded_parent_id
+        else:
+            moved = self.parent_genre_id != Genre.all_objects.filter(pk=self.pk).values_list(
+                'parent_genre_id', flat=True).first()
+        if moved and self.parent_genre_id and GenreClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_genre_id).exists():
+            raise ValueError("A genre cannot be moved under itself or one of its subgenres")
+
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if adding:
+                GenreClosure.link(self)
+            elif moved:
+                GenreClosure.move(self)
+        self._loaded_parent_id = self.parent_genre_id
+
+    def descendants(self, include_self=False):
+        return Genre.objects.descendants_of(self, include_self=include_self)
+
+    def ancestors(self, include_self=False):
+        return Genre.objects.ancestors_of(self, include_self=include_self)
+
+
+class GenreClosure(models.Model):
+    """
+        Closure table of the genre tree: one row per (ancestor, descendant) pair, a genre being
+        its own ancestor at depth 0. Subtrees, ancestor chains and subtree counts are single
+        indexed joins at any depth. Maintained by Genre.save(); hard deletes cascade.
+        """
+    ancestor = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Genre, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_genre_closure_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def link(cls, genre):
+        rows = [cls(ancestor_id=genre.pk, descendant_id=genre.pk, depth=0)]
+        if genre.parent_genre_id:
+            rows += [
+                cls(ancestor_id=ancestor_id, descendant_id=genre.pk, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(descendant_id=genre.parent_genre_id).values_list(
+                    'ancestor_id', 'depth')
+            ]
+        cls.objects.bulk_create(rows)
+
+    @classmethod
+    def move(cls, genre):
+        subtree = list(cls.objects.filter(ancestor_id=genre.pk).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        # Links from the old ancestors into the subtree; links inside it stay
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if genre.parent_genre_id:
+            ancestors = cls.objects.filter(descendant_id=genre.parent_genre_id).values_list('ancestor_id', 'depth')
+            cls.objects.bulk_create([
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=above + below + 1)
+                for ancestor_id, above in ancestors
+                for descendant_id, below in subtree
+            ])
+
+    @classmethod
+    def rebuild(cls):
+        """
+                Recompute every link from parent_genre, for rows written without Genre.save()
+                (queryset updates, raw imports).
+                """
+        parents = dict(Genre.all_objects.values_list('id', 'parent_genre_id'))
+        rows = []
+        for genre_id in parents:
+            ancestor_id, depth = genre_id, 0
+            while ancestor_id is not None:
+                rows.append(cls(ancestor_id=ancestor_id, descendant_id=genre_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+
 
 class Book(AbstractBaseModel):
     # Core Book Information
@@ -74,6 +180,8 @@ class Book(AbstractBaseModel):
     pages = models.PositiveIntegerField(blank=True, null=True)
     language = models.CharField(max_length=225, default='English', db_index=True)
     cover_image = models.ImageField(upload_to='book_covers', blank=True)
+    # Thumbnails of cover_image (src.books.images): its name, content hash and widths
+    cover_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     isbn = models.CharField(max_length=13, unique=True, blank=True, null=True, db_index=True)
     publication_date = models.DateField(null=False, blank=False)
     edition = models.CharField(max_length=50, blank=True, null=True)
@@ -86,6 +194,12 @@ class Book(AbstractBaseModel):
 
     objects = BookManager()
 
+    # Soft delete / restore carry the book's stock (and its batches and history) along
+    soft_delete_cascade = ('stock',)
+    # Cart lines have no soft delete: they leave the carts with the book and stay out after a restore,
+    # so nobody checks out a book at the price it had when it was binned
+    soft_delete_drop = ('cart_items',)
+
     def __str__(self):
         author_names = ', '.join(author.name for author in self.authors.all())
         return f"{self.title} by {author_names}" if author_names else self.title
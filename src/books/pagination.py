@@ -1,7 +1,28 @@
 from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
+from src.core.cache import CATALOG, get_or_set
 
-def paginate_queryset(request, queryset, default_limit=10):
+
+class CatalogCountPaginator(Paginator):
+    """
+        Paginator whose row count comes from the catalog cache under `count_key`, sparing
+        the COUNT over the whole filtered catalog on every page view.
+        """
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return get_or_set(CATALOG, self.count_key, self._count_rows)
+
+    def _count_rows(self):
+        return super().count
+
+
+def paginate_queryset(request, queryset, default_limit=10, count_key=None):
     # Get limit from GET params
     limit = request.GET.get('limit', default_limit)
     # print("limit before try", limit)
@@ -15,7 +36,10 @@ def paginate_queryset(request, queryset, default_limit=10):
     page_number = request.GET.get('page')
 
     # Create paginator
-    paginator = Paginator(queryset, limit)
+    if count_key:
+        paginator = CatalogCountPaginator(queryset, limit, count_key)
+    else:
+        paginator = Paginator(queryset, limit)
     page_obj = paginator.get_page(page_number)
 
     return page_obj, limit
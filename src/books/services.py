@@ -0,0 +1,114 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, ProtectedError, RestrictedError
+from django.utils import timezone
+
+from src.books.models import Book
+from src.cart.models import CartItem
+from src.orders.models import OrderItem
+from src.stock.models import Stock, StockBatch, StockHistory, PriceHistory, StockReservation
+
+
+def _hard_delete(queryset, removed):
+    # SafeDeleteQuerySet.delete() only soft deletes, so use hard_delete() where it exists
+    delete = getattr(queryset, 'hard_delete', queryset.delete)
+    _, per_model = delete()
+    removed.update({label: count for label, count in per_model.items() if count})
+
+
+def _purge_stocks(stock_ids, removed):
+    """
+        Remove stocks bottom up: history rows, price history, batches, then the stock itself.
+        Reservations are never touched; stocks that have any are protected.
+        """
+    _hard_delete(StockHistory.all_objects.filter(stock_id__in=stock_ids), removed)
+    _hard_delete(PriceHistory.all_objects.filter(stock_id__in=stock_ids), removed)
+    _hard_delete(StockBatch.all_objects.filter(stock_id__in=stock_ids), removed)
+    _hard_delete(Stock.all_objects.filter(id__in=stock_ids), removed)
+
+
+def _purge_books(book_ids, removed):
+    """
+        Remove books with their stock tree, cart lines and author/genre links, then the books.
+        Books that were ever ordered are protected, so order items are never touched.
+        """
+    stock_ids = list(Stock.all_objects.filter(book_id__in=book_ids).values_list('id', flat=True))
+    if stock_ids:
+        _purge_stocks(stock_ids, removed)
+    _hard_delete(CartItem.objects.filter(book_id__in=book_ids), removed)
+    _hard_delete(Book.authors.through.objects.filter(book_id__in=book_ids), removed)
+    _hard_delete(Book.genres.through.objects.filter(book_id__in=book_ids), removed)
+    _hard_delete(Book.all_objects.filter(id__in=book_ids), removed)
+
+
+# model -> (rows that must be kept even after retention, delete function)
+PURGE_POLICIES = [
+    (Book, Exists(OrderItem.all_objects.filter(book=OuterRef('pk'))), _purge_books),
+    (Stock, Exists(StockReservation.all_objects.filter(stock=OuterRef('pk'))), _purge_stocks),
+]
+
+
+def _purge_model(model, protected, purge, batch_size):
+    retention_days = settings.RECYCLE_BIN_RETENTION_DAYS[model._meta.label]
+    expired = model.deleted_objects.filter(deleted_at__lt=timezone.now() - timedelta(days=retention_days))
+
+    removed = Counter()
+    skipped = 0
+    last_pk = 0
+
+    while True:
+        with transaction.atomic():
+            ids = list(
+                expired.filter(pk__gt=last_pk).exclude(protected)
+                .select_for_update(skip_locked=True)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            try:
+                with transaction.atomic():
+                    chunk_removed = Counter()
+                    purge(ids, chunk_removed)
+                removed.update(chunk_removed)
+            except (ProtectedError, RestrictedError):
+                # Some row is still referenced through a PROTECT/RESTRICT relation; retry one
+                # by one so the rest of the chunk is still purged.
+                for pk in ids:
+                    try:
+                        with transaction.atomic():
+                            row_removed = Counter()
+                            purge([pk], row_removed)
+                        removed.update(row_removed)
+                    except (ProtectedError, RestrictedError):
+                        skipped += 1
+
+        last_pk = ids[-1]
+        if len(ids) < batch_size:
+            break
+
+    return {
+        'purged': removed[model._meta.label],
+        'protected': expired.filter(protected).count() + skipped,
+        'removed': dict(removed),
+    }
+
+
+def purge_recycle_bin(batch_size=None):
+    """
+        Hard delete soft deleted Books and Stocks older than RECYCLE_BIN_RETENTION_DAYS.
+
+        Rows are claimed in primary key order, batch_size at a time, each chunk in its own
+        transaction. Dependents are deleted explicitly before their parents instead of relying
+        on the ORM cascade collector. Rows that still carry order history (order items or
+        stock reservations) are kept and reported as protected.
+        Returns a report per model label with purged, protected and every removed row count.
+        """
+    batch_size = batch_size or settings.RECYCLE_BIN_PURGE_BATCH_SIZE
+    return {
+        model._meta.label: _purge_model(model, protected, purge, batch_size)
+        for model, protected, purge in PURGE_POLICIES
+    }
@@ -0,0 +1,59 @@
+import os
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+from django.urls import reverse
+
+from src.books import autocomplete, images, importer, services
+from src.users.models import User
+
+
+@shared_task
+def purge_recycle_bin():
+    report = services.purge_recycle_bin()
+    print(f"[RECYCLE BIN] Purge report: {report}")
+
+    return ", ".join(
+        f"{label}: purged {result['purged']}, protected {result['protected']}" for label, result in report.items()
+    )
+
+
+# Queued on upload and by backfill_image_derivatives --enqueue; nothing waits on its result, so publishing
+# doesn't subscribe to the result backend
+@shared_task(ignore_result=True)
+def build_image_derivatives(model_label, pks):
+    # Tasks queued before batching carry a single pk
+    pks = [pks] if isinstance(pks, int) else pks
+    manifests = images.build_batch(apps.get_model(model_label), pks)
+    return f"{model_label}: {sum(1 for manifest in manifests.values() if manifest)} of {len(pks)} built"
+
+
+@shared_task(ignore_result=True)
+def publish_autocomplete_snapshots():
+    for kind in autocomplete.SOURCES:
+        _, index = autocomplete.publish_snapshot(kind)
+        print(f"[AUTOCOMPLETE] Published the {kind} index: {len(index)} rows")
+
+
+# Admin uploads over CATALOG_IMPORT_INLINE_MAX_BYTES, stored by BookImportView; the uploader gets the results by email
+@shared_task(ignore_result=True)
+def import_catalog_upload(path, file_format, user_pk, upload_name):
+    user = User.objects.filter(pk=user_pk).first()
+    try:
+        with default_storage.open(path, 'rb') as source:
+            job, rejects_name, error = importer.import_file(source, file_format, user,
+                                                            os.path.splitext(upload_name)[0])
+    finally:
+        default_storage.delete(path)
+
+    lines = [f"{name}: {count}" for name, count in sorted(job.counts.items())]
+    if error:
+        lines.append(f"Stopped after {job.counts['read']} rows, the file is malformed: {error}")
+    if rejects_name:
+        lines.append(f"Rejected rows: {settings.SITE_URL}{reverse('book_import_rejects', args=[rejects_name])}")
+    print(f"[CATALOG IMPORT] {upload_name}: {', '.join(lines)}")
+    if user is not None:
+        send_mail(f"Catalog import of {upload_name}", "\n".join(lines), settings.EMAIL_HOST_USER, [user.email])
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from src.books.fragments import render_book_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def book_cards(books):
+    """Storefront cards for `books`, assembled from cached per-book fragments"""
+    return mark_safe(render_book_cards(books))
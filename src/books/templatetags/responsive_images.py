@@ -0,0 +1,33 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from src.books.images import current_manifest, derivative_name
+
+register = template.Library()
+
+
+def _srcset(manifest, extension):
+    return ', '.join(f"{default_storage.url(derivative_name(manifest['source'], manifest['hash'], width, extension))} {width}w"
+                     for width in manifest['widths'])
+
+
+@register.simple_tag
+def responsive_image(instance, field_name, sizes, alt='', css_class=''):
+    """
+        Lazy loaded <img> of `instance.<field_name>`: WebP and JPEG srcsets of its derivatives for
+        the browser to pick from by `sizes`, or the original upload until they are built.
+        """
+    manifest = current_manifest(instance, field_name)
+    if manifest is None:
+        return format_html('<img class="{}" src="{}" alt="{}" loading="lazy" decoding="async"/>',
+                           css_class, getattr(instance, field_name).url, alt)
+    fallback = derivative_name(manifest['source'], manifest['hash'], manifest['widths'][-1], 'jpeg')
+    # display: contents keeps <picture> out of the layout, the <img> sizes against its container as before
+    return format_html(
+        '<picture style="display: contents"><source type="image/webp" srcset="{}" sizes="{}"/>'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" '
+        'decoding="async"/></picture>',
+        _srcset(manifest, 'webp'), sizes, css_class, default_storage.url(fallback), _srcset(manifest, 'jpeg'),
+        sizes, manifest['width'], manifest['height'], alt,
+    )
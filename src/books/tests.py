@@ -1,3 +1,756 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from PIL import Image
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.template import Context, Template
+from django.template.loader import render_to_string
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from src.books.choices import option_page
+from src.books.autocomplete import INDEXES, SOURCES, LiveIndex, PrefixIndex, normalize
+from src.books.facets import FacetSelection, canonical_params, compute_facet_counts
+from src.books.forms import BookForm
+from src.books.images import build_derivatives, derivative_names
+from src.books.fragments import CARD_TEMPLATE, fragment_cache, render_book_cards
+from src.books.importer import BOOK_DUPLICATE, CatalogImport, read_records
+from src.books.models import Author, Book, Genre, GenreClosure, Publisher
+from src.books.services import purge_recycle_bin
+from src.books.tasks import build_image_derivatives, import_catalog_upload
+from src.books.utils import searchfilter_bookStore
+from src.cart.models import Cart, CartItem
+from src.orders.models import Order, OrderItem
+from src.core.cache import CATALOG, generation as catalog_generation, local_cache
+from src.stock.models import Stock, StockBatch, StockHistory
+from src.users.models import User
+
+
+class GenreTreeTests(TestCase):
+    """
+        GenreClosure follows creates, moves and deletes, and the tree lookups read it.
+        """
+
+    def setUp(self):
+        self.fiction = Genre.objects.create(name='Fiction')
+        self.fantasy = Genre.objects.create(name='Fantasy', parent_genre=self.fiction)
+        self.epic = Genre.objects.create(name='Epic Fantasy', parent_genre=self.fantasy)
+        self.history = Genre.objects.create(name='History')
+        publisher = Publisher.objects.create(name='Tree Press', founded_year=2000)
+        for title, genre in [('Saga', self.epic), ('Quest', self.fantasy), ('Rome', self.history)]:
+            Book.objects.create(title=title, publisher=publisher, publication_date='2020-01-01').genres.add(genre)
+
+    def names(self, queryset):
+        return [genre.name for genre in queryset]
+
+    def test_descendants_and_ancestors(self):
+        self.assertEqual(self.names(self.fiction.descendants().order_by('name')), ['Epic Fantasy', 'Fantasy'])
+        self.assertEqual(self.names(self.epic.ancestors()), ['Fiction', 'Fantasy'])
+        self.assertEqual(self.names(self.epic.ancestors(include_self=True)), ['Fiction', 'Fantasy', 'Epic Fantasy'])
+        self.assertEqual(self.names(Genre.objects.roots()), ['Fiction', 'History'])
+
+    def test_subtree_book_counts_and_book_filter(self):
+        counts = dict(Genre.objects.with_subtree_book_counts().values_list('name', 'subtree_book_count'))
+        self.assertEqual(counts, {'Fiction': 2, 'Fantasy': 2, 'Epic Fantasy': 1, 'History': 1})
+        titles = Book.objects.in_genre_subtrees([self.fiction]).order_by('title').values_list('title', flat=True)
+        self.assertEqual(list(titles), ['Quest', 'Saga'])
+
+    def test_move_carries_the_subtree(self):
+        self.fantasy.parent_genre = self.history
+        self.fantasy.save()
+        self.assertEqual(self.names(self.epic.ancestors()), ['History', 'Fantasy'])
+        self.assertEqual(list(self.fiction.descendants()), [])
+        self.assertEqual(GenreClosure.objects.get(ancestor=self.history, descendant=self.epic).depth, 2)
+
+        self.fantasy.parent_genre = None
+        self.fantasy.save()
+        self.assertEqual(self.names(self.epic.ancestors()), ['Fantasy'])
+
+    def test_cannot_move_under_own_subgenre(self):
+        self.fiction.parent_genre = self.epic
+        with self.assertRaises(ValueError):
+            self.fiction.save()
+
+    def test_hard_delete_removes_links_and_rebuild_matches(self):
+        links = set(GenreClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        GenreClosure.rebuild()
+        self.assertEqual(set(GenreClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')), links)
+
+        self.fantasy.hard_delete()
+        self.assertFalse(GenreClosure.objects.filter(descendant_id=self.epic.pk).exists())
+        self.assertEqual(self.names(Genre.objects.with_subtree_book_counts().filter(subtree_book_count__gt=0)),
+                         ['History'])
+
+
+class FacetTests(TestCase):
+    """
+        Storefront facets: disjunctive counts per facet and filters that keep can_sell() intact.
+        """
+
+    @classmethod
+    def setUpTestData(cls):
+        publisher = Publisher.objects.create(name='Facet Press', founded_year=2000)
+        cls.fantasy = Genre.objects.create(name='Fantasy')
+        cls.history = Genre.objects.create(name='History')
+        cls.author = Author.objects.create(name='Facet Author', nationality='np')
+        books = [
+            ('Dragon', 'English', [cls.fantasy], '300.00'),
+            ('Empire', 'English', [cls.history], '800.00'),
+            ('Dragon Empire', 'Nepali', [cls.fantasy, cls.history], '1500.00'),
+        ]
+        for title, language, genres, price in books:
+            book = Book.objects.create(title=title, language=language, publisher=publisher,
+                                       publication_date='2020-01-01')
+            book.genres.set(genres)
+            book.authors.add(cls.author)
+            stock = Stock.objects.create(book=book, current_price=Decimal(price))
+            StockBatch.objects.create(stock=stock, initial_quantity=5, remaining_quantity=5,
+                                      unit_cost=Decimal('100.00'), received_date='2024-01-01')
+            # Available once stocked, so the price bands follow these prices
+            stock.save()
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def counts(self, facets, name):
+        return {option['label']: option['count'] for option in facets[name]}
+
+    def test_each_facet_is_counted_without_its_own_filter(self):
+        selection = FacetSelection.from_query(QueryDict(f'genre={self.fantasy.uuid}&language=English'))
+        facets = compute_facet_counts(selection)
+
+        # Genres: English books only; languages: fantasy books only
+        self.assertEqual(self.counts(facets, 'genre'), {'Fantasy': 1, 'History': 1})
+        self.assertEqual(self.counts(facets, 'language'), {'English': 1, 'Nepali': 1})
+        self.assertEqual(self.counts(facets, 'author'), {'Facet Author': 1})
+        # Bands above the highest stocked price (1500) are not offered
+        self.assertEqual(self.counts(facets, 'price'), {'Rs 0 - 500': 1, 'Rs 500 - 1000': 0, 'Rs 1000 - 2000': 0})
+        self.assertTrue(next(option for option in facets['genre'] if option['label'] == 'Fantasy')['selected'])
+
+    def test_text_query_and_price_range_narrow_the_counts(self):
+        facets = compute_facet_counts(FacetSelection({}), 'Empire', (500, 2000))
+        self.assertEqual(self.counts(facets, 'genre'), {'Fantasy': 1, 'History': 2})
+        self.assertEqual(self.counts(facets, 'language'), {'English': 1, 'Nepali': 1})
+
+    def test_price_counts_match_the_books_their_links_show(self):
+        book = Book.objects.create(title='Boundary', language='English', publisher=Publisher.objects.first(),
+                                   publication_date='2020-01-01')
+        stock = Stock.objects.create(book=book, current_price=Decimal('500.00'))
+        StockBatch.objects.create(stock=stock, initial_quantity=5, remaining_quantity=5,
+                                  unit_cost=Decimal('100.00'), received_date='2024-01-01')
+        stock.save()
+
+        facets = compute_facet_counts(FacetSelection({}))
+        self.assertEqual(self.counts(facets, 'price'), {'Rs 0 - 500': 2, 'Rs 500 - 1000': 2, 'Rs 1000 - 2000': 1})
+        for option in facets['price']:
+            low, high = option['value']
+            books, _, _, _ = searchfilter_bookStore(Book.objects.can_sell(), None, str(low), str(high or ''))
+            self.assertEqual(books.count(), option['count'], option['label'])
+
+    def test_many_to_many_facets_do_not_inflate_can_sell(self):
+        selection = FacetSelection.from_query(QueryDict(f'genre={self.fantasy.uuid}&genre={self.history.uuid}'))
+        books = selection.apply(Book.objects.can_sell()).order_by('title')
+        self.assertEqual([(book.title, book.total_quantity) for book in books],
+                         [('Dragon', 5), ('Dragon Empire', 5), ('Empire', 5)])
+
+    def test_canonical_params_are_order_independent(self):
+        first = canonical_params(QueryDict('language=Nepali&genre=b&genre=a&page=3&q='))
+        second = canonical_params(QueryDict('genre=a&language=Nepali&genre=b'))
+        self.assertEqual(first, second)
+        self.assertEqual(first, 'genre=a&genre=b&language=Nepali')
+
+
+class AutocompleteTests(TestCase):
+    """
+        The typeahead prefix index: word start matching, ranking, and replaying catalog changes.
+        """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            publisher = Publisher.objects.create(name='Typeahead Press', founded_year=2000)
+            self.books = [
+                Book.objects.create(title=title, publisher=publisher, publication_date='2020-01-01')
+                for title in ['The Night Circus', 'Night Watch', 'Nightfall', 'Café Society']
+            ]
+
+    def test_prefix_index_matches_word_starts_by_score(self):
+        titles = ['The Night Circus', 'Night Watch', 'Knights', 'Nightfall', 'Café Society', 'Mid-Night']
+        rows = [(pk, uuid.UUID(int=pk), title, score) for pk, (title, score) in
+                enumerate(zip(titles, [5, 9, 7, 1, 3, 2]), start=1)]
+        # A scan limit of 1 precomputes the best rows of every block, the same answer as scanning
+        for scan_limit in (1, 100):
+            index = PrefixIndex(rows, 10, scan_limit)
+            labels = [index.row(owner)[2] for owner in index.search('night', 10)]
+            self.assertEqual(labels, ['Night Watch', 'The Night Circus', 'Mid-Night', 'Nightfall'])
+            self.assertEqual([index.row(owner)[2] for owner in index.search('night w', 10)], ['Night Watch'])
+            self.assertEqual([index.row(owner)[2] for owner in index.search('cafe', 10)], ['Café Society'])
+            self.assertEqual(index.search('nightw', 10), [])
+            self.assertEqual(len(index.search('n', 2, skip={2})), 2)
+        self.assertEqual(normalize('  Café-Society!'), 'cafe society')
+
+    @override_settings(AUTOCOMPLETE_SYNC_SECONDS=0)
+    def test_index_replays_catalog_changes(self):
+        index = LiveIndex('titles', SOURCES['titles'])
+        index.build()
+        self.assertEqual([result['label'] for result in index.search('nig', 10)],
+                         ['Night Watch', 'Nightfall', 'The Night Circus'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[1].title = 'Day Watch'
+            self.books[1].save()
+            self.books[2].delete()
+            Book.objects.create(title='Nighthawks', publisher=self.books[0].publisher, publication_date='2020-01-01')
+        self.assertEqual([result['label'] for result in index.search('nig', 10)], ['Nighthawks', 'The Night Circus'])
+        self.assertEqual([result['label'] for result in index.search('day', 10)], ['Day Watch'])
+
+    def test_processes_load_the_shared_snapshot_instead_of_rebuilding(self):
+        first, second = LiveIndex('titles', SOURCES['titles']), LiveIndex('titles', SOURCES['titles'])
+        first.build()
+        with self.assertNumQueries(0):
+            second.build()
+        self.assertEqual(second.built_at, first.built_at)
+        self.assertEqual([result['label'] for result in second.search('nig', 10)],
+                         ['Night Watch', 'Nightfall', 'The Night Circus'])
+
+        # Up to date: nothing newer to load, and the snapshot is not rebuilt
+        with self.assertNumQueries(0):
+            second.build()
+        self.assertEqual(second.built_at, first.built_at)
+
+        # Behind the change log: one process rebuilds at a time, the others keep their index meanwhile
+        lock = 'autocomplete:titles:snapshot:lock'
+        cache.add(lock, 1)
+        with self.assertNumQueries(0):
+            second.build(behind=True)
+        self.assertEqual(second.built_at, first.built_at)
+        cache.delete(lock)
+        second.build(behind=True)
+        self.assertGreater(second.built_at, first.built_at)
+        with self.assertNumQueries(0):
+            first.build()
+        self.assertEqual(first.built_at, second.built_at)
+
+    def test_endpoint_falls_back_to_the_database_until_the_index_is_built(self):
+        customer = User.objects.create_user(email='typeahead@example.com', password=None, first_name='Type',
+                                            last_name='Ahead')
+        customer.is_active = True
+        customer.save(update_fields=['is_active'])
+        self.client.force_login(customer)
+        live = INDEXES['titles']
+        live.index, live._building = None, True  # as if a background build were still running
+        try:
+            response = self.client.get(reverse('autocomplete', args=['titles']), {'q': 'night'})
+            self.assertEqual(response.json()['source'], 'database')
+            self.assertEqual({result['label'] for result in response.json()['results']},
+                             {'The Night Circus', 'Night Watch', 'Nightfall'})
+
+            live.build()
+            response = self.client.get(reverse('autocomplete', args=['titles']), {'q': 'night', 'limit': 2})
+            self.assertEqual(response.json()['source'], 'index')
+            self.assertEqual(len(response.json()['results']), 2)
+        finally:
+            live.index, live._building = None, False
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['isbns']), {'q': 'x'}).status_code, 404)
+
+
+class BookFormChoiceTests(TestCase):
+    """
+        BookForm relation selects render only their selection and validate only the submitted ids.
+        """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.publisher = Publisher.objects.create(name='Choice Press', founded_year=2000)
+            self.authors = [Author.objects.create(name=f'Choice Author {n}', nationality='np') for n in range(5)]
+            self.book = Book.objects.create(title='Choices', publisher=self.publisher, publication_date='2020-01-01')
+            self.book.authors.add(self.authors[1])
+
+    def test_edit_form_renders_only_selected_options(self):
+        form = BookForm(instance=self.book)
+        self.assertEqual(list(form.fields['authors'].choices), [(self.authors[1].pk, 'Choice Author 1')])
+        self.assertEqual(list(form.fields['genres'].choices), [])
+        self.assertEqual(list(form.fields['publisher'].choices), [('', '---------'), (self.publisher.pk, 'Choice Press')])
+        self.assertEqual(form.fields['authors'].widget.attrs['data-options-url'], reverse('choice_options',
+                                                                                          args=['authors']))
+
+    def test_submitted_ids_are_validated_against_the_database(self):
+        data = {'title': 'Chosen', 'language': 'English', 'publisher': self.publisher.pk,
+                'authors': [self.authors[3].pk, self.authors[4].pk]}
+        form = BookForm(data)
+        form.is_valid()
+        self.assertNotIn('authors', form.errors)
+        self.assertEqual(list(form.fields['authors'].choices), [(self.authors[3].pk, 'Choice Author 3'),
+                                                               (self.authors[4].pk, 'Choice Author 4')])
+        self.assertEqual(set(form.cleaned_data['authors']), {self.authors[3], self.authors[4]})
+
+        self.authors[4].delete()
+        form = BookForm({**data, 'authors': [self.authors[4].pk]})
+        form.is_valid()
+        self.assertIn('authors', form.errors)
+
+    @override_settings(CHOICE_PAGE_SIZE=2)
+    def test_option_pages_are_searchable_and_follow_writes(self):
+        first = option_page(Author)
+        self.assertEqual([option['text'] for option in first['results']], ['Choice Author 0', 'Choice Author 1'])
+        self.assertTrue(first['pagination']['more'])
+        self.assertFalse(option_page(Author, page=3)['pagination']['more'])
+        self.assertEqual([option['text'] for option in option_page(Author, 'author 3')['results']],
+                         ['Choice Author 3'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Author.objects.create(name='Aaron Choice', nationality='np')
+        self.assertEqual(option_page(Author)['results'][0]['text'], 'Aaron Choice')
+
+
+class CardFragmentTests(TestCase):
+    """
+        Storefront cards come from per-book fragments and re-render only when their rows change.
+        """
+
+    def setUp(self):
+        cache.clear()
+        fragment_cache.clear()
+        publisher = Publisher.objects.create(name='Fragment Press', founded_year=2000)
+        for title, price in [('Alpha', '300.00'), ('Beta', '500.00'), ('Gamma', '700.00')]:
+            book = Book.objects.create(title=title, publisher=publisher, publication_date='2020-01-01')
+            stock = Stock.objects.create(book=book, current_price=Decimal(price))
+            StockBatch.objects.create(stock=stock, initial_quantity=5, remaining_quantity=5,
+                                      unit_cost=Decimal('100.00'), received_date='2024-01-01')
+
+    def books(self):
+        return list(Book.objects.can_sell().order_by('title'))
+
+    def test_cached_cards_match_a_fresh_render_and_only_changed_ones_rerender(self):
+        books = self.books()
+        expected = ''.join(render_to_string(CARD_TEMPLATE, {'book': book}) for book in books)
+        with self.assertTemplateUsed(template_name=CARD_TEMPLATE, count=3):
+            self.assertEqual(render_book_cards(books), expected)
+        fragment_cache.clear()  # the shared cache still holds them
+        with self.assertTemplateNotUsed(template_name=CARD_TEMPLATE):
+            self.assertEqual(render_book_cards(self.books()), expected)
+
+        stock = books[1].stock
+        stock.current_price = Decimal('450.00')
+        stock.save()
+        with self.assertTemplateUsed(template_name=CARD_TEMPLATE, count=1):
+            html = render_book_cards(self.books())
+        self.assertIn('Rs 450', html)
+        self.assertNotIn('Rs 500', html)
+
+    def test_sold_out_card_is_rerendered(self):
+        render_book_cards(self.books())
+        StockBatch.objects.filter(stock__book__title='Gamma').update(remaining_quantity=0)
+        with self.assertTemplateUsed(template_name=CARD_TEMPLATE, count=1):
+            html = render_book_cards(self.books())
+        self.assertIn('Sold', html)
+
+
+class ConditionalStorefrontTests(TestCase):
+    """
+        Storefront pages answer revalidations with a 304 until the catalog or the customer's cart changes.
+        """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            publisher = Publisher.objects.create(name='Conditional Press', founded_year=2000)
+            self.book = Book.objects.create(title='Etag Book', publisher=publisher, publication_date='2020-01-01')
+            self.stock = Stock.objects.create(book=self.book, current_price=Decimal('300.00'))
+            StockBatch.objects.create(stock=self.stock, initial_quantity=5, remaining_quantity=5,
+                                      unit_cost=Decimal('100.00'), received_date='2024-01-01')
+        self.customer = User.objects.create_user(email='etag@example.com', password=None, first_name='E',
+                                                 last_name='Tag')
+        self.customer.is_active = True
+        self.customer.save(update_fields=['is_active'])
+        self.client.force_login(self.customer)
+
+    def revalidate(self, path, etag):
+        return self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_rendered_again(self):
+        for path, template in [(reverse('book_store'), 'books/book_store.html'),
+                               (reverse('book_detail_store', args=[self.book.uuid]), 'books/book_detail_store.html')]:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertNotIn('no-store', response['Cache-Control'])
+            self.assertTrue(response.has_header('Last-Modified'))
+            with self.assertTemplateNotUsed(template_name=template):
+                self.assertEqual(self.revalidate(path, response['ETag']).status_code, 304)
+
+        ajax = self.client.get(reverse('book_store'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertNotEqual(ajax['ETag'], self.client.get(reverse('book_store'))['ETag'])
+
+    def test_cart_and_catalog_changes_change_the_etag(self):
+        path = reverse('book_detail_store', args=[self.book.uuid])
+        etag = self.client.get(path)['ETag']
+
+        cart = Cart.objects.get(user=self.customer)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=2, unit_price=Decimal('300.00'))
+        response = self.revalidate(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['quantity'], 2)
+        etag = response['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stock.current_price = Decimal('250.00')
+            self.stock.save()
+        response = self.revalidate(path, etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        cart.items.all().delete()
+        self.assertEqual(self.revalidate(path, etag).status_code, 200)
+
+
+class CatalogImportTests(TestCase):
+    """
+        Bulk catalog import: names resolved per chunk, books stocked in bulk, bad rows rejected with reasons.
+        """
+
+    CSV = (
+        "title,isbn,publication_date,publisher,authors,genres,price,discount_percentage,quantity,unit_cost\n"
+        "Imported One,978-0-306-40615-7,2020-01-01,Known Press,known author|New Author,Imported Genre,"
+        "450.00,10,5,200\n"
+        "Imported Two,,2020-02-01,New Press,New Author,,0,0,0,0\n"
+        "Bad Isbn,9780306406158,2020-01-01,Known Press,New Author,,100,0,1,10\n"
+        "Existing,,2019-01-01,Known Press,New Author,,100,0,1,10\n"
+        "Imported One,,2020-01-01,known press,New Author,,100,0,1,10\n"
+        "Binned,,2020-01-01,Old Press,New Author,,100,0,1,10\n"
+        "No Date,,,Known Press,,,abc,0,1,10\n"
+    )
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.publisher = Publisher.objects.create(name='Known Press', founded_year=2000)
+            self.author = Author.objects.create(name='Known Author', nationality='Nepali')
+            Book.objects.create(title='Existing', publisher=self.publisher, publication_date='2019-01-01')
+            Publisher.objects.create(name='Old Press', founded_year=2000).delete()
+
+    def run_import(self, data, file_format, **kwargs):
+        rejects = io.StringIO()
+        job = CatalogImport(rejects=rejects, chunk_size=2, **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            job.run(read_records(io.BytesIO(data.encode()), file_format))
+        return job, [json.loads(line) for line in rejects.getvalue().splitlines()]
+
+    def test_csv_rows_become_stocked_books_and_failures_are_rejected(self):
+        generation = catalog_generation(CATALOG)
+        job, rejects = self.run_import(self.CSV, 'csv')
+
+        self.assertEqual((job.counts['read'], job.counts['imported'], job.counts['rejected']), (7, 2, 5))
+        self.assertEqual({reject['line']: reject['errors'][0].split(':')[0] for reject in rejects}, {
+            4: 'isbn', 5: 'A book with this Title, Publication Date, and Publisher already exists.',
+            6: 'A book with this Title, Publication Date, and Publisher already exists.',
+            7: "Publisher 'Old Press' is in the recycle bin.", 8: 'price',
+        })
+        self.assertEqual(sorted(error.split(':')[0] for error in rejects[-1]['errors']),
+                         ['authors', 'price', 'publication_date'])
+
+        book = Book.objects.get(title='Imported One')
+        self.assertEqual(book.isbn, '9780306406157')
+        self.assertEqual(book.publisher, self.publisher)
+        self.assertEqual(sorted(book.authors.values_list('name', flat=True)), ['Known Author', 'New Author'])
+        genre = book.genres.get()
+        self.assertEqual(list(genre.ancestors(include_self=True)), [genre])
+        self.assertTrue(book.stock.is_available)
+        self.assertTrue(book.stock.can_sell)
+        batch = book.stock.batches.get()
+        self.assertEqual((batch.remaining_quantity, batch.supplier), (5, self.publisher))
+        self.assertEqual(book.stock.stock_history.get().change_type, 'restock')
+        self.assertEqual(book.stock.price_history.get().new_price, Decimal('450.00'))
+
+        unstocked = Book.objects.get(title='Imported Two')
+        self.assertFalse(unstocked.stock.is_available)
+        self.assertFalse(unstocked.stock.batches.exists())
+        self.assertEqual(Author.objects.filter(name='New Author').count(), 1)
+        self.assertGreater(catalog_generation(CATALOG), generation)
+
+    def test_jsonl_and_onix_records(self):
+        jsonl = ('{"title": "Json Book", "publication_date": "2021-01-01", "publisher": "Known Press", '
+                 '"authors": ["Known Author"], "quantity": 3, "price": "120"}\n'
+                 'not json\n')
+        job, rejects = self.run_import(jsonl, 'jsonl')
+        self.assertEqual((job.counts['imported'], rejects[0]['line']), (1, 2))
+
+        onix = ('<ONIXMessage xmlns="http://ns.editeur.org/onix/3.0/reference"><Product>'
+                '<ProductIdentifier><IDValue>9780306406157</IDValue></ProductIdentifier>'
+                '<TitleDetail><TitleElement><TitleText>Onix Book</TitleText></TitleElement></TitleDetail>'
+                '<Contributor><PersonName>Known Author</PersonName></Contributor>'
+                '<Contributor><PersonName>Second Author</PersonName></Contributor>'
+                '<Publisher><PublisherName>Known Press</PublisherName></Publisher>'
+                '<PublicationDate>20200301</PublicationDate>'
+                '</Product></ONIXMessage>')
+        job, rejects = self.run_import(onix, 'onix')
+        self.assertEqual(rejects, [])
+        book = Book.objects.get(title='Onix Book')
+        self.assertEqual((book.isbn, str(book.publication_date)), ('9780306406157', '2020-03-01'))
+        self.assertEqual(book.authors.count(), 2)
+
+    def test_existing_books_are_matched_in_any_case(self):
+        job, rejects = self.run_import("title,publication_date,publisher,authors\n"
+                                       "EXISTING,2019-01-01,Known Press,Known Author\n", 'csv')
+        self.assertEqual(job.counts['imported'], 0)
+        self.assertEqual(rejects[0]['errors'], [BOOK_DUPLICATE])
+
+    def test_rows_read_before_a_malformed_part_are_imported(self):
+        padding = 'x' * 9000
+        data = (f"title,publication_date,publisher,authors,description\n"
+                f"Read One,2020-01-01,Known Press,Known Author,\n"
+                f"Read Two,2020-01-01,Known Press,Known Author,{padding}\n"
+                f"Read Three,2020-01-01,Known Press,Known Author,\n"
+                f"Unread,2020-01-01,Known Press,Known Author,{padding}").encode() + b'\xff\n'
+        job = CatalogImport(chunk_size=2)
+        with self.assertRaises(UnicodeDecodeError), self.captureOnCommitCallbacks(execute=True):
+            job.run(read_records(io.BytesIO(data), 'csv'))
+        # The third row was in a chunk still being filled when the file could not be decoded
+        self.assertEqual((job.counts['read'], job.counts['imported']), (3, 3))
+        self.assertTrue(Book.objects.filter(title='Read Three').exists())
+
+    @override_settings(CATALOG_IMPORT_INLINE_MAX_BYTES=10,
+                       EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_large_admin_uploads_are_imported_by_a_task(self):
+        admin = User.objects.create_superuser(email='import-queue@example.com', password=None, first_name='Import',
+                                              last_name='Queue')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        with mock.patch('src.books.tasks.import_catalog_upload.apply_async') as apply_async:
+            response = self.client.post(reverse('book_import'), {'file': upload})
+        self.assertRedirects(response, reverse('book_import'))
+        self.assertFalse(Book.objects.filter(title='Imported One').exists())
+        (path, file_format, user_pk, upload_name), = apply_async.call_args.args
+        self.assertEqual((file_format, user_pk, upload_name), ('csv', admin.pk, 'catalog.csv'))
+
+        with self.captureOnCommitCallbacks(execute=True), redirect_stdout(io.StringIO()):
+            import_catalog_upload(path, file_format, user_pk, upload_name)
+        self.assertTrue(Book.objects.filter(title='Imported One').exists())
+        self.assertFalse(default_storage.exists(path))
+        report = mail.outbox[-1]
+        self.assertEqual(report.to, [admin.email])
+        self.assertIn('imported: 2', report.body)
+        name = report.body.rsplit('/', 1)[-1]
+        self.assertTrue(default_storage.exists(os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, name)))
+        default_storage.delete(os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, name))
+
+    def test_admin_upload_reports_and_serves_rejects(self):
+        admin = User.objects.create_superuser(email='import-admin@example.com', password=None, first_name='Import',
+                                              last_name='Admin')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('book_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(('imported', 2), response.context['counts'])
+        self.assertEqual(len(response.context['first_rejects']), 5)
+
+        name = response.context['rejects_name']
+        download = self.client.get(reverse('book_import_rejects', args=[name]))
+        try:
+            self.assertEqual(len(b''.join(download.streaming_content).splitlines()), 5)
+        finally:
+            default_storage.delete(os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, name))
+        self.assertEqual(self.client.get(reverse('book_import_rejects', args=['missing.jsonl'])).status_code, 404)
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=[160, 320, 640])
+class ImageDerivativeTests(TestCase):
+    """
+        Uploaded covers and photos get hashed WebP and JPEG thumbnails, served through srcset.
+        """
+
+    TAG = Template("{% load responsive_images %}{% responsive_image book 'cover_image' '240px' alt=book.title %}")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.publisher = Publisher.objects.create(name='Image Press', founded_year=2000)
+
+    def upload(self, name, size, mode='RGBA', color=(200, 30, 30, 128)):
+        data = io.BytesIO()
+        Image.new(mode, size, color).save(data, 'PNG')
+        return SimpleUploadedFile(name, data.getvalue(), content_type='image/png')
+
+    def test_upload_queues_a_build_and_the_tag_serves_its_srcset(self):
+        with mock.patch('src.books.tasks.build_image_derivatives.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                book = Book.objects.create(title='Pictured', publisher=self.publisher, publication_date='2020-01-01',
+                                           cover_image=self.upload('pictured.png', (500, 750)))
+        apply_async.assert_called_once_with(('books.Book', [book.pk]), retry=False)
+        html = self.TAG.render(Context({'book': book}))
+        self.assertIn(f'src="{book.cover_image.url}"', html)
+        self.assertIn('loading="lazy"', html)
+
+        manifest = build_derivatives(Book, book.pk)
+        self.assertEqual((manifest['widths'], manifest['width'], manifest['height']), ([160, 320, 500], 500, 750))
+        for name in derivative_names(manifest):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(derivative_names(manifest)[1]) as jpeg:
+            self.assertEqual(Image.open(jpeg).mode, 'RGB')
+
+        book.refresh_from_db()
+        html = self.TAG.render(Context({'book': book}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f".{manifest['hash']}.320.webp 320w", html)
+        self.assertIn(f".{manifest['hash']}.500.jpeg 500w", html)
+        self.assertIn('sizes="240px"', html)
+        self.assertIn('loading="lazy"', html)
+
+        # Saving other fields leaves the thumbnails alone; a new cover replaces them
+        with mock.patch('src.books.tasks.build_image_derivatives.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                book.title = 'Pictured Again'
+                book.save()
+                self.assertFalse(apply_async.called)
+                book.cover_image = self.upload('pictured.png', (200, 300), color=(10, 10, 200, 255))
+                book.save()
+        apply_async.assert_called_once_with(('books.Book', [book.pk]), retry=False)
+        replaced = build_derivatives(Book, book.pk)
+        self.assertEqual(replaced['widths'], [160, 200])
+        self.assertFalse(any(default_storage.exists(name) for name in derivative_names(manifest)))
+
+    def test_backfill_builds_missing_thumbnails_and_skips_unreadable_images(self):
+        with mock.patch('src.books.tasks.build_image_derivatives.apply_async'):
+            with self.captureOnCommitCallbacks(execute=True):
+                author = Author.objects.create(name='Photographed', nationality='Nepali',
+                                               profile_image=self.upload('face.png', (800, 800), mode='RGB',
+                                                                         color=(1, 2, 3)))
+                Book.objects.create(title='Broken', publisher=self.publisher, publication_date='2020-01-01',
+                                    cover_image=SimpleUploadedFile('broken.png', b'not an image'))
+        Author.objects.create(name='Photographed Too', nationality='Nepali',
+                              profile_image=self.upload('face2.png', (300, 300), mode='RGB', color=(4, 5, 6)))
+        out = io.StringIO()
+        with mock.patch('src.core.management.commands.backfill_image_derivatives.bump_on_commit') as bump, \
+                self.assertLogs('src.books.images', 'WARNING') as logs:
+            call_command('backfill_image_derivatives', stdout=out)
+        self.assertIn('authors: 2 built, 0 queued, 0 current, 0 failed', out.getvalue())
+        self.assertIn('books: 0 built, 0 queued, 0 current, 1 failed', out.getvalue())
+        self.assertIn('cannot read', logs.output[0])
+        # One generation bump for the run
+        bump.assert_called_once_with(CATALOG)
+        author.refresh_from_db()
+        self.assertEqual(author.profile_image_derivatives['widths'], [160, 320, 640])
+
+        out = io.StringIO()
+        call_command('backfill_image_derivatives', '--model', 'author', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'authors: 0 built, 0 queued, 2 current, 0 failed')
+
+        # Queued in batches, each task building its rows and bumping the generation once
+        out = io.StringIO()
+        with mock.patch('src.books.tasks.build_image_derivatives.apply_async') as apply_async:
+            call_command('backfill_image_derivatives', '--model', 'author', '--force', '--enqueue', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'authors: 0 built, 2 queued, 0 current, 0 failed')
+        (label, pks), = [call.args[0] for call in apply_async.call_args_list]
+        with mock.patch('src.books.images.bump_on_commit') as bump:
+            build_image_derivatives(label, pks)
+        bump.assert_called_once_with(CATALOG)
+
+
+def binned_book(publisher, title, days_ago):
+    # A stocked book moved to the recycle bin `days_ago` days ago
+    book = Book.objects.create(title=title, publisher=publisher, publication_date='2020-01-01')
+    stock = Stock.objects.create(book=book, current_price=Decimal('300.00'))
+    batch = StockBatch.objects.create(stock=stock, initial_quantity=5, remaining_quantity=5,
+                                      unit_cost=Decimal('100.00'), received_date='2024-01-01')
+    StockHistory.objects.create(stock=stock, batch=batch, change_type='restock', quantity_change=5)
+    book.delete()
+    Book.all_objects.filter(pk=book.pk).update(deleted_at=timezone.now() - timedelta(days=days_ago))
+    return book
+
+
+@override_settings(RECYCLE_BIN_RETENTION_DAYS={'books.Book': 30, 'stock.Stock': 30})
+class PurgeRecycleBinTests(TestCase):
+    """
+        Only rows binned longer than the retention are hard deleted, chunk by chunk, never ones with order history.
+        """
+
+    def setUp(self):
+        self.publisher = Publisher.objects.create(name='Purge Press', founded_year=2000)
+
+    def test_expired_books_are_purged_with_their_stock_tree_in_chunks(self):
+        expired = [binned_book(self.publisher, f"Expired {i}", days_ago=40) for i in range(5)]
+        recent = binned_book(self.publisher, 'Recent', days_ago=10)
+        live = Book.objects.create(title='Live', publisher=self.publisher, publication_date='2020-01-01')
+
+        with CaptureQueriesContext(connection) as queries:
+            report = purge_recycle_bin(batch_size=2)
+
+        self.assertEqual(report['books.Book']['purged'], 5)
+        self.assertEqual(report['books.Book']['removed']['stock.StockBatch'], 5)
+        self.assertEqual(report['books.Book']['protected'], 0)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE FROM "books_book"')]), 3)
+        self.assertFalse(Book.all_objects.filter(pk__in=[b.pk for b in expired]).exists())
+        self.assertFalse(Stock.all_objects.filter(book_id__in=[b.pk for b in expired]).exists())
+        self.assertEqual(set(Book.all_objects.values_list('pk', flat=True)), {recent.pk, live.pk})
+        self.assertTrue(Stock.all_objects.filter(book=recent).exists())
+
+    def test_ordered_books_are_protected(self):
+        ordered = binned_book(self.publisher, 'Ordered', days_ago=40)
+        binned_book(self.publisher, 'Unordered', days_ago=40)
+        user = User.objects.create_user(email='purge@example.com', password=None, first_name='Purge',
+                                        last_name='Buyer')
+        OrderItem.objects.create(order=Order.objects.create(user=user), book=ordered, unit_price=Decimal('300.00'))
+
+        report = purge_recycle_bin()
+        self.assertEqual((report['books.Book']['purged'], report['books.Book']['protected']), (1, 1))
+        self.assertEqual(list(Book.all_objects.values_list('pk', flat=True)), [ordered.pk])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED needs row locks')
+@override_settings(RECYCLE_BIN_RETENTION_DAYS={'books.Book': 30, 'stock.Stock': 30})
+class PurgeRecycleBinLockTests(TransactionTestCase):
+    """
+        A purge passes over rows another transaction has locked instead of waiting for them.
+        """
+
+    def test_locked_rows_are_skipped_until_released(self):
+        publisher = Publisher.objects.create(name='Locked Press', founded_year=2000)
+        locked, free = (binned_book(publisher, title, days_ago=40) for title in ('Locked', 'Free'))
+        holding, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(Book.all_objects.select_for_update().filter(pk=locked.pk))
+                    holding.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            self.assertTrue(holding.wait(10))
+            self.assertEqual(purge_recycle_bin()['books.Book']['purged'], 1)
+            self.assertEqual(list(Book.all_objects.values_list('pk', flat=True)), [locked.pk])
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(purge_recycle_bin()['books.Book']['purged'], 1)
+        self.assertFalse(Book.all_objects.filter(pk__in=[locked.pk, free.pk]).exists())
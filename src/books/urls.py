@@ -21,5 +21,6 @@ urlpatterns = [
     path('checkout/payment', BookCheckoutPayment.as_view(), name='book_payment'),
     path('checkout/order/complete', BookOrderComplete.as_view(), name='book_order_complete'),
 
-    path('search/', views.search_books, name='search_books')
+    path('search/', views.search_books, name='search_books'),
+    path('autocomplete/<str:kind>', views.autocomplete, name='autocomplete'),
 ]
@@ -1,19 +1,19 @@
 from math import floor, ceil
 
-from django.db.models import Q, Max, Min
+from django.db.models import Q
 from django.http import HttpResponse
 from openpyxl import Workbook
 
 from Project_B.utils import applying_sorting, ALLOWED_SORTS
 from src.books.models import Book
-from src.stock.models import Stock
+from src.stock.pricing import price_stats
 
 
 def search_query(query, manager=Book.objects):
     return manager.filter(
         Q(title__icontains=query) | Q(authors__name__icontains=query) | Q(
-            publisher__name__icontains=query)).select_related('publisher', 'stock').prefetch_related('authors',
-                                                                                                     'genres').distinct()
+            publisher__name__icontains=query)).select_related('publisher', 'stock', 'deleted_by').prefetch_related(
+        'authors', 'genres', 'stock__batches').distinct()
 
 
 def to_int(value, default=None):
@@ -23,47 +23,49 @@ def to_int(value, default=None):
         return default
 
 
-def searchfilter_bookStore(books, query=None, min_price=None, max_price=None, sort_by=None):
-    if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(authors__name__icontains=query) |
-            Q(publisher__name__icontains=query)
-        ).select_related('publisher', 'stock').prefetch_related('authors', 'genres').distinct()
-
-    price_aggregate = Stock.objects.filter(is_available=True).aggregate(
-        min_price=Min('current_price'),
-        max_price=Max('current_price')
-    )
+def text_search(query):
+    return Q(title__icontains=query) | Q(authors__name__icontains=query) | Q(publisher__name__icontains=query)
 
+
+def price_bounds(min_price, max_price, price_aggregate):
+    """
+        The price range the storefront filters on for the min_price / max_price parameters:
+        clamped to the stocked prices, at least 500 wide and rounded up to a hundred.
+        """
     db_min_price = price_aggregate['min_price'] or 0
     db_max_price = price_aggregate['max_price'] or 10000
+    db_max = price_aggregate['ceiling']
 
-    db_min = floor(db_min_price)
-    db_max = ceil(db_max_price / 100) * 100
+    min_val = to_int(min_price, 0)
+    max_val = to_int(max_price, db_max)
 
-    min_val, max_val = 0, db_max
+    if min_val is None or min_val < 0:
+        min_val = 0
 
-    if min_price or max_price:
+    if max_val is None or max_val < 0 or max_val > db_max_price:
+        max_val = db_max_price
 
-        min_val = to_int(min_price, 0)
-        max_val = to_int(max_price, db_max)
+    if min_val > max_val:
+        min_val, max_val = 0, db_min_price
 
-        if min_val is None or min_val < 0:
-            min_val = 0
+    if max_val > min_val and (max_val - min_val) < 500:
+        max_val = min_val + 500
 
-        if max_val is None or max_val < 0 or max_val > db_max_price:
-            max_val = db_max_price
+    return floor(min_val), ceil(max_val / 100) * 100
 
-        if min_val > max_val:
-            min_val, max_val = 0, db_min_price
 
-        if max_val > min_val and (max_val - min_val) < 500:
-            max_val = min_val + 500
+def searchfilter_bookStore(books, query=None, min_price=None, max_price=None, sort_by=None):
+    if query:
+        books = books.filter(text_search(query)).select_related('publisher', 'stock').prefetch_related(
+            'authors', 'genres').distinct()
 
-        min_val = floor(min_val)
-        max_val = ceil(max_val / 100) * 100
+    price_aggregate = price_stats()
+    db_max = price_aggregate['ceiling']
 
+    min_val, max_val = 0, db_max
+
+    if min_price or max_price:
+        min_val, max_val = price_bounds(min_price, max_price, price_aggregate)
         books = books.filter(stock__current_price__gte=min_val, stock__current_price__lte=max_val)
 
     books = applying_sorting(books, sort_by=sort_by, allowed_sorts=ALLOWED_SORTS["bookstore"],
@@ -1,17 +1,20 @@
 import json
+import os
 from datetime import datetime
 from decimal import Decimal
 from uuid import UUID
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
+from django.core.files.storage import default_storage
 from django.db import transaction
 from django.db.models import F, Sum, Value, Q, DecimalField, IntegerField, ExpressionWrapper, Func, Prefetch
 from django.db.models import Subquery, OuterRef
 from django.db.models.functions import Coalesce
 from django.forms.models import model_to_dict
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 from django.shortcuts import redirect, get_object_or_404
 from django.shortcuts import render
 from django.template.loader import render_to_string
@@ -19,15 +22,24 @@ from django.urls import reverse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views import View
-from django.views.decorators.cache import never_cache
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.vary import vary_on_headers
+from kombu.exceptions import OperationalError
 from pygments.lexers import q
 
-from src.books.forms import BookForm, AuthorForm, GenreForm, PublisherForm
+from Project_B.db_router import replica_reads
+from src.books.autocomplete import SOURCES, suggest
+from src.books.choices import CHOICE_MODELS, MULTIPLE, option_page, render_options
+from src.books.conditional import catalog_condition
+from src.books.facets import FacetSelection, canonical_params, facet_counts, facet_groups
+from src.books.forms import BookForm, AuthorForm, GenreForm, PublisherForm, CatalogImportForm
+from src.books.fragments import render_pagination
+from src.books.importer import detect_format, import_file
 from src.books.models import Author, Publisher, Genre
 from src.books.models import Book
 from src.books.pagination import paginate_queryset
-from src.books.utils import applying_sorting, ALLOWED_SORTS, export_excel
+from src.books.utils import applying_sorting, ALLOWED_SORTS, export_excel, to_int
 from src.books.utils import searchfilter_bookStore, search_query
 from src.cart.models import CartItem, Cart
 from src.cart.utils import calculate_cart_totals, round_decimal
@@ -36,6 +48,7 @@ from src.shipping.forms import DeliveryForm
 from src.shipping.models import DeliveryInfo
 from src.stock.forms import StockForm
 from src.stock.models import Stock, StockBatch, StockHistory
+from src.stock.pricing import price_stats
 from src.stock.services import StockService
 
 
@@ -44,6 +57,9 @@ def hello(request):
     return render(request, 'books/hello.html', {'name': 'Ayush'})
 
 
+@cache_control(private=True, no_cache=True)
+@catalog_condition()
+@replica_reads
 def search_books(request):
     query = request.GET.get('q', '').strip()
 
@@ -154,7 +170,7 @@ def search_genres(request):
     genres = Genre.objects.filter(
         Q(name__icontains=query) |
         Q(description__icontains=query) |
-        Q(parent_genre__name__icontains=query)
+        Q(ancestor_links__ancestor__name__icontains=query)  # any genre above it, at any depth
     ).select_related('parent_genre').distinct()
 
     data = []
@@ -171,6 +187,22 @@ def search_genres(request):
     return JsonResponse({'genres': data})
 
 
+@require_GET
+def autocomplete(request, kind):
+    """
+        Typeahead suggestions: ?q=<prefix>&limit=<n> for kind titles, authors, publishers or genres.
+        Matches any word start of the name, best sellers / largest catalogs first.
+        """
+    if kind not in SOURCES:
+        return JsonResponse({'results': [], 'error': f"Unknown kind '{kind}'"}, status=404)
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    limit = max(1, min(to_int(request.GET.get('limit'), settings.AUTOCOMPLETE_LIMIT), settings.AUTOCOMPLETE_LIMIT))
+    results, source = suggest(kind, query, limit)
+    return JsonResponse({'results': results, 'source': source})
+
+
 @require_POST
 @login_required
 def add_to_cart(request):
@@ -321,7 +353,7 @@ def clear_cart(request):
 
 class BookAdminView(View):
     def get(self, request):
-        return render(request, 'base/admin/admin_base.html')
+        return redirect('admin_dashboard')
 
 
 class BookListView(View):
@@ -380,14 +412,8 @@ class BookRestoreView(View):
                 # print(book_dict)
                 # print(book.deleted_at)
                 # print(book.deleted_by)
+                # Also restores the stock tree deleted together with the book
                 book.restore()
-                # print("Restored book")
-                # book_dict = model_to_dict(book)
-                # print(book_dict)
-                # print(book.deleted_at)
-                # print(book.deleted_by)
-
-                book.stock.restore()
                 # print("Restored book 1")
                 # book_dict = model_to_dict(book)
                 # print(book_dict)
@@ -426,6 +452,7 @@ class BookPermanentDeleteView(View):
         return redirect('book_recycle_bin')
 
 
+@method_decorator(replica_reads, name='get')
 class StockListView(View):
     def get(self, request):
         query = request.GET.get("q", "").strip()
@@ -597,7 +624,11 @@ class BookDetailView(View):
 #         return render(request, 'books/admin/stock_detail_view.html', {'stock': stock})
 
 
-@method_decorator(never_cache, name='dispatch')
+# Revalidated on every visit instead of never stored: unchanged pages come back as a 304
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(vary_on_headers('X-Requested-With'), name='dispatch')
+@method_decorator(catalog_condition('books/book_store.html'), name='get')
+@method_decorator(replica_reads, name='get')
 class BookStore(View):
     def get(self, request, price_aggregate=None):
         query = request.GET.get('q', '')
@@ -609,7 +640,8 @@ class BookStore(View):
         #     total_quantity=Coalesce(Sum('stock__batches__remaining_quantity'), 0)
         # )
 
-        books = Book.objects.can_sell()
+        selection = FacetSelection.from_query(request.GET)
+        books = selection.apply(Book.objects.can_sell())
 
         # items_count = CartItem.objects.filter(cart__user=request.user).count()
         # print(items_count, ": Item count")
@@ -617,21 +649,21 @@ class BookStore(View):
         books, min_price_value, max_price_value, db_max = searchfilter_bookStore(books, query, min_price,
                                                                                  max_price, sort_by)
 
-        paginated_books, limit = paginate_queryset(request, books, default_limit=12)
+        price_range = (min_price_value, max_price_value) if (min_price or max_price) else None
+        facets = facet_groups(facet_counts(selection, query, price_range), request.GET)
 
-        # print("Paginated_books: ", paginated_books)
+        # The count only depends on the filters; the catalog cache keeps it until the catalog changes
+        paginated_books, limit = paginate_queryset(
+            request, books, default_limit=12,
+            count_key=f"bookstore:count:{query}|{min_price}|{max_price}|{selection.canonical()}")
 
-        query_params = request.GET.copy()
-        # print("query_params book store bata: ", query_params)
-
-        if 'page' in query_params:
-            query_params.pop('page')
+        # print("Paginated_books: ", paginated_books)
 
-        for key in list(query_params.keys()):
-            if all(v == "" for v in query_params.getlist(key)):
-                query_params.pop(key)
+        # Sorted and without 'page' or empty values: one URL per filter combination
+        query_string = canonical_params(request.GET)
 
-        # print("query_params book store bata after: ", query_params)
+        # Served from the cache (src.stock.pricing), so the slider's counts cost no Stock scan
+        stats = price_stats()
 
         context = {
             'books': books,
@@ -639,7 +671,9 @@ class BookStore(View):
             'limit': limit,
             'min_price_value': min_price_value,
             'max_price_value': max_price_value,
-            'query_string': query_params.urlencode(),  # for pagination links
+            'price_stats': stats,
+            'facets': facets,
+            'query_string': query_string,  # for pagination links
 
         }
 
@@ -647,19 +681,19 @@ class BookStore(View):
         if request.headers.get("x-requested-with") == "XMLHttpRequest":
             # print("hello from headers")
             cards_html = render_to_string("books/components/book_cards.html", {'paginated_books': paginated_books, })
-            pagination_html = render_to_string('books/components/pagination_div.html',
-                                               {'paginated_books': paginated_books,
-                                                "query_string": query_params.urlencode(), 'is_ajax_page': True,
-                                                'limit': limit, })
+            pagination_html = render_pagination(paginated_books, query_string, limit)
+            facets_html = render_to_string('books/components/facet_filters.html', {'facets': facets})
 
             return JsonResponse({
                 "cards": cards_html,
                 "pagination": pagination_html,
+                "facets": facets_html,
                 # 'items_count': items_count,
                 'search_min_price_limit': 0,
                 'search_max_price_limit': db_max,
                 "min_price": min_price_value,
                 "max_price": max_price_value,
+                "price_histogram": stats['histogram'],
 
             })
 
@@ -886,7 +920,7 @@ class BookOrderComplete(View):
             return redirect('book_cart')
 
         del request.session['order_uuid']
-        order_items = order.items.all()
+        order_items = order.items.select_related('book')
 
         subtotal = sum((item.base_price for item in order_items), start=Decimal('0.00'))
         discount = sum((item.discount_amount * item.quantity for item in order_items), start=Decimal('0.00'))
@@ -919,7 +953,8 @@ class BookCart(View):
                       )
 
 
-@method_decorator(never_cache, name='dispatch')
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(catalog_condition('books/book_detail_store.html'), name='get')
 class BookDetailStore(View):
     def get(self, request, uuid):
         # book = get_object_or_404(Book, uuid=uuid)
@@ -989,10 +1024,7 @@ class BookView(View):
                     else:
                         print('bb')
                         try:
-                            if hasattr(book, 'stock') and book.stock:
-                                book.stock.delete(user=request.user)
-                                # time
-
+                            # Cascades to the stock, its batches and history (Book.soft_delete_cascade)
                             book.delete(user=request.user)
                             print("gg")
                             messages.success(request, "Book deleted successfully.")
@@ -1084,6 +1116,73 @@ class BookView(View):
         return render(request, 'books/admin/book_create_or_edit.html', {'form': form})
 
 
+class BookImportView(View):
+    template_name = 'books/admin/book_import.html'
+
+    def get(self, request):
+        if not request.user.has_perm('books.add_book'):
+            raise PermissionDenied
+        return render(request, self.template_name, {'form': CatalogImportForm()})
+
+    def post(self, request):
+        if not request.user.has_perm('books.add_book'):
+            raise PermissionDenied
+        form = CatalogImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                file_format = form.cleaned_data['format'] or detect_format(upload.name)
+            except ValueError as e:
+                form.add_error('file', str(e))
+            else:
+                return self.run_import(request, upload, file_format)
+        return render(request, self.template_name, {'form': form})
+
+    def run_import(self, request, upload, file_format):
+        if upload.size > settings.CATALOG_IMPORT_INLINE_MAX_BYTES:
+            return self.queue_import(request, upload, file_format)
+        # Streamed from the upload chunk by chunk, the same pipeline as the import_catalog command
+        upload.seek(0)
+        job, rejects_name, error = import_file(upload.file, file_format, request.user,
+                                               os.path.splitext(os.path.basename(upload.name))[0])
+        if error:
+            messages.error(request, f"Stopped after {job.counts['read']} rows, the file is malformed: {error}")
+        if job.counts['imported']:
+            messages.success(request, f"{job.counts['imported']} books imported.")
+        return render(request, self.template_name, {
+            'form': CatalogImportForm(),
+            'counts': sorted(job.counts.items()),
+            'first_rejects': job.first_rejects,
+            'rejects_name': rejects_name,
+        })
+
+    def queue_import(self, request, upload, file_format):
+        from src.books.tasks import import_catalog_upload
+
+        upload_name = os.path.basename(upload.name)
+        path = default_storage.save(os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, 'uploads', upload_name), upload)
+        try:
+            # Not retried: the request should not wait out a broker outage
+            import_catalog_upload.apply_async((path, file_format, request.user.pk, upload_name), retry=False)
+        except OperationalError:
+            default_storage.delete(path)
+            messages.error(request, f"{upload_name} could not be queued for import; try again later, or run the "
+                                    f"import_catalog command.")
+        else:
+            messages.success(request, f"{upload_name} is imported in the background; the results will be emailed "
+                                      f"to {request.user.email}.")
+        return redirect('book_import')
+
+
+def book_import_rejects(request, name):
+    if not request.user.has_perm('books.add_book'):
+        raise PermissionDenied
+    path = os.path.join(settings.CATALOG_IMPORT_REJECTS_DIR, os.path.basename(name))
+    if not default_storage.exists(path):
+        raise Http404
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
 class StockView(View):
     def get(self, request, uuid=None):
         form = StockForm()
@@ -1341,7 +1440,7 @@ class GenreListView(View):
 
     def get(self, request):
         genre = (
-            Genre.objects.all()
+            Genre.objects.select_related('parent_genre')
         )
 
         print([field.name for field in Genre._meta.get_fields()])
@@ -1357,13 +1456,17 @@ class GenreListView(View):
 class GenreDetailView(View):
     def get(self, request, uuid):
         genre = get_object_or_404(
-            Genre,
+            Genre.objects.with_subtree_book_counts(),
             uuid=uuid
         )
         print(genre)
 
         print(model_to_dict(genre))
-        return render(request, 'books/admin/genre_detail_view.html', {'genre': genre})
+        return render(request, 'books/admin/genre_detail_view.html', {
+            'genre': genre,
+            'ancestors': genre.ancestors(),
+            'subgenres': genre.descendants().with_subtree_book_counts().order_by('name'),
+        })
 
 
 class GenreView(View):
@@ -1431,31 +1534,29 @@ class GenreView(View):
 
 
 def field_options(request, field_name):
-    print("hello")
-    if field_name == "authors":
-        print("author")
-        queryset = Author.objects.values_list("id", "name")
-    elif field_name == "publisher":
-        print("publisher")
-        queryset = Publisher.objects.values_list("id", "name")
-    elif field_name == "genres":
-        print("genres")
-        queryset = Genre.objects.values_list("id", "name")
-    else:
+    """
+        Rendered <option> tags for the selected ids (?selected[]=), to refresh a BookForm select
+        after the create popup added a row. The other options are searched via choice_options.
+        """
+    model = CHOICE_MODELS.get(field_name)
+    if model is None:
         return JsonResponse({"html": ""}, status=400)
 
-    is_multiple = field_name in ["genres", "authors"]
-
-    selected = request.GET.getlist("selected[]", [])  # or []
-
+    is_multiple = field_name in MULTIPLE
+    selected = request.GET.getlist("selected[]", [])
     if not is_multiple and selected:
         selected = [selected[-1]]
 
-    selected = [int(x) for x in selected if x.isdigit()]
+    return JsonResponse({"html": render_options(model, selected, is_multiple)})
 
-    html = render_to_string(
-        "author/components/field_options.html",
-        {"choices": queryset, "selected_values": selected, "is_multiple": is_multiple}
-    )
 
-    return JsonResponse({"html": html})
+@require_GET
+def choice_options(request, field_name):
+    """
+        Paged, searchable options of a BookForm relation field for select2: ?q=<name part>&page=<n>.
+        """
+    model = CHOICE_MODELS.get(field_name)
+    if model is None:
+        return JsonResponse({"results": [], "error": f"Unknown field '{field_name}'"}, status=404)
+    page = max(to_int(request.GET.get('page'), 1), 1)
+    return JsonResponse(option_page(model, request.GET.get('q', '').strip(), page))
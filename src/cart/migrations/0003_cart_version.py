@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 13:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cart_cart_cart_created_82b5ff_act'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -25,6 +25,8 @@ class Cart(AbstractBaseModel):
         related_name='carts_shipping_address',
     )
     shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Incremented with every item change (src.cart.utils.cart_items_changed); storefront ETags embed it
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
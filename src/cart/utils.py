@@ -1,7 +1,7 @@
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.db.models import Sum, Value, Count, ExpressionWrapper, F, DecimalField, Prefetch, Subquery, OuterRef
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Now
 
 from .models import Cart, CartItem
 from ..stock.models import StockBatch
@@ -104,3 +104,8 @@ def calculate_cart_totals(user):
         "total_discount": round_decimal(cartqs.total_discount),
         "total_amount_after_discount": round_decimal(total_amount_after_discount),
     }
+
+
+def cart_items_changed(sender, instance, **kwargs):
+    # post_save / post_delete on CartItem: a new cart version, committed together with the item
+    Cart.all_objects.filter(pk=instance.cart_id).update(version=F('version') + 1, updated_at=Now())
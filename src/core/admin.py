@@ -1,3 +1,153 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+
+from src.core.models import OutgoingEmail, RequestProfile
+from src.core.profiling import can_profile, make_token, top_functions
+
 
 # Register your models here.
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'from_email', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'to')
+    readonly_fields = ('attempts', 'last_error', 'sent_at', 'created_at')
+    actions = ['requeue']
+
+    @admin.action(description="Requeue selected emails")
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='queued', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} email(s) requeued.")
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('path', 'method', 'status_code', 'duration_ms', 'db_ms', 'query_count', 'cache_ms',
+                    'template_ms', 'python_ms', 'trigger', 'user', 'created_at')
+    list_filter = ('trigger', 'method', 'status_code')
+    list_select_related = ('user',)
+    search_fields = ('path',)
+    ordering = ('-created_at',)
+    fields = ('path', 'method', 'status_code', 'user', 'trigger', 'duration_ms', 'db_ms', 'query_count', 'cache_ms',
+              'template_ms', 'python_ms', 'created_at', 'download', 'functions')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('token/', self.admin_site.admin_view(self.token_view), name='core_requestprofile_token'),
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                 name='core_requestprofile_download'),
+        ] + super().get_urls()
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            'subtitle': format_html('<a href="{}">Get a profiling token</a>', reverse('admin:core_requestprofile_token')),
+            **(extra_context or {}),
+        }
+        return super().changelist_view(request, extra_context)
+
+    def token_view(self, request):
+        # The token profiles any request, so it needs the same permission as recording a profile
+        if not can_profile(request.user):
+            raise PermissionDenied
+        token = make_token(request.user)
+        return HttpResponse(
+            f"X-Profile-Token: {token}\n\n"
+            f"Send this header (valid for {settings.PROFILING_TOKEN_MAX_AGE} s) to profile any request,\n"
+            f"or add ?{settings.PROFILING_QUERY_FLAG}=1 to a page while logged in as staff.\n",
+            content_type='text/plain',
+        )
+
+    def download_view(self, request, pk):
+        profile = self.get_object(request, pk)
+        try:
+            return FileResponse(open(profile.file_path, 'rb'), as_attachment=True, filename=profile.profile_file)
+        except (AttributeError, FileNotFoundError):
+            raise Http404("Profile file not found")
+
+    @admin.display(description="pstats file")
+    def download(self, obj):
+        return format_html('<a href="{}">{}</a>', reverse('admin:core_requestprofile_download', args=[obj.pk]),
+                           obj.profile_file)
+
+    @admin.display(description="Top functions by cumulative time")
+    def functions(self, obj):
+        try:
+            return format_html('<pre style="font-size: 11px">{}</pre>', top_functions(obj))
+        except (FileNotFoundError, OSError):
+            return "Profile file not found"
+
+    def delete_model(self, request, obj):
+        obj.delete_file()
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for profile in queryset:
+            profile.delete_file()
+        super().delete_queryset(request, queryset)
+
+
+class DeletedListFilter(admin.SimpleListFilter):
+    title = 'deleted'
+    parameter_name = 'deleted'
+
+    def lookups(self, request, model_admin):
+        return (('active', 'Active'), ('deleted', 'Deleted'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'active':
+            return queryset.active()
+        if self.value() == 'deleted':
+            return queryset.deleted()
+        return queryset
+
+
+class SafeDeleteAdmin(admin.ModelAdmin):
+    """
+        ModelAdmin for SafeDeleteModel subclasses.
+        Lists active and deleted rows and replaces Django's delete action with set based
+        soft delete / restore actions that follow the model's soft_delete_cascade, so even
+        "select all" over thousands of rows runs as a few UPDATE statements.
+        """
+    list_filter = (DeletedListFilter,)
+    actions = ['soft_delete_selected', 'restore_selected']
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def _selected(self, queryset):
+        # The changelist queryset may be ordered, joined or distinct; update through plain pks
+        return self.model.all_objects.filter(pk__in=queryset.values('pk'))
+
+    @admin.action(description="Soft delete selected %(verbose_name_plural)s", permissions=['delete'])
+    def soft_delete_selected(self, request, queryset):
+        with transaction.atomic():
+            deleted = self._selected(queryset).delete(user=request.user)
+        self.message_user(request, f"{deleted} {self.model._meta.verbose_name_plural} moved to the recycle bin.")
+
+    @admin.action(description="Restore selected %(verbose_name_plural)s", permissions=['change'])
+    def restore_selected(self, request, queryset):
+        with transaction.atomic():
+            restored = self._selected(queryset).restore()
+        self.message_user(request, f"{restored} {self.model._meta.verbose_name_plural} restored.")
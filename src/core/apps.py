@@ -1,6 +1,58 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+# Writes to these start a new catalog cache generation (src.core.cache)
+# Batches carry the quantities behind stock badges and availability on cached catalog pages
+CATALOG_MODELS = ('books.Book', 'books.Author', 'books.Publisher', 'books.Genre', 'stock.Stock', 'stock.StockBatch')
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'src.core'
+
+    def ready(self):
+        from src.core import cache
+        from src.core.querysets import soft_delete_changed
+
+        for label in CATALOG_MODELS:
+            model = apps.get_model(label)
+            post_save.connect(cache.catalog_changed, sender=model)
+            post_delete.connect(cache.catalog_changed, sender=model)
+            soft_delete_changed.connect(cache.catalog_changed, sender=model)
+
+        Stock = apps.get_model('stock.Stock')
+        post_delete.connect(cache.prices_changed, sender=Stock)
+        soft_delete_changed.connect(cache.prices_changed, sender=Stock)
+
+        Book = apps.get_model('books.Book')
+        m2m_changed.connect(cache.catalog_relations_changed, sender=Book.authors.through)
+        m2m_changed.connect(cache.catalog_relations_changed, sender=Book.genres.through)
+
+        # BookForm option pages and rendered options, cached per model
+        from src.books import choices
+
+        for model in set(choices.CHOICE_MODELS.values()):
+            post_save.connect(choices.choices_changed, sender=model)
+            post_delete.connect(choices.choices_changed, sender=model)
+            soft_delete_changed.connect(choices.choices_changed, sender=model)
+
+        # Typeahead indexes follow the rows they suggest
+        from src.books import autocomplete
+
+        for model in autocomplete.KINDS_BY_MODEL:
+            post_save.connect(autocomplete.row_changed, sender=model)
+            post_delete.connect(autocomplete.row_changed, sender=model)
+            soft_delete_changed.connect(autocomplete.rows_changed, sender=model)
+
+        # Storefront ETags follow each customer's cart (src.books.conditional)
+        from src.cart.utils import cart_items_changed
+
+        CartItem = apps.get_model('cart.CartItem')
+        post_save.connect(cart_items_changed, sender=CartItem)
+        post_delete.connect(cart_items_changed, sender=CartItem)
+
+        # Cover and profile image thumbnails, built by a Celery task after each upload
+        from src.books import images
+
+        for model in images.IMAGE_FIELDS:
+            post_save.connect(images.image_saved, sender=model)
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+@contextmanager
+def isolated_database():
+    """
+        Run the block against a throwaway, migrated test database, shared by every thread:
+        - all reads stay on it (no replica router) and the debug toolbar is off,
+        - cache keys get a fresh prefix, so they collide neither with real ones nor with
+          another run's ids.
+        """
+    caches = {alias: {**conf, 'KEY_PREFIX': f"bench-{uuid.uuid4().hex[:8]}"}
+              for alias, conf in settings.CACHES.items()}
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    default_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite' and not default_test_name:
+        # Django never really closes an in-memory SQLite test database, so a second run
+        # would inherit the first one's rows; a file is dropped for real by destroy_test_db.
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f"bench-{uuid.uuid4().hex[:8]}.sqlite3")
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DATABASE_ROUTERS=[], CACHES=caches,
+                               DEBUG_TOOLBAR_CONFIG={'SHOW_TOOLBAR_CALLBACK': lambda request: False}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = default_test_name
+        teardown_test_environment()
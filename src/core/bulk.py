@@ -0,0 +1,68 @@
+from collections import Counter, defaultdict
+
+from django.db import connection
+
+
+class RowWriter:
+    """
+        Buffers generated rows per model and writes them in batches, with COPY on PostgreSQL
+        or bulk_create elsewhere. Rows are dicts keyed by field attname and carry explicit ids.
+        """
+
+    def __init__(self, batch_size, use_copy):
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.buffers = defaultdict(list)
+        self.counts = Counter()
+
+    def add(self, model, row):
+        buffer = self.buffers[model]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for buffered_model in ([model] if model else list(self.buffers)):
+            rows = self.buffers.pop(buffered_model, [])
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(buffered_model, rows)
+            else:
+                buffered_model._base_manager.bulk_create([buffered_model(**row) for row in rows])
+            self.counts[buffered_model._meta.label] += len(rows)
+
+    @staticmethod
+    def copy_rows(model, rows):
+        """
+            Each row's values in concrete field order, missing ones from the field defaults,
+            prepared the way save() prepares them (psycopg cannot adapt a JSONField's dict, for one).
+            """
+        fields = model._meta.concrete_fields
+        defaults = {field.attname: field.get_default() for field in fields}
+        for row in rows:
+            yield [field.get_db_prep_save(row[field.attname] if field.attname in row else defaults[field.attname],
+                                          connection) for field in fields]
+
+    @classmethod
+    def _copy(cls, model, rows):
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in model._meta.concrete_fields)
+        with connection.cursor() as cursor:
+            # cursor.copy() is psycopg's own: raise django.db errors from it, as execute() does
+            with connection.wrap_database_errors, \
+                    cursor.copy(f"COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN") as copy:
+                for values in cls.copy_rows(model, rows):
+                    copy.write_row(values)
+
+
+def reserve_ids(model, count):
+    """
+        `count` primary keys drawn from the model's PostgreSQL sequence, so rows written with
+        explicit ids (COPY) cannot collide with concurrent inserts.
+        """
+    pk = model._meta.pk
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                       [model._meta.db_table, pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,285 @@
+import functools
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse
+
+# Books, stock, authors, publishers and genres: everything the storefront lists
+CATALOG = 'catalog'
+# Price statistics of available stock, bumped only by price and availability changes
+PRICES = 'prices'
+
+_MISSING = object()
+_PLAIN_NAME = re.compile(r'[\w.:|-]{1,200}')
+
+
+class LocalLRU:
+    """
+        Thread safe in-process LRU: at most `max_entries` values, each dropped `ttl` seconds
+        after it was stored. Sits in front of the shared cache (L2) so hot keys cost no round trip.
+        """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalLRU(settings.CATALOG_CACHE_LOCAL_ENTRIES, settings.CATALOG_CACHE_LOCAL_TTL)
+
+# One lock per key being computed in this process, so its threads wait instead of piling onto L2
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _generation_key(namespace):
+    return f"generation:{namespace}"
+
+
+def generation(namespace):
+    """
+        Current generation of a namespace. Every key of the namespace embeds it, so bump()
+        retires all of them at once. Each process trusts its copy for CATALOG_CACHE_GENERATION_TTL.
+        """
+    key = _generation_key(namespace)
+    local_key = shared_cache.make_key(key)
+    value = local_cache.get(local_key)
+    if value is None:
+        value = shared_cache.get(key)
+        if value is None:
+            # Start from the clock: if the counter is ever evicted it must not fall back onto old keys
+            shared_cache.add(key, int(time.time() * 1000), None)
+            value = shared_cache.get(key)
+        local_cache.set(local_key, value, settings.CATALOG_CACHE_GENERATION_TTL)
+    return value
+
+
+def changed_at(namespace):
+    """
+        Unix time of the namespace's last bump (of the first read if it was never bumped), for
+        Last-Modified headers. Cached per process like generation().
+        """
+    key = f"{_generation_key(namespace)}:at"
+    local_key = shared_cache.make_key(key)
+    value = local_cache.get(local_key)
+    if value is None:
+        shared_cache.add(key, time.time(), None)
+        value = shared_cache.get(key)
+        local_cache.set(local_key, value, settings.CATALOG_CACHE_GENERATION_TTL)
+    return value
+
+
+def bump(namespace):
+    """
+        Start a new generation: every cached value of the namespace is stale from now on
+        (in other processes once their copy of the generation expires).
+        """
+    key = _generation_key(namespace)
+    try:
+        shared_cache.incr(key)
+    except ValueError:
+        shared_cache.add(key, int(time.time() * 1000), None)
+    shared_cache.set(f"{key}:at", time.time(), None)
+    local_cache.delete(shared_cache.make_key(key))
+    local_cache.delete(shared_cache.make_key(f"{key}:at"))
+
+
+def bump_on_commit(namespace, using=None):
+    """
+        bump() once the current transaction commits (right away outside one). Bumping earlier
+        would let a reader cache the old rows under the new generation. Several writes in one
+        transaction share a single bump.
+        """
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if connection.in_atomic_block and any(
+            getattr(func, 'pending_bump', None) == namespace for _, func, _ in connection.run_on_commit):
+        return
+
+    def callback():
+        callback.pending_bump = None
+        bump(namespace)
+
+    callback.pending_bump = namespace
+    transaction.on_commit(callback, using=using)
+
+
+def _key(namespace, name):
+    if not _PLAIN_NAME.fullmatch(name):
+        name = hashlib.md5(name.encode()).hexdigest()
+    return f"{namespace}:{generation(namespace)}:{name}"
+
+
+def get_or_set(namespace, name, producer, timeout=None):
+    """
+        Value of `name` in `namespace`, from the local LRU, else the shared cache, else
+        producer(). Values stay fresh for `timeout` seconds (CATALOG_CACHE_TIMEOUT by default)
+        and until the namespace's generation is bumped.
+        """
+    timeout = settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout
+    key = _key(namespace, name)
+    local_key = shared_cache.make_key(key)
+    value = local_cache.get(local_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with _flights_lock:
+        flight = _flights.setdefault(local_key, threading.Lock())
+    with flight:
+        # Another thread may have filled it while this one waited
+        value = local_cache.get(local_key, _MISSING)
+        if value is _MISSING:
+            value = _shared_get_or_set(key, producer, timeout)
+            local_cache.set(local_key, value, min(timeout, settings.CATALOG_CACHE_LOCAL_TTL))
+    with _flights_lock:
+        _flights.pop(local_key, None)
+    return value
+
+
+def _shared_get_or_set(key, producer, timeout):
+    """
+        Stampede protection across processes. Entries are stored as (value, fresh_until) and
+        kept CATALOG_CACHE_STALE_SECONDS past that: the one process that wins the lock
+        recomputes an expired entry while the others keep serving the stale value. On a cold
+        miss the others poll for the winner's value for up to CATALOG_CACHE_LOCK_SECONDS.
+        """
+    lock_key = f"lock:{key}"
+    lock_seconds = settings.CATALOG_CACHE_LOCK_SECONDS
+    deadline = time.monotonic() + lock_seconds
+    locked = False
+    while True:
+        entry = shared_cache.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.time():
+                return value
+            locked = shared_cache.add(lock_key, 1, lock_seconds)
+            if not locked:
+                return value
+            break
+        locked = shared_cache.add(lock_key, 1, lock_seconds)
+        if locked or time.monotonic() >= deadline:
+            break
+        time.sleep(0.05)
+
+    try:
+        value = producer()
+        shared_cache.set(key, (value, time.time() + timeout), timeout + settings.CATALOG_CACHE_STALE_SECONDS)
+    finally:
+        if locked:
+            shared_cache.delete(lock_key)
+    return value
+
+
+def _call_name(func, args, kwargs):
+    name = f"{func.__module__}.{func.__qualname__}"
+    if args or kwargs:
+        name += ':' + repr((args, sorted(kwargs.items())))
+    return name
+
+
+def cached_query(namespace=CATALOG, timeout=None):
+    """
+        Cache a function's result per arguments (which need a stable repr). Querysets are
+        evaluated to lists first. The undecorated function stays available as `.uncached`.
+
+            @cached_query()
+            def genre_choices():
+                return Genre.objects.values_list('id', 'name')
+        """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            def produce():
+                result = func(*args, **kwargs)
+                return list(result) if isinstance(result, QuerySet) else result
+
+            return get_or_set(namespace, _call_name(func, args, kwargs), produce, timeout)
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+def cached_view(namespace=CATALOG, timeout=None):
+    """
+        Cache a function view's GET responses per full path (query string included). Only for
+        responses that are the same for everyone allowed to request them.
+        """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            def produce():
+                response = view(request, *args, **kwargs)
+                if callable(getattr(response, 'render', None)):
+                    response = response.render()
+                return response.status_code, response.content, response['Content-Type']
+
+            status, content, content_type = get_or_set(namespace, f"view:{request.get_full_path()}", produce,
+                                                       timeout)
+            return HttpResponse(content, status=status, content_type=content_type)
+
+        return wrapper
+
+    return decorator
+
+
+def catalog_changed(sender, using=None, **kwargs):
+    # post_save / post_delete on catalog models, and soft_delete_changed for their bulk updates
+    bump_on_commit(CATALOG, using)
+
+
+def prices_changed(sender, using=None, **kwargs):
+    # post_delete and soft_delete_changed on Stock; Stock.save() and update_stock_price() bump directly
+    bump_on_commit(PRICES, using)
+
+
+def catalog_relations_changed(sender, action, using=None, **kwargs):
+    # m2m_changed on Book.authors and Book.genres
+    if action.startswith('post_'):
+        bump_on_commit(CATALOG, using)
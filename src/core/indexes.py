@@ -0,0 +1,42 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Q
+
+ACTIVE_ROWS = Q(deleted_at__isnull=True)
+ACTIVE_INDEX_SUFFIX = 'act'
+
+
+def active_index(model, fields):
+    """
+        Partial index on `fields` covering only rows that are not soft deleted (deleted_at IS NULL).
+        Named like Django's auto index names but with its own suffix, so it never collides
+        with a full index on the same fields.
+        """
+    naming = models.Index(fields=list(fields))
+    naming.suffix = ACTIVE_INDEX_SUFFIX
+    naming.set_name_with_model(model)
+    return models.Index(fields=list(fields), name=naming.name, condition=ACTIVE_ROWS)
+
+
+def active_indexes(model):
+    """
+        Partial indexes for the hot lookup columns of a soft delete model:
+        created_at plus every plain field index declared in its Meta.indexes.
+
+        uuid is left out on purpose; its unique index already resolves a lookup to one row.
+        """
+    field_sets = []
+    try:
+        model._meta.get_field('created_at')
+        field_sets.append(('created_at',))
+    except FieldDoesNotExist:
+        pass
+
+    for index in model._meta.indexes:
+        if index.condition is not None or index.contains_expressions:
+            continue
+        fields = tuple(index.fields)
+        if fields not in field_sets:
+            field_sets.append(fields)
+
+    return [active_index(model, fields) for fields in field_sets]
@@ -0,0 +1,199 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection, EmailMultiAlternatives
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from src.core.models import OutgoingEmail
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+        EMAIL_BACKEND that buffers messages in the OutgoingEmail table instead of talking to SMTP.
+
+        Rows are written in the caller's transaction, so a rolled back signup never mails anyone.
+        flush_outbox() later delivers them in batches through EMAIL_DELIVERY_BACKEND.
+        Messages with attachments are not buffered and go straight to the delivery backend.
+        """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+
+        queued = []
+        direct = []
+        for message in email_messages:
+            if message.attachments:
+                direct.append(message)
+                continue
+
+            queued.append(OutgoingEmail(
+                subject=message.subject,
+                body=message.body,
+                from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+                to=list(message.to),
+                cc=list(message.cc),
+                bcc=list(message.bcc),
+                reply_to=list(message.reply_to),
+                headers=dict(message.extra_headers),
+                alternatives=[[content, mimetype] for content, mimetype in getattr(message, 'alternatives', [])],
+            ))
+
+        OutgoingEmail.objects.bulk_create(queued)
+        sent = len(queued)
+
+        if direct:
+            connection = get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=self.fail_silently)
+            sent += connection.send_messages(direct) or 0
+
+        return sent
+
+
+def _to_message(email, connection):
+    return EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        cc=email.cc,
+        bcc=email.bcc,
+        reply_to=email.reply_to,
+        headers=email.headers,
+        alternatives=[tuple(alternative) for alternative in email.alternatives],
+        connection=connection,
+    )
+
+
+class RateLimiter:
+    """
+        Spaces calls evenly so no more than `per_second` happen each second (0 disables it).
+        """
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+_pool = threading.local()
+
+
+def _pooled_connection():
+    """
+        One delivery connection per worker thread, reused across flushes and
+        recycled after EMAIL_CONNECTION_MAX_AGE seconds.
+        """
+    connection = getattr(_pool, 'connection', None)
+    opened_at = getattr(_pool, 'opened_at', 0)
+
+    if connection is not None and time.monotonic() - opened_at > settings.EMAIL_CONNECTION_MAX_AGE:
+        _discard_connection()
+        connection = None
+
+    if connection is None:
+        connection = get_connection(settings.EMAIL_DELIVERY_BACKEND)
+        connection.open()
+        _pool.connection = connection
+        _pool.opened_at = time.monotonic()
+
+    return connection
+
+
+def _discard_connection():
+    connection = getattr(_pool, 'connection', None)
+    _pool.connection = None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def _retry_delay(attempts):
+    # Exponential backoff: base, 2x base, 4x base, ...
+    return timedelta(seconds=settings.EMAIL_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1)))
+
+
+def _claim_batch(batch_size):
+    """
+        Lease up to `batch_size` due rows to this flush and commit at once, so no lock is held
+        while they are sent. A row is due when queued and past its retry time, or when the
+        lease of the flush that claimed it ran out (that flush died mid-send).
+        """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutgoingEmail.objects.filter(status__in=('queued', 'sending'), next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        # A lease that keeps running out on its last attempt is a message that kills the sender
+        OutgoingEmail.objects.filter(id__in=ids, status='sending', attempts__gte=settings.EMAIL_MAX_ATTEMPTS).update(
+            status='dead', last_error='Delivery lease expired')
+        OutgoingEmail.objects.filter(id__in=ids).exclude(status='dead').update(
+            status='sending', attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_SEND_LEASE_SECONDS),
+        )
+    return list(OutgoingEmail.objects.filter(id__in=ids, status='sending').order_by('id')), len(ids)
+
+
+def flush_outbox(batch_size=None):
+    """
+        Deliver due OutgoingEmail rows in batches over a pooled connection.
+
+        Each batch is claimed with FOR UPDATE SKIP LOCKED and leased in a short transaction of its
+        own; the messages are then sent outside any transaction, each row marked sent or failed
+        by its own update. A flush that dies mid-batch leaves its rows to be sent again once the
+        lease runs out. A failed send is retried with exponential backoff; after EMAIL_MAX_ATTEMPTS
+        the row is marked 'dead' and left for inspection in the admin.
+        Returns counts of sent, retried and dead-lettered messages.
+        """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    limiter = RateLimiter(settings.EMAIL_RATE_LIMIT_PER_SECOND)
+    result = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    while True:
+        batch, claimed = _claim_batch(batch_size)
+        if not claimed:
+            break
+        result['dead'] += claimed - len(batch)
+
+        for email in batch:
+            limiter.wait()
+            # Only while this flush still holds the lease
+            leased = OutgoingEmail.objects.filter(pk=email.pk, status='sending')
+            try:
+                connection = _pooled_connection()
+                connection.send_messages([_to_message(email, connection)])
+            except Exception as e:
+                # Connection state is unknown after a failure; start fresh for the next message.
+                _discard_connection()
+                if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    leased.update(status='dead', last_error=str(e))
+                    result['dead'] += 1
+                else:
+                    leased.update(status='queued', last_error=str(e),
+                                  next_attempt_at=timezone.now() + _retry_delay(email.attempts))
+                    result['retried'] += 1
+                continue
+
+            leased.update(status='sent', sent_at=timezone.now())
+            result['sent'] += 1
+
+        if claimed < batch_size:
+            break
+
+    return result
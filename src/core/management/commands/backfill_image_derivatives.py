@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from src.books.images import IMAGE_FIELDS, build_derivatives, current_manifest, manifest_field, queue_derivatives
+from src.core.cache import CATALOG, bump_on_commit
+
+# Images per queued task; each task bumps the catalog generation once
+QUEUE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ("Build the WebP and JPEG thumbnails of book covers and author photos that have none yet, "
+            "e.g. uploaded before derivatives existed or while the Celery broker was down.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=[model._meta.model_name for model in IMAGE_FIELDS],
+                            help="Default: every model with an image")
+        parser.add_argument('--force', action='store_true',
+                            help="Check images whose thumbnails are built too, writing any file missing")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Queue a Celery task per image instead of building them here")
+
+    def handle(self, *args, **options):
+        built = 0
+        for model, field_name in IMAGE_FIELDS.items():
+            if options['model'] and options['model'] != model._meta.model_name:
+                continue
+            rows = (model.all_objects.exclude(Q(**{field_name: ''}) | Q(**{f"{field_name}__isnull": True}))
+                    .only('pk', field_name, manifest_field(field_name)).order_by('pk'))
+            counts = {'built': 0, 'queued': 0, 'current': 0, 'failed': 0}
+            pending = []
+            for instance in rows.iterator(chunk_size=QUEUE_BATCH_SIZE):
+                if not options['force'] and current_manifest(instance, field_name):
+                    counts['current'] += 1
+                elif options['enqueue']:
+                    pending.append(instance.pk)
+                    if len(pending) == QUEUE_BATCH_SIZE:
+                        queue_derivatives(model, pending)
+                        counts['queued'] += len(pending)
+                        pending = []
+                elif build_derivatives(model, instance.pk, force=options['force']):
+                    counts['built'] += 1
+                else:
+                    counts['failed'] += 1
+            if pending:
+                queue_derivatives(model, pending)
+                counts['queued'] += len(pending)
+            built += counts['built']
+            self.stdout.write(f"{model._meta.verbose_name_plural}: " +
+                              ", ".join(f"{count} {name}" for name, count in counts.items()))
+        if built:
+            # Once for the whole run, not once per image
+            bump_on_commit(CATALOG)
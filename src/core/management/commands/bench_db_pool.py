@@ -0,0 +1,59 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from src.core.views import pool_stats
+
+
+class Command(BaseCommand):
+    help = "Compare per-request database latency with and without the psycopg connection pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--query', default='SELECT 1')
+
+    def _run(self, alias, requests, query):
+        connection = connections[alias]
+        timings = []
+        for i in range(requests + 1):
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+            # What request_finished does: a real close without a pool, a return to the pool with one
+            connection.close()
+            if i:  # the first round opens the pool / warms up the server
+                timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        base = connections['default'].settings_dict
+        if base['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError("Connection pooling needs the PostgreSQL (psycopg 3) backend.")
+
+        options_without_pool = {key: value for key, value in base['OPTIONS'].items() if key != 'pool'}
+        variants = {
+            'bench_unpooled': {**options_without_pool},
+            'bench_pooled': {**options_without_pool, 'pool': base['OPTIONS'].get('pool') or True},
+        }
+
+        self.stdout.write(f"{'variant':<16} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for alias, db_options in variants.items():
+            connections.settings[alias] = {**copy.deepcopy(base), 'OPTIONS': db_options, 'CONN_MAX_AGE': 0}
+            try:
+                timings = self._run(alias, options['requests'], options['query'])
+                if 'pool' in db_options:
+                    self.stdout.write(f"pool stats: {pool_stats().get(alias)}")
+            finally:
+                if 'pool' in db_options:
+                    connections[alias].close_pool()
+                del connections[alias]
+                del connections.settings[alias]
+
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            self.stdout.write(
+                f"{alias:<16} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f} {p95:>9.2f}"
+            )
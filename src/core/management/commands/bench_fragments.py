@@ -0,0 +1,73 @@
+import io
+import json
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+
+from src.books.fragments import CARD_TEMPLATE, fragment_cache, render_book_cards
+from src.books.models import Book
+from src.core.benchmarking import isolated_database, percentile
+from src.core.management.commands.bench_hot_paths import SEED_UNTIL
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def _summary(timings):
+    return {
+        'median': round(statistics.median(timings), 3),
+        'p95': round(percentile(timings, 95), 3),
+        'mean': round(statistics.mean(timings), 3),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Time the storefront card markup per page: rendered from scratch, assembled from a cold "
+            "fragment cache, and from a warm one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=0.1, help="seed_bookstore --scale of the dataset")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--pages', type=int, default=20, help="Storefront pages to render")
+        parser.add_argument('--per-page', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help="Also write the results as JSON")
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            call_command('seed_bookstore', seed=options['seed'], scale=options['scale'],
+                         until=SEED_UNTIL.isoformat(), stdout=io.StringIO())
+            paginator = Paginator(Book.objects.can_sell().order_by('title', 'pk'), options['per_page'])
+            pages = [list(paginator.page(number)) for number in paginator.page_range[:options['pages']]]
+            if not pages or not pages[0]:
+                raise CommandError("The seeded dataset has no books to render.")
+
+            timings = {'uncached': [], 'cold': [], 'warm': []}
+            for _ in range(options['repeat']):
+                for books in pages:
+                    timings['uncached'].append(_timed(
+                        lambda: ''.join(render_to_string(CARD_TEMPLATE, {'book': book}) for book in books)))
+                    cache.clear()
+                    fragment_cache.clear()
+                    timings['cold'].append(_timed(lambda: render_book_cards(books)))
+                    timings['warm'].append(_timed(lambda: render_book_cards(books)))
+
+        results = {name: _summary(values) for name, values in timings.items()}
+        self.stdout.write(f"{len(pages)} pages of {options['per_page']} cards, {options['repeat']} rounds")
+        self.stdout.write(f"{'cards':<10} {'median ms':>10} {'p95 ms':>9} {'mean ms':>9}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<10} {result['median']:>10.3f} {result['p95']:>9.3f} {result['mean']:>9.3f}")
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'options': {key: options[key] for key in ('scale', 'seed', 'pages', 'per_page', 'repeat')},
+                           'results': results}, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
@@ -0,0 +1,264 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from contextlib import redirect_stdout
+from datetime import date
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from src.books.models import Book
+from src.cart.models import Cart, CartItem
+from src.core.benchmarking import isolated_database, percentile
+from src.core.profiling import QueryRecorder
+from src.shipping.models import DeliveryInfo
+from src.stock.models import Stock, StockHistory
+from src.users.models import User
+
+# Fixed end of the seeded history, so every run benchmarks the same rows
+SEED_UNTIL = date(2025, 12, 31)
+
+
+class HotPaths:
+    """
+        The benchmarked requests. Each one is a method returning (client, method, url, data);
+        an optional `setup_<name>` runs before every call, outside the measurement.
+        """
+    NAMES = ('bookstore', 'search_books', 'update_cart', 'checkout', 'stock_list', 'stock_batches')
+
+    def __init__(self):
+        self.admin = User.objects.create_superuser(email=f"bench-admin-{uuid.uuid4().hex[:8]}@example.com",
+                                                   password=None, first_name='Bench', last_name='Admin')
+        self.customer = User.objects.create_user(email=f"bench-customer-{uuid.uuid4().hex[:8]}@example.com",
+                                                 password=None, first_name='Bench', last_name='Customer')
+        self.customer.is_active = True
+        self.customer.save(update_fields=['is_active'])
+        self.address = DeliveryInfo.objects.create(user=self.customer, full_name='Bench Customer',
+                                                   street_address='1 Bench Marg', city='Kathmandu', zip_code='44600',
+                                                   country='NP', phone_number='9800000000', is_default=True)
+        self.cart, _ = Cart.objects.get_or_create(user=self.customer)
+
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        self.customer_client = Client()
+        self.customer_client.force_login(self.customer)
+
+        # Checkout sells one copy of each per call, so a few in stock books are enough
+        in_stock = Stock.objects.filter(is_available=True).select_related('book').order_by('-current_price')
+        self.books = [stock.book for stock in in_stock[:3]]
+        if not self.books:
+            raise CommandError("The seeded dataset has no stock to sell.")
+        self.busiest = Stock.objects.annotate(batch_count=Count('batches')).order_by('-batch_count').first().book
+        self.search_term = Book.objects.order_by('id').values_list('title', flat=True).first().split()[0]
+        self.cart_item = None
+
+    def _fill_cart(self):
+        self.cart.items.all().delete()
+        for book in self.books:
+            stock = book.stock
+            CartItem.objects.create(cart=self.cart, book=book, quantity=1, unit_price=stock.current_price,
+                                    discount_amount=stock.discount_amount)
+
+    def bookstore(self):
+        return self.customer_client, 'get', reverse('book_store'), {'page': 2, 'sort': 'price_asc'}
+
+    def search_books(self):
+        return self.admin_client, 'get', '/admin-panel/books/search/', {'q': self.search_term}
+
+    def setup_update_cart(self):
+        if self.cart_item is None or not CartItem.objects.filter(pk=self.cart_item.pk).exists():
+            self._fill_cart()
+            self.cart_item = self.cart.items.first()
+        # Keep the quantity low so increments never hit the stock ceiling
+        CartItem.objects.filter(pk=self.cart_item.pk).update(quantity=1)
+
+    def update_cart(self):
+        url = reverse('update_cart', args=[self.cart_item.uuid])
+        return self.customer_client, 'post', url, json.dumps({'action': 'increment'})
+
+    def setup_checkout(self):
+        self._fill_cart()
+        self.cart_item = None
+        session = self.customer_client.session
+        session['delivery_uuid'] = str(self.address.uuid)
+        session.save()
+
+    def checkout(self):
+        return self.customer_client, 'post', reverse('book_payment'), {'payment_method': 'cod'}
+
+    def stock_list(self):
+        return self.admin_client, 'get', reverse('admin-stock-list'), {}
+
+    def stock_batches(self):
+        return self.admin_client, 'get', reverse('admin_stock_batches', args=[self.busiest.uuid]), {}
+
+    def request(self, name):
+        client, method, url, data = getattr(self, name)()
+        if method == 'post' and isinstance(data, str):
+            return client.post(url, data, content_type='application/json')
+        return getattr(client, method)(url, data)
+
+
+def measure(paths, name, repeat):
+    """
+        Warm up once, then time `repeat` calls with query capture, then one more call under
+        tracemalloc for peak memory (kept separate because tracing slows everything down).
+        """
+    setup = getattr(paths, f'setup_{name}', None)
+    wall, sql, queries, statuses = [], [], [], set()
+
+    for i in range(repeat + 1):
+        if setup:
+            setup()
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = paths.request(name)
+            elapsed = time.perf_counter() - start
+        statuses.add(response.status_code)
+        if i:
+            wall.append(elapsed * 1000)
+            sql.append(recorder.seconds * 1000)
+            queries.append(recorder.count)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        paths.request(name)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_ms': {
+            'min': round(min(wall), 3),
+            'median': round(statistics.median(wall), 3),
+            'mean': round(statistics.mean(wall), 3),
+            'p95': round(percentile(wall, 95), 3),
+        },
+        'sql_ms': round(statistics.median(sql), 3),
+        'queries': int(statistics.median(queries)),
+        'queries_max': max(queries),
+        'peak_memory_kib': round(peak / 1024, 1),
+        'status': sorted(statuses),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                              cwd=settings.BASE_DIR).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+        Regressions of `current` against a previous results file: median wall time up by more
+        than `threshold` (a fraction), or any rise in the query count.
+        """
+    regressions = []
+    for size, paths in current['results'].items():
+        for name, now in paths.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if not before:
+                continue
+            old_ms, new_ms = before['wall_ms']['median'], now['wall_ms']['median']
+            if old_ms and (new_ms - old_ms) / old_ms > threshold:
+                regressions.append(f"{size} {name}: median {old_ms:.1f}ms -> {new_ms:.1f}ms")
+            if now['queries'] > before['queries']:
+                regressions.append(f"{size} {name}: queries {before['queries']} -> {now['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the storefront, cart, checkout and stock report hot paths against freshly seeded "
+            "databases of several sizes and write the results as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0.1,1', help="Comma separated seed_bookstore --scale values")
+        parser.add_argument('--paths', default=','.join(HotPaths.NAMES))
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_results.json')
+        parser.add_argument('--compare', help="Previous results file to check for regressions")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed median wall time increase against --compare (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        names = [name for name in options['paths'].split(',') if name]
+        unknown = set(names) - set(HotPaths.NAMES)
+        if unknown:
+            raise CommandError(f"Unknown hot paths: {', '.join(sorted(unknown))}")
+        sizes = [float(size) for size in options['sizes'].split(',')]
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+            },
+            'datasets': {},
+            'results': {},
+        }
+
+        for size in sizes:
+            label = f"scale-{size:g}"
+            self.stdout.write(f"== {label}")
+            report['datasets'][label], report['results'][label] = self._bench_size(size, names, options)
+
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                regressions = compare(report, json.load(fh), options['threshold'])
+            if regressions:
+                raise CommandError("Regressions:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def _bench_size(self, size, names, options):
+        with isolated_database():
+            seed_output = io.StringIO()
+            started = time.perf_counter()
+            call_command('seed_bookstore', seed=options['seed'], scale=size, until=SEED_UNTIL.isoformat(),
+                         stdout=seed_output)
+            dataset = {
+                'scale': size,
+                'seed_seconds': round(time.perf_counter() - started, 2),
+                'books': Book.all_objects.count(),
+                'stock_history': StockHistory.all_objects.count(),
+            }
+
+            paths = HotPaths()
+            results = {}
+            self.stdout.write(f"{'path':<16} {'median ms':>10} {'p95 ms':>9} {'sql ms':>8} {'queries':>8} "
+                              f"{'peak KiB':>9}")
+            for name in names:
+                # The views print debugging output; keep it out of the report
+                with redirect_stdout(io.StringIO()):
+                    result = measure(paths, name, options['repeat'])
+                results[name] = result
+                self.stdout.write(
+                    f"{name:<16} {result['wall_ms']['median']:>10.2f} {result['wall_ms']['p95']:>9.2f} "
+                    f"{result['sql_ms']:>8.2f} {result['queries']:>8} {result['peak_memory_kib']:>9.1f}"
+                )
+        return dataset, results
@@ -0,0 +1,53 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from Project_B import middleware
+from Project_B.middleware import ROUTE_CLASSIFIER
+
+SAMPLE_PATHS = [
+    '/',
+    '/about/',
+    '/static/css/base.css',
+    '/media/covers/book.jpg',
+    '/login/',
+    '/books/9b2f0c1e-1f7a-4c1d-9a55-3c1f0a6c2d11/',
+    '/carts/',
+    '/orders/history/',
+    '/admin-panel/books/',
+    '/admin/',
+    '/users/profile/',
+]
+
+
+def _linear_policy(path):
+    # The prefix-by-prefix scans PermissionMiddleware used to run on every request.
+    if any(path.startswith(p) for p in middleware.SKIP_PREFIXES):
+        return middleware.PUBLIC
+    if path in middleware.LOGGED_OUT_ONLY_PATHS:
+        return middleware.GUEST_ONLY
+    if path in middleware.EXEMPT_PATHS_EXACT or any(path.startswith(p) for p in middleware.EXEMPT_PATHS_PREFIX):
+        return middleware.PUBLIC
+    if any(path.startswith(p) for p in middleware.ADMIN_PREFIXES):
+        return middleware.ADMIN
+    if any(path.startswith(p) for p in middleware.CUSTOMER_ONLY_PATHS):
+        return middleware.CUSTOMER
+    return middleware.AUTHENTICATED
+
+
+class Command(BaseCommand):
+    help = "Time PermissionMiddleware route classification per request path."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        self.stdout.write(f"{'path':<50} {'policy':<14} {'linear ns':>10} {'compiled ns':>12}")
+        for path in SAMPLE_PATHS:
+            linear = timeit.timeit(lambda: _linear_policy(path), number=iterations) / iterations * 1e9
+            compiled = timeit.timeit(lambda: ROUTE_CLASSIFIER.classify(path), number=iterations) / iterations * 1e9
+            self.stdout.write(
+                f"{path:<50} {ROUTE_CLASSIFIER.classify(path):<14} {linear:>10.0f} {compiled:>12.0f}"
+            )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.books.importer import FORMATS, MALFORMED, CatalogImport, detect_format, read_records
+from src.users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Import books from a CSV, JSON Lines or ONIX style XML file in chunks: authors, publishers "
+            "and genres are matched by name (created when missing), each book gets its stock and an "
+            "opening batch. Rows that fail are written to a rejects file with the reasons.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help="Default: from the file extension")
+        parser.add_argument('--chunk-size', type=int, help="Rows per transaction (CATALOG_IMPORT_CHUNK_SIZE)")
+        parser.add_argument('--rejects', help="Rejects file, JSON Lines (default: <path>.rejects.jsonl)")
+        parser.add_argument('--user', help="Email of the user the stock and price history is recorded for")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = options['format'] or detect_format(path)
+        except ValueError as error:
+            raise CommandError(error)
+        user = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['user']}")
+
+        rejects_path = options['rejects'] or f"{path}.rejects.jsonl"
+        started = time.perf_counter()
+        with open(path, 'rb') as source, open(rejects_path, 'w', encoding='utf-8') as rejects:
+            job = CatalogImport(rejects=rejects, user=user, chunk_size=options['chunk_size'])
+            try:
+                job.run(read_records(source, file_format))
+            except MALFORMED as error:
+                raise CommandError(f"Stopped after {job.counts['read']} rows, the file is malformed: {error}")
+        elapsed = time.perf_counter() - started
+
+        counts = job.counts
+        self.stdout.write(f"{counts['read']} rows in {elapsed:.1f}s ({counts['read'] / max(elapsed, 1e-9):.0f} rows/s)")
+        for name, count in sorted(counts.items()):
+            if name != 'read':
+                self.stdout.write(f"  {name:<20} {count:>10}")
+        if counts['rejected']:
+            self.stdout.write(f"Rejected rows written to {rejects_path}")
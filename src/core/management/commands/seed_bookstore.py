@@ -0,0 +1,403 @@
+import bisect
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from src.books.models import Author, Publisher, Genre, GenreClosure, Book
+from src.cart.models import Cart, CartItem
+from src.core.bulk import RowWriter
+from src.core.cache import CATALOG, PRICES, bump_on_commit
+from src.orders.models import Order, OrderItem
+from src.shipping.models import DeliveryInfo
+from src.stock.models import Stock, StockBatch, StockHistory, StockReservation
+from src.users.models import User
+
+WORDS = (
+    'silent', 'river', 'shadow', 'golden', 'empire', 'garden', 'winter', 'echo', 'crimson', 'forest', 'lost',
+    'city', 'ocean', 'broken', 'crown', 'midnight', 'paper', 'stone', 'whisper', 'iron', 'summer', 'hidden',
+    'north', 'glass', 'storm', 'wild', 'last', 'letter', 'mountain', 'dream', 'fire', 'secret', 'light', 'road',
+)
+FIRST_NAMES = ('Aarav', 'Sita', 'Maya', 'John', 'Emma', 'Liam', 'Priya', 'Noah', 'Olivia', 'Ravi', 'Asha', 'Leo')
+LAST_NAMES = ('Sharma', 'Thapa', 'Smith', 'Gurung', 'Brown', 'Rai', 'Miller', 'Karki', 'Wilson', 'Shrestha')
+NATIONALITIES = ('Nepali', 'Indian', 'American', 'British', 'French', 'Japanese', 'German')
+LANGUAGES = ('English', 'English', 'English', 'Nepali', 'Hindi', 'French')
+CITIES = ('Kathmandu', 'Pokhara', 'Lalitpur', 'Bhaktapur', 'Biratnagar', 'Butwal')
+DISCOUNTS = (Decimal('0.00'), Decimal('0.00'), Decimal('5.00'), Decimal('10.00'), Decimal('20.00'))
+CENT = Decimal('0.01')
+
+# Every model written, parents first
+SEEDED_MODELS = [
+    Publisher, Author, Genre, GenreClosure, Book, Book.authors.through, Book.genres.through, User, DeliveryInfo,
+    Stock, StockBatch, Order, OrderItem, StockReservation, StockHistory, Cart, CartItem,
+]
+
+
+@contextmanager
+def explicit_timestamps(models):
+    """
+        Temporarily turn off auto_now / auto_now_add so bulk_create keeps the historical
+        created_at, updated_at and order_date values the generator computed.
+        """
+    patched = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                patched.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in patched:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ("Generate a deterministic, production shaped bookstore dataset: catalog, stock batches, "
+            "orders with matching reservations and StockHistory ledgers, carts and addresses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--scale', type=float, default=1.0, help="Multiply the publisher, author, book, user and order counts; the genre tree keeps its size")
+        parser.add_argument('--publishers', type=int, default=50)
+        parser.add_argument('--authors', type=int, default=400)
+        parser.add_argument('--genres', type=int, default=12, help="Top level genres")
+        parser.add_argument('--subgenres', type=int, default=4, help="Subgenres per top level genre")
+        parser.add_argument('--books', type=int, default=2000)
+        parser.add_argument('--max-batches', type=int, default=4, help="Stock batches per book (1..N)")
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--cart-ratio', type=float, default=0.3, help="Share of users with a cart")
+        parser.add_argument('--days', type=int, default=730, help="History length")
+        parser.add_argument('--until', help="Last day of history, YYYY-MM-DD (default: today)")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per COPY / bulk_create")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL")
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        self.counts = {
+            name: max(1, int(options[name] * scale))
+            for name in ('publishers', 'authors', 'books', 'users', 'orders')
+        }
+        self.counts['genres'] = options['genres']
+        self.counts['subgenres'] = options['subgenres']
+        self.max_batches = max(1, options['max_batches'])
+        self.cart_ratio = options['cart_ratio']
+        self.seed = options['seed']
+        self.rng = random.Random(self.seed)
+
+        until = datetime.strptime(options['until'], '%Y-%m-%d') if options['until'] else datetime.now()
+        self.end = datetime.combine(until.date(), datetime.max.time(), tzinfo=dt_timezone.utc).replace(microsecond=0)
+        self.start = self.end - timedelta(days=options['days'])
+
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        self.writer = RowWriter(options['batch_size'], use_copy)
+        self.next_ids = {
+            model: (model._base_manager.aggregate(top=Max('pk'))['top'] or 0) + 1 for model in SEEDED_MODELS
+        }
+
+        started = time.perf_counter()
+        with transaction.atomic(), explicit_timestamps(SEEDED_MODELS):
+            self.seed_catalog()
+            self.seed_customers()
+            self.seed_orders()
+            self.seed_carts()
+            self.writer.flush()
+            self.reset_sequences()
+            # COPY and bulk_create send no signals
+            bump_on_commit(CATALOG)
+            bump_on_commit(PRICES)
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.writer.counts.values())
+        self.stdout.write(f"{'COPY' if use_copy else 'bulk_create'}: {total} rows in {elapsed:.1f}s")
+        for label, count in sorted(self.writer.counts.items()):
+            self.stdout.write(f"  {label:<28} {count:>10}")
+
+    # helpers
+
+    def new_id(self, model):
+        value = self.next_ids[model]
+        self.next_ids[model] = value + 1
+        return value
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self, low=None, high=None):
+        low, high = low or self.start, high or self.end
+        return low + timedelta(seconds=self.rng.randint(0, max(0, int((high - low).total_seconds()))))
+
+    def base_row(self, model, at):
+        return {'id': self.new_id(model), 'uuid': self.uuid(), 'created_at': at, 'updated_at': at,
+                'deleted_at': None, 'deleted_by_id': None}
+
+    def link_genre(self, ancestor_id, descendant_id, depth):
+        # Genre.save() is bypassed, so the closure rows are written alongside the genres
+        self.writer.add(GenreClosure, {'id': self.new_id(GenreClosure), 'ancestor_id': ancestor_id,
+                                       'descendant_id': descendant_id, 'depth': depth})
+
+    def title(self):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(2, 4))).title()
+
+    def reset_sequences(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), SEEDED_MODELS):
+                cursor.execute(sql)
+
+    # catalog
+
+    def seed_catalog(self):
+        rng, add = self.rng, self.writer.add
+        tag = f"{self.seed}-"
+
+        publisher_ids = []
+        for i in range(self.counts['publishers']):
+            row = self.base_row(Publisher, self.moment(high=self.start))
+            row.update(name=f"{self.title()} Press {tag}{i}", founded_year=rng.randint(1900, 2020))
+            add(Publisher, row)
+            publisher_ids.append(row['id'])
+
+        author_ids = []
+        for i in range(self.counts['authors']):
+            row = self.base_row(Author, self.moment(high=self.start))
+            row.update(name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {tag}{i}",
+                       nationality=rng.choice(NATIONALITIES))
+            add(Author, row)
+            author_ids.append(row['id'])
+
+        leaf_genre_ids = []
+        for i in range(self.counts['genres']):
+            parent = self.base_row(Genre, self.start)
+            parent.update(name=f"{self.title()} {tag}{i}", parent_genre_id=None)
+            add(Genre, parent)
+            self.link_genre(parent['id'], parent['id'], 0)
+            for j in range(self.counts['subgenres']):
+                child = self.base_row(Genre, self.start)
+                child.update(name=f"{self.title()} {tag}{i}.{j}", parent_genre_id=parent['id'])
+                add(Genre, child)
+                self.link_genre(child['id'], child['id'], 0)
+                self.link_genre(parent['id'], child['id'], 1)
+                leaf_genre_ids.append(child['id'])
+            if not self.counts['subgenres']:
+                leaf_genre_ids.append(parent['id'])
+
+        # Per book simulation state, used by seed_orders: [price, discount, batches, next batch to arrive, on hand]
+        self.books = []
+        # Popularity is heavily skewed, like real sales
+        self.book_weights = []
+        for i in range(self.counts['books']):
+            listed_at = self.moment(high=self.start + (self.end - self.start) / 2)
+            book = self.base_row(Book, listed_at)
+            book.update(
+                title=f"{self.title()} {tag}{i}",
+                pages=rng.randint(80, 900),
+                language=rng.choice(LANGUAGES),
+                isbn=f"9{self.seed % 100:02d}{i:010d}",
+                publication_date=(listed_at - timedelta(days=rng.randint(0, 3650))).date(),
+                edition=rng.choice(('1st', '2nd', None)),
+                publisher_id=rng.choice(publisher_ids),
+            )
+            add(Book, book)
+            for author_id in rng.sample(author_ids, k=min(len(author_ids), rng.randint(1, 3))):
+                add(Book.authors.through, {'id': self.new_id(Book.authors.through), 'book_id': book['id'],
+                                           'author_id': author_id})
+            for genre_id in rng.sample(leaf_genre_ids, k=min(len(leaf_genre_ids), rng.randint(1, 3))):
+                add(Book.genres.through, {'id': self.new_id(Book.genres.through), 'book_id': book['id'],
+                                          'genre_id': genre_id})
+
+            stock = self.base_row(Stock, listed_at)
+            price = Decimal(rng.randint(300, 6000)) / 10
+            stock.update(book_id=book['id'], current_price=price, current_discount_percentage=rng.choice(DISCOUNTS))
+
+            batches = []
+            arrival = listed_at
+            for _ in range(rng.randint(1, self.max_batches)):
+                received = arrival.replace(hour=9, minute=0, second=0)
+                quantity = rng.randint(10, 200)
+                batch = self.base_row(StockBatch, received)
+                batch.update(stock_id=stock['id'], received_date=received.date(), initial_quantity=quantity,
+                             remaining_quantity=quantity, supplier_id=book['publisher_id'], notes="Restocked",
+                             unit_cost=(price * Decimal(rng.uniform(0.4, 0.7))).quantize(CENT))
+                batches.append(batch)
+                arrival = arrival + timedelta(days=rng.randint(30, 240))
+                if arrival > self.end:
+                    break
+
+            self.books.append({'book': book, 'stock': stock, 'batches': batches, 'arrived': 0, 'on_hand': 0})
+            self.book_weights.append(1 / (i + 1) ** 0.8)
+
+        rng.shuffle(self.book_weights)
+        total = 0.0
+        self.book_cumulative = []
+        for weight in self.book_weights:
+            total += weight
+            self.book_cumulative.append(total)
+
+    def arrive_batches(self, state, until):
+        """
+            Receive every batch of a book due by `until`, writing its restock ledger row.
+            """
+        batches = state['batches']
+        while state['arrived'] < len(batches) and batches[state['arrived']]['created_at'] <= until:
+            batch = batches[state['arrived']]
+            before = state['on_hand']
+            state['on_hand'] += batch['initial_quantity']
+            state['arrived'] += 1
+            state['stock']['last_restock_date'] = batch['received_date']
+            self.history(state, batch, 'restock', batch['initial_quantity'], before, state['on_hand'],
+                         batch['created_at'], None, "New batch added")
+
+    def history(self, state, batch, change_type, change, before, after, at, order_id, reason):
+        row = self.base_row(StockHistory, at)
+        row.update(stock_id=state['stock']['id'], batch_id=batch['id'], change_type=change_type,
+                   quantity_change=change, before_quantity=before, after_quantity=after, reason=reason,
+                   changed_by_id=None, order_id=order_id)
+        self.writer.add(StockHistory, row)
+
+    # customers
+
+    def seed_customers(self):
+        rng, add = self.rng, self.writer.add
+        password = make_password('password', salt=f"seed{self.seed}")
+
+        self.users = []
+        for i in range(self.counts['users']):
+            joined = self.moment(high=self.start + (self.end - self.start) / 2)
+            user = self.base_row(User, joined)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            user.update(email=f"customer{self.seed}_{i}@example.com", password=password, first_name=first,
+                        last_name=last, is_active=True, is_staff=False, is_superuser=False, date_joined=joined,
+                        last_login=None, date_of_birth=None)
+            add(User, user)
+
+            addresses = []
+            for n in range(rng.choice((1, 1, 1, 2))):
+                address = self.base_row(DeliveryInfo, joined)
+                address.update(user_id=user['id'], full_name=f"{first} {last}",
+                               street_address=f"{rng.randint(1, 999)} {rng.choice(WORDS).title()} Marg",
+                               city=rng.choice(CITIES), state=None, zip_code=f"{rng.randint(10000, 99999)}",
+                               country='NP', phone_number=f"98{rng.randint(10000000, 99999999)}",
+                               is_default=(n == 0))
+                add(DeliveryInfo, address)
+                addresses.append(address['id'])
+            self.users.append((user['id'], addresses, joined))
+
+    # orders
+
+    def seed_orders(self):
+        """
+            Replay orders in time order against FIFO batches, producing orders, items,
+            reservations and reserve / sold / release_reserve ledger rows that reconcile with
+            the final batch quantities.
+            """
+        rng, add = self.rng, self.writer.add
+        placed = sorted(self.moment() for _ in range(self.counts['orders']))
+
+        for at in placed:
+            user_id, addresses, joined = rng.choice(self.users)
+            at = max(at, joined)
+            status = rng.choices(('completed', 'pending', 'cancelled'), weights=(80, 10, 10))[0]
+            order = self.base_row(Order, at)
+            order.update(user_id=user_id, status=status, order_date=at, shipping_address_id=rng.choice(addresses),
+                         shipping_cost=Decimal(rng.choice((0, 50, 100))))
+
+            settled_at = at + timedelta(hours=rng.randint(1, 72))
+            picked = set()
+            total = Decimal('0.00')
+            for _ in range(rng.choice((1, 1, 2, 2, 3, 4))):
+                index = bisect.bisect_left(self.book_cumulative, rng.random() * self.book_cumulative[-1])
+                index = min(index, len(self.books) - 1)
+                if index in picked:
+                    continue
+                picked.add(index)
+
+                state = self.books[index]
+                self.arrive_batches(state, at)
+                quantity = min(rng.choice((1, 1, 1, 2, 3)), state['on_hand'])
+                if quantity <= 0:
+                    continue
+
+                stock = state['stock']
+                unit_price = stock['current_price']
+                discount = (unit_price * stock['current_discount_percentage'] / 100).quantize(CENT)
+                item = self.base_row(OrderItem, at)
+                item.update(order_id=order['id'], book_id=state['book']['id'], quantity=quantity,
+                            unit_price=unit_price, discount_amount=discount)
+                add(OrderItem, item)
+                total += (unit_price - discount) * quantity
+
+                self.reserve(state, order, item, quantity, status, at, settled_at)
+
+            if not picked or total == 0:
+                # Nothing was in stock; the order row is never written, its id is simply skipped
+                continue
+            order['total_amount'] = total + order['shipping_cost']
+            add(Order, order)
+
+        # Batches received after the last order still arrive, then stock rows get their final state
+        for state in self.books:
+            self.arrive_batches(state, self.end)
+            stock = state['stock']
+            stock['is_available'] = state['on_hand'] > 1 and stock['current_price'] > 1
+            add(Stock, stock)
+            for batch in state['batches']:
+                add(StockBatch, batch)
+
+    def reserve(self, state, order, item, quantity, status, at, settled_at):
+        needed = quantity
+        for batch in state['batches'][:state['arrived']]:
+            if not needed:
+                break
+            take = min(batch['remaining_quantity'], needed)
+            if not take:
+                continue
+
+            before = batch['remaining_quantity']
+            batch['remaining_quantity'] -= take
+            state['on_hand'] -= take
+            needed -= take
+
+            reservation = self.base_row(StockReservation, at)
+            reservation.update(stock_id=state['stock']['id'], order_item_id=item['id'], batch_id=batch['id'],
+                               reserved_quantity=take, is_active=(status == 'pending'))
+            self.writer.add(StockReservation, reservation)
+            self.history(state, batch, 'reserve', -take, before, batch['remaining_quantity'], at, order['id'],
+                         "Order reservation")
+
+            if status == 'completed':
+                self.history(state, batch, 'sold', -take, None, None, settled_at, order['id'],
+                             "Order completed and stock finalized")
+            elif status == 'cancelled':
+                before = batch['remaining_quantity']
+                batch['remaining_quantity'] += take
+                state['on_hand'] += take
+                self.history(state, batch, 'release_reserve', take, before, batch['remaining_quantity'],
+                             settled_at, order['id'], "Reservation released due to order cancellation")
+
+    # carts
+
+    def seed_carts(self):
+        rng, add = self.rng, self.writer.add
+        for user_id, addresses, joined in self.users:
+            if rng.random() >= self.cart_ratio:
+                continue
+            at = self.moment(low=max(joined, self.end - timedelta(days=30)))
+            cart = self.base_row(Cart, at)
+            cart.update(user_id=user_id, shipping_address_id=addresses[0], shipping_cost=Decimal('50.00'))
+            add(Cart, cart)
+            for index in rng.sample(range(len(self.books)), k=min(len(self.books), rng.randint(1, 5))):
+                stock = self.books[index]['stock']
+                discount = (stock['current_price'] * stock['current_discount_percentage'] / 100).quantize(CENT)
+                add(CartItem, {'id': self.new_id(CartItem), 'uuid': self.uuid(), 'cart_id': cart['id'],
+                               'book_id': self.books[index]['book']['id'], 'quantity': rng.randint(1, 3),
+                               'unit_price': stock['current_price'], 'discount_amount': discount})
@@ -0,0 +1,242 @@
+import io
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import get_messages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum, Q
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from src.books.models import Book, Publisher
+from src.cart.models import Cart, CartItem
+from src.core.benchmarking import isolated_database, percentile
+from src.orders.models import OrderItem
+from src.shipping.models import DeliveryInfo
+from src.stock.models import Stock, StockBatch, StockHistory, StockReservation
+from src.stock.services import StockService
+from src.users.models import User
+
+
+class LockMonitor(threading.Thread):
+    """
+        Samples pg_locks from its own connection while the buyers run: how often some backend
+        in this database was waiting for a lock, and the most that waited at once.
+        """
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.waiting_samples = 0
+        self.peak_waiting = 0
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.is_set():
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid "
+                        "WHERE NOT l.granted AND a.datname = current_database()"
+                    )
+                    waiting = cursor.fetchone()[0]
+                    self.samples += 1
+                    self.waiting_samples += bool(waiting)
+                    self.peak_waiting = max(self.peak_waiting, waiting)
+                    self.stopped.wait(self.interval)
+        finally:
+            connection.close()
+
+
+def _deadlock_count():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = ("Stress BookCheckoutPayment.post with concurrent buyers competing for the same few copies, "
+            "then check that no batch oversold and the StockHistory ledger balances.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=50, help="Concurrent threads")
+        parser.add_argument('--titles', type=int, default=1, help="Contested titles")
+        parser.add_argument('--copies', type=int, default=10, help="Copies of each title")
+        parser.add_argument('--batches', type=int, default=3, help="Batches the copies are split across")
+        parser.add_argument('--items-per-cart', type=int, default=1,
+                            help="Titles in each buyer's cart (more than one invites lock order deadlocks)")
+        parser.add_argument('--quantity', type=int, default=1, help="Copies of each title per buyer")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--sample-ms', type=float, default=5, help="pg_locks sampling interval")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("The stress test needs PostgreSQL: SQLite serialises every writer.")
+        if options['items_per_cart'] > options['titles']:
+            raise CommandError("--items-per-cart cannot exceed --titles.")
+
+        with isolated_database():
+            stocks = self._create_titles(options)
+            clients = self._create_buyers(stocks, options)
+            # Buyer threads open their own connections; make sure the setup is visible to them
+            connection.close()
+
+            deadlocks_before = _deadlock_count()
+            monitor = LockMonitor(options['sample_ms'] / 1000)
+            monitor.start()
+            started = time.perf_counter()
+            try:
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    attempts = list(pool.map(self._checkout, clients))
+            finally:
+                elapsed = time.perf_counter() - started
+                monitor.stopped.set()
+                monitor.join()
+
+            self._report(attempts, elapsed, monitor, _deadlock_count() - deadlocks_before, options)
+            violations = self._check_invariants(stocks, options)
+            connections.close_all()
+
+        if violations:
+            raise CommandError("Invariant violations:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("No oversell; every batch ledger balances."))
+
+    def _create_titles(self, options):
+        admin = User.objects.create_superuser(email='stress-admin@example.com', password=None,
+                                              first_name='Stress', last_name='Admin')
+        publisher = Publisher.objects.create(name='Stress Press', founded_year=2000)
+        received = timezone.localdate() - timedelta(days=options['batches'])
+
+        stocks = []
+        for i in range(options['titles']):
+            book = Book.objects.create(title=f"Contested title {i}", isbn=f"99{i:011d}",
+                                       publication_date=received, publisher=publisher)
+            stock = Stock.objects.create(book=book, current_price=Decimal('500.00'))
+            remaining = options['copies']
+            for n in range(options['batches']):
+                quantity = remaining // (options['batches'] - n)
+                if quantity:
+                    with redirect_stdout(io.StringIO()):
+                        StockService.restock(stock=stock, initial_quantity=quantity, unit_cost=Decimal('250.00'),
+                                             user=admin, received_date=received + timedelta(days=n))
+                remaining -= quantity
+            stocks.append(stock)
+        return stocks
+
+    def _create_buyers(self, stocks, options):
+        rng = random.Random(options['seed'])
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(email=f"buyer{i}@example.com", password=password, first_name='Buyer', last_name=str(i),
+                 is_active=True)
+            for i in range(options['buyers'])
+        ])
+        DeliveryInfo.objects.bulk_create([
+            DeliveryInfo(user=user, full_name=f"Buyer {user.last_name}", street_address='1 Stress Marg',
+                         city='Kathmandu', zip_code='44600', country='NP', phone_number='9800000000',
+                         is_default=True)
+            for user in users
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user, shipping_cost=Decimal('50.00')) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, book=stock.book, quantity=options['quantity'], unit_price=stock.current_price)
+            for cart in carts
+            for stock in rng.sample(stocks, options['items_per_cart'])
+        ])
+
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        return clients
+
+    def _checkout(self, client):
+        """
+            One buyer's checkout, in its own thread and database connection.
+            Returns (outcome, seconds).
+            """
+        try:
+            with redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                response = client.post(reverse('book_payment'), {'payment_method': 'cod'})
+                seconds = time.perf_counter() - start
+        finally:
+            connection.close()
+
+        if response.status_code == 302 and response.url == reverse('book_order_complete'):
+            return 'ordered', seconds
+        notes = ' '.join(str(message) for message in get_messages(response.wsgi_request)).lower()
+        if 'deadlock' in notes:
+            return 'deadlock', seconds
+        if 'not enough stock' in notes:
+            return 'sold_out', seconds
+        return 'error', seconds
+
+    def _report(self, attempts, elapsed, monitor, deadlocks, options):
+        outcomes = Counter(outcome for outcome, _ in attempts)
+        latencies = [seconds * 1000 for _, seconds in attempts]
+        ordered_latencies = [seconds * 1000 for outcome, seconds in attempts if outcome == 'ordered']
+
+        self.stdout.write(f"buyers {len(attempts)}, workers {options['workers']}, titles {options['titles']}, "
+                          f"copies {options['copies']} each, wall {elapsed:.2f}s")
+        self.stdout.write("outcomes: " + ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items())))
+        self.stdout.write(f"checkouts/sec {len(attempts) / elapsed:.1f}, "
+                          f"orders/sec {outcomes['ordered'] / elapsed:.1f}")
+        self.stdout.write(f"latency ms: p50 {statistics.median(latencies):.1f}, p99 {percentile(latencies, 99):.1f}, "
+                          f"max {max(latencies):.1f}")
+        if ordered_latencies:
+            self.stdout.write(f"successful checkout ms: p50 {statistics.median(ordered_latencies):.1f}, "
+                              f"p99 {percentile(ordered_latencies, 99):.1f}")
+        waiting_share = monitor.waiting_samples / monitor.samples if monitor.samples else 0
+        self.stdout.write(f"lock waits: seen in {waiting_share:.0%} of {monitor.samples} samples, "
+                          f"peak {monitor.peak_waiting} waiting; deadlocks {deadlocks}")
+
+    def _check_invariants(self, stocks, options):
+        violations = []
+
+        for batch in StockBatch.objects.filter(stock__in=stocks, remaining_quantity__lt=0):
+            violations.append(f"batch {batch.pk} remaining_quantity is {batch.remaining_quantity}")
+
+        # The ledger (restock, reserve, release; 'sold' only finalises a reservation) replays each batch
+        ledger = {
+            row['batch']: row['total']
+            for row in StockHistory.objects.filter(stock__in=stocks).exclude(change_type='sold')
+            .values('batch').annotate(total=Sum('quantity_change'))
+        }
+        for batch in StockBatch.objects.filter(stock__in=stocks):
+            if ledger.get(batch.pk, 0) != batch.remaining_quantity:
+                violations.append(f"batch {batch.pk}: ledger sums to {ledger.get(batch.pk, 0)}, "
+                                  f"remaining_quantity is {batch.remaining_quantity}")
+
+        for stock in stocks:
+            batches = StockBatch.objects.filter(stock=stock).aggregate(
+                initial=Sum('initial_quantity'), remaining=Sum('remaining_quantity'))
+            taken = batches['initial'] - batches['remaining']
+            reserved = StockReservation.objects.filter(stock=stock, is_active=True).aggregate(
+                total=Sum('reserved_quantity'))['total'] or 0
+            ordered = OrderItem.objects.filter(book=stock.book).aggregate(total=Sum('quantity'))['total'] or 0
+
+            if ordered > options['copies']:
+                violations.append(f"{stock.book.title}: {ordered} copies ordered, only {options['copies']} existed")
+            if not taken == reserved == ordered:
+                violations.append(f"{stock.book.title}: {taken} copies left the batches, {reserved} are reserved, "
+                                  f"{ordered} were ordered")
+
+        orphans = OrderItem.objects.filter(book__stock__in=stocks).filter(
+            Q(reservation__isnull=True) | Q(reservation__is_active=False)).distinct().count()
+        if orphans:
+            violations.append(f"{orphans} order items without an active reservation")
+        return violations
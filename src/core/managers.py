@@ -61,12 +61,11 @@ class DeletedObjectsManager(BaseSafeDeleteManager):
                 Restore all deleted objects.
                 Calls the QuerySet's restore() method.
                 """
-        
-        return self.queryset().restore()
+        return self.get_queryset().restore()
 
     def hard_delete_all(self):
         """
                 Permanently delete all deleted objects.
                 Calls the QuerySet's hard_delete() method.
                 """
-        return self.queryset().hard_delete()
+        return self.get_queryset().hard_delete()
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=2048)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('trigger', models.CharField(choices=[('staff', 'Requested by staff'), ('sample', 'Sampled slow request')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('db_ms', models.FloatField()),
+                ('cache_ms', models.FloatField()),
+                ('template_ms', models.FloatField()),
+                ('python_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('profile_file', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['trigger', '-created_at'], name='core_reques_trigger_5f0f2a_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
+import os
 import uuid
 
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from src.core.soft_delete import SafeDeleteModel
 
@@ -12,3 +15,88 @@ class AbstractBaseModel(SafeDeleteModel):
 
     class Meta:
         abstract = True
+
+
+class OutgoingEmail(models.Model):
+    """
+        Buffered outgoing email written by src.core.mail.QueuedEmailBackend
+        and delivered in batches by src.core.mail.flush_outbox.
+        """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    )
+
+    subject = models.TextField()
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list, blank=True)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    alternatives = models.JSONField(default=list, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    # When a queued row is due, or when the lease of the flush sending it runs out
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class RequestProfile(models.Model):
+    """
+        A cProfile capture of one request, written by Project_B.middleware.RequestProfilingMiddleware.
+        The profile itself is a pstats file under PROFILING_DIR.
+        """
+    TRIGGER_CHOICES = (
+        ('staff', 'Requested by staff'),
+        ('sample', 'Sampled slow request'),
+    )
+
+    path = models.CharField(max_length=2048)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='+')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    db_ms = models.FloatField()
+    cache_ms = models.FloatField()
+    template_ms = models.FloatField()
+    python_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    profile_file = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    @property
+    def file_path(self):
+        return os.path.join(settings.PROFILING_DIR, self.profile_file)
+
+    def delete_file(self):
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['trigger', '-created_at']),
+        ]
@@ -0,0 +1,159 @@
+import io
+import os
+import pstats
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+from src.core.models import RequestProfile
+
+TOKEN_SALT = 'src.core.profiling'
+
+# Self time spent in these files (and in C functions they call) counts towards the category
+CATEGORY_PATHS = {
+    'template': (f'{os.sep}django{os.sep}template{os.sep}', f'{os.sep}templatetags{os.sep}'),
+    'cache': (f'{os.sep}django{os.sep}core{os.sep}cache{os.sep}', f'{os.sep}redis{os.sep}'),
+}
+
+
+class QueryRecorder:
+    """
+        connection.execute_wrapper hook counting queries and the time spent inside the driver.
+        """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def can_profile(user):
+    """
+        Whether `user` may get a profiling token or profile a request: active staff holding
+        core.add_requestprofile (superusers hold every permission).
+        """
+    return user.is_authenticated and user.is_active and user.is_staff and user.has_perm('core.add_requestprofile')
+
+
+def make_token(user):
+    """
+        Token for the profiling header, valid for PROFILING_TOKEN_MAX_AGE seconds.
+        """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def _token_is_valid(token):
+    try:
+        user_pk = signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    # Tokens stop working as soon as their owner loses staff status or the permission
+    user = get_user_model().objects.filter(pk=user_pk, is_staff=True, is_active=True).first()
+    return user is not None and can_profile(user)
+
+
+def profiling_trigger(request):
+    """
+        'staff' when a staff member allowed to (can_profile) asked for this request to be profiled
+        (query flag while logged in, or a signed token header from any client), 'sample' for the random share of
+        all requests, otherwise None.
+        """
+    token = request.headers.get(settings.PROFILING_HEADER)
+    if token and _token_is_valid(token):
+        return 'staff'
+    if settings.PROFILING_QUERY_FLAG in request.GET and can_profile(request.user):
+        return 'staff'
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def _category(filename):
+    for category, paths in CATEGORY_PATHS.items():
+        if any(path in filename for path in paths):
+            return category
+    return None
+
+
+def category_seconds(stats):
+    """
+        Exclusive time per category from pstats data: each function's own time goes to the
+        category of its file; C functions ('~') are split across their callers' categories.
+        """
+    totals = dict.fromkeys(CATEGORY_PATHS, 0.0)
+    for (filename, _, _), (_, _, own_time, _, callers) in stats.items():
+        if filename == '~':
+            for (caller_file, _, _), (_, _, caller_share, _) in callers.items():
+                category = _category(caller_file)
+                if category:
+                    totals[category] += caller_share
+            continue
+        category = _category(filename)
+        if category:
+            totals[category] += own_time
+    return totals
+
+
+def timings(profiler, total_seconds, queries):
+    """
+        Milliseconds spent talking to the database, in cache and template code, and everything
+        else (python), for the Server-Timing header and RequestProfile.
+        """
+    seconds = category_seconds(pstats.Stats(profiler).stats)
+    seconds['db'] = queries.seconds
+    seconds['python'] = max(0.0, total_seconds - sum(seconds.values()))
+    seconds['total'] = total_seconds
+    return {name: round(value * 1000, 2) for name, value in seconds.items()}
+
+
+def server_timing_header(ms):
+    return ', '.join(f"{name};dur={ms[name]}" for name in ('db', 'cache', 'template', 'python', 'total'))
+
+
+def save_profile(request, response, profiler, trigger, ms, queries):
+    """
+        Dump the profile under PROFILING_DIR and record it, keeping the newest PROFILING_KEEP.
+        """
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+    profiler.dump_stats(os.path.join(settings.PROFILING_DIR, filename))
+
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        path=request.get_full_path()[:2048],
+        method=request.method,
+        status_code=response.status_code,
+        user=user if user is not None and user.is_authenticated else None,
+        trigger=trigger,
+        duration_ms=ms['total'],
+        db_ms=ms['db'],
+        cache_ms=ms['cache'],
+        template_ms=ms['template'],
+        python_ms=ms['python'],
+        query_count=queries.count,
+        profile_file=filename,
+    )
+
+    expired = list(RequestProfile.objects.order_by('-id')[settings.PROFILING_KEEP:])
+    for old in expired:
+        old.delete_file()
+    RequestProfile.objects.filter(pk__in=[old.pk for old in expired]).delete()
+    return profile
+
+
+def top_functions(profile, limit=40):
+    stream = io.StringIO()
+    stats = pstats.Stats(profile.file_path, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
@@ -1,29 +1,74 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Exists, OuterRef
+from django.dispatch import Signal
 from django.utils import timezone
 
+# Children whose deleted_at is this close to their parent's were deleted together with it.
+# Exact matches for everything cascaded here; the slack covers rows deleted one by one in the past.
+CASCADE_RESTORE_WINDOW = timedelta(seconds=1)
+
+# Sent with sender=model and using=alias after delete() or restore() on a SafeDeleteQuerySet,
+# whose UPDATEs bypass post_save
+soft_delete_changed = Signal()
+
 
 # User = get_user_model()
 def get_user():
     return get_user_model()
 
 
+def cascade_relations(model):
+    """
+        Yield (child model, foreign key name) for every reverse relation listed in the
+        model's `soft_delete_cascade`, e.g. Book.soft_delete_cascade = ('stock',).
+        """
+    for name in getattr(model, 'soft_delete_cascade', ()):
+        relation = model._meta.get_field(name)
+        yield relation.related_model, relation.field.name
+
+
+def drop_dependents(model, parents):
+    """
+        Delete outright the rows of every reverse relation listed in the model's
+        `soft_delete_drop` that point at `parents`: dependents with no soft delete of
+        their own, e.g. Book.soft_delete_drop = ('cart_items',). Restore does not bring them back.
+        """
+    for name in getattr(model, 'soft_delete_drop', ()):
+        relation = model._meta.get_field(name)
+        relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': parents}).delete()
+
+
 class SafeDeleteQuerySet(models.QuerySet):
     """
         Custom QuerySet that provides soft delete functionality.
         This extends Django's default QuerySet with methods for soft delete, hard delete, etc.
+        Soft delete and restore follow the model's `soft_delete_cascade` with one UPDATE per relation.
         """
 
-    def delete(self, user=None):
+    def delete(self, user=None, deleted_at=None):
         """
                 Soft delete all objects in the queryset by setting the 'deleted' timestamp.
                 Instead of removing records, it updates them to mark as deleted.
+                Active children in `soft_delete_cascade` are marked first with the same timestamp,
+                so restore() can tell them apart from rows deleted on their own.
+                Dependents in `soft_delete_drop` are deleted outright.
                 """
-        # return self.update(deleted_at=timezone.now())
-        print('delete called safe delete')
+        deleted_at = deleted_at or timezone.now()
+        targets = self.filter(deleted_at__isnull=True)
+
+        for child, fk in cascade_relations(self.model):
+            child.all_objects.filter(**{f'{fk}__in': targets}).delete(user=user, deleted_at=deleted_at)
+        drop_dependents(self.model, targets)
+
         if user:
-            return self.update(deleted_at=timezone.now(), deleted_by=user)
-        return self.update(deleted_at=timezone.now())
+            updated = targets.update(deleted_at=deleted_at, deleted_by=user)
+        else:
+            updated = targets.update(deleted_at=deleted_at)
+        soft_delete_changed.send(sender=self.model, using=self.db)
+        return updated
 
     def hard_delete(self):
         """
@@ -51,5 +96,19 @@ class SafeDeleteQuerySet(models.QuerySet):
         """
                 Restore deleted objects by setting 'deleted' field to None.
                 Also clears 'deleted_by' if set.
+                Children in `soft_delete_cascade` are restored only if they were deleted together
+                with their parent; children deleted on their own stay in the recycle bin.
                 """
-        return self.update(deleted_at=None, deleted_by=None)
+        targets = self.filter(deleted_at__isnull=False)
+
+        for child, fk in cascade_relations(self.model):
+            deleted_with_parent = self.model.all_objects.filter(
+                pk=OuterRef(fk),
+                deleted_at__gte=OuterRef('deleted_at') - CASCADE_RESTORE_WINDOW,
+                deleted_at__lte=OuterRef('deleted_at') + CASCADE_RESTORE_WINDOW,
+            )
+            child.all_objects.filter(Exists(deleted_with_parent), **{f'{fk}__in': targets}).restore()
+
+        restored = targets.update(deleted_at=None, deleted_by=None)
+        soft_delete_changed.send(sender=self.model, using=self.db)
+        return restored
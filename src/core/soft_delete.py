@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models.signals import class_prepared
 from django.utils import timezone
 
+from src.core.indexes import active_indexes
 from src.core.managers import ActiveObjectsManager, DeletedObjectsManager, AllObjectsManager
+from src.core.querysets import cascade_relations, drop_dependents, CASCADE_RESTORE_WINDOW
 
 
 # from src.users.models import User
@@ -16,6 +19,10 @@ class SafeDeleteModel(models.Model):
         - all_objects: All objects (active + deleted)
         - deleted_objects: Only deleted objects
 
+        Subclasses list reverse relations in `soft_delete_cascade` to have delete() and restore()
+        carry their children along, and in `soft_delete_drop` to have delete() remove rows that
+        cannot be soft deleted themselves (see SafeDeleteQuerySet).
+
         All managers inherit from BaseSafeDeleteManager and have access to all methods.
         """
 
@@ -46,8 +53,6 @@ class SafeDeleteModel(models.Model):
                     using: Database alias (optional)
                     keep_parents: Whether to keep parent objects in cascades (optional)
                 """
-        # ( date delete)
-        # print("date", self.is_deleted)
         if self.is_deleted:
             raise ValueError("This object is already deleted")
 
@@ -55,6 +60,10 @@ class SafeDeleteModel(models.Model):
         if user:
             self.deleted_by = user
 
+        for child, fk in cascade_relations(type(self)):
+            child.all_objects.filter(**{fk: self}).delete(user=user, deleted_at=self.deleted_at)
+        drop_dependents(type(self), [self.pk])
+
         self.save(using=using, update_fields=['deleted_at', 'deleted_by'])
 
     def hard_delete(self, using=None, keep_parents=False):
@@ -70,8 +79,13 @@ class SafeDeleteModel(models.Model):
                 """
         if not self.is_deleted:
             raise ValueError("This object is not deleted")
-        # print("From here restore function to be done")
-        # print(self)
+
+        for child, fk in cascade_relations(type(self)):
+            child.all_objects.filter(
+                **{fk: self},
+                deleted_at__range=(self.deleted_at - CASCADE_RESTORE_WINDOW, self.deleted_at + CASCADE_RESTORE_WINDOW),
+            ).restore()
+
         self.deleted_at = None
         self.deleted_by = None
         self.save(update_fields=['deleted_at', 'deleted_by'])
@@ -81,9 +95,6 @@ class SafeDeleteModel(models.Model):
         """
                 Check if object is deleted.
                 """
-        # (date)
-        print('self.is_deleted', self.deleted_at)
-        print(self)
         return self.deleted_at is not None
 
     @property
@@ -96,3 +107,21 @@ class SafeDeleteModel(models.Model):
     def __str__(self):
         status = " (DELETED)" if self.is_deleted else ""
         return f"{super().__str__()}{status}"
+
+
+def add_active_indexes(sender, **kwargs):
+    """
+        class_prepared hook: give every concrete SafeDeleteModel partial indexes on its
+        active rows, so `makemigrations` generates them for each subclass automatically.
+        """
+    if not issubclass(sender, SafeDeleteModel):
+        return
+    meta = sender._meta
+    if meta.abstract or meta.proxy or not meta.managed:
+        return
+    meta.indexes = [*meta.indexes, *active_indexes(sender)]
+    # The migration autodetector only reads indexes a model's Meta declared
+    meta.original_attrs['indexes'] = meta.indexes
+
+
+class_prepared.connect(add_active_indexes)
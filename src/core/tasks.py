@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from src.core.mail import flush_outbox
+
+
+@shared_task
+def flush_email_outbox():
+    result = flush_outbox()
+    print(f"[MAIL] Outbox flushed: {result}")
+
+    return f"Sent {result['sent']}, retrying {result['retried']}, dead-lettered {result['dead']}."
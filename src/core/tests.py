@@ -1,3 +1,874 @@
-from django.test import TestCase
+import io
+import os
+import re
+import shutil
+import socket
+import tempfile
+import uuid
+from collections import Counter
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from decimal import Decimal
+from email import message_from_bytes
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from aiosmtpd.controller import Controller
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+
+from Project_B import middleware
+from Project_B.db_router import REPLICA_DB_ALIAS, use_replica
+from src.books.models import Author, Book, Genre, Publisher
+from src.cart.models import Cart, CartItem
+from src.core import cache as catalog_cache
+from src.core import mail as outbox
+from src.core.bulk import RowWriter, reserve_ids
+from src.core.mail import _discard_connection, flush_outbox
+from src.core.models import OutgoingEmail, RequestProfile
+from src.core.indexes import active_index
+from src.core.profiling import make_token
+from src.core.management.commands.bench_permission_middleware import _linear_policy
+from src.orders.models import Order
+from src.shipping.models import DeliveryInfo
+from src.stock.models import PriceHistory, Stock, StockBatch, StockHistory
+from src.users.models import User
+
+
+class ActiveIndexTests(TestCase):
+    """
+        EXPLAIN based checks that soft delete models get partial indexes on their active rows
+        and that the default (active only) manager actually uses them.
+        """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Mostly deleted rows, as on a long lived catalog table
+        now = timezone.now()
+        Author.all_objects.bulk_create([
+            Author(name=f"author {i}", nationality='np', deleted_at=None if i % 10 == 0 else now)
+            for i in range(500)
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            if connection.vendor == 'postgresql':
+                # Tiny test tables would otherwise always be sequentially scanned
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_every_declared_index_gets_an_active_copy(self):
+        for model in (Author, Stock):
+            names = {index.name for index in model._meta.indexes}
+            self.assertIn(active_index(model, ['created_at']).name, names)
+            for index in model._meta.indexes:
+                if index.condition is None:
+                    self.assertIn(active_index(model, index.fields).name, names)
+
+    def test_active_lookup_uses_partial_index(self):
+        plan = Author.objects.filter(name='author 10', nationality='np').explain()
+        self.assertIn(active_index(Author, ['name', 'nationality']).name, plan)
+
+    def test_all_objects_lookup_does_not_use_partial_index(self):
+        plan = Author.all_objects.filter(name='author 11', nationality='np').explain()
+        self.assertNotIn(active_index(Author, ['name', 'nationality']).name, plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Relies on the PostgreSQL planner')
+    def test_latest_active_rows_use_partial_created_at_index(self):
+        plan = Author.objects.order_by('-created_at')[:5].explain()
+        self.assertIn(active_index(Author, ['created_at']).name, plan)
+
+
+class RowWriterTests(TestCase):
+    """
+        Rows written with explicit ids by seed_bookstore and the catalog import.
+        """
+
+    def book_row(self, pk):
+        publisher = Publisher.objects.create(name=f'Writer Press {pk}', founded_year=2000)
+        return {'id': pk, 'uuid': uuid.uuid4(), 'title': 'Written', 'publisher_id': publisher.pk,
+                'publication_date': date(2020, 1, 1), 'cover_image_derivatives': {'hash': 'abc', 'widths': [160]}}
+
+    def test_copy_rows_are_prepared_like_save(self):
+        row = self.book_row(1)
+        fields = [field.attname for field in Book._meta.concrete_fields]
+        values = dict(zip(fields, next(RowWriter.copy_rows(Book, [row]))))
+
+        # JSON is encoded, and fields the row leaves out get their defaults
+        manifest = values['cover_image_derivatives']
+        self.assertNotIsInstance(manifest, dict)
+        self.assertEqual(manifest, Book._meta.get_field('cover_image_derivatives').get_db_prep_save(
+            row['cover_image_derivatives'], connection))
+        self.assertEqual((values['language'], values['deleted_at']), ('English', None))
+
+    @skipUnless(connection.vendor == 'postgresql', "COPY is PostgreSQL only")
+    def test_copy_writes_json_fields(self):
+        pk = reserve_ids(Book, 1)[0]
+        writer = RowWriter(10, use_copy=True)
+        writer.add(Book, self.book_row(pk))
+        writer.flush()
+        self.assertEqual(Book.all_objects.get(pk=pk).cover_image_derivatives, {'hash': 'abc', 'widths': [160]})
+
+    @skipUnless(connection.vendor == 'postgresql', "COPY is PostgreSQL only")
+    def test_copy_raises_django_database_errors(self):
+        # The catalog import rejects a chunk on DatabaseError; psycopg's own errors would escape it
+        first, second = reserve_ids(Book, 2)
+        row = self.book_row(first)
+        writer = RowWriter(10, use_copy=True)
+        writer.add(Book, row)
+        # Same title, publication date and publisher
+        writer.add(Book, {**row, 'id': second, 'uuid': uuid.uuid4()})
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            writer.flush()
+
+
+class CatalogCacheTests(TestCase):
+    """
+        The two-tier catalog cache: LRU bounds, generation bumps from catalog writes, and
+        stale-while-revalidate when another worker is already refreshing a key.
+        """
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.local_cache.clear()
+        self.calls = 0
+
+    def produce(self):
+        self.calls += 1
+        return self.calls
+
+    def test_local_lru_evicts_least_recently_used_and_expired(self):
+        lru = catalog_cache.LocalLRU(max_entries=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        lru.set('d', 4, ttl=0)
+        self.assertIsNone(lru.get('d'))
+
+    def test_catalog_write_bumps_generation_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publisher = Publisher.objects.create(name='Cache Press', founded_year=2000)
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 1)
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 1)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            publisher.name = 'Cache House'
+            publisher.save()
+            publisher.save()
+        # One bump each for the catalog and the publisher choices, however many saves
+        bumps = [callback for callback in callbacks if callback.__qualname__.startswith('bump_on_commit')]
+        self.assertEqual(len(bumps), 2)
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Publisher.objects.filter(pk=publisher.pk).delete()
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 3)
+
+    def test_stock_batch_write_bumps_generation_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publisher = Publisher.objects.create(name='Batch Press', founded_year=2000)
+            book = Book.objects.create(title='Batched', publisher=publisher, publication_date='2020-01-01')
+            stock = Stock.objects.create(book=book, current_price=Decimal('300.00'))
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 1)
+
+        # Restocking and reservations save batches without touching any other catalog row
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = StockBatch.objects.create(stock=stock, initial_quantity=5, remaining_quantity=5,
+                                              unit_cost=Decimal('100.00'), received_date='2024-01-01')
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            batch.remaining_quantity = 0
+            batch.save()
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 3)
+
+    def test_expired_value_is_served_stale_while_another_worker_refreshes(self):
+        catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce)
+        key = catalog_cache._key(catalog_cache.CATALOG, 'test')
+        cache.set(key, (1, 0))
+        catalog_cache.local_cache.clear()
+
+        cache.add(f"lock:{key}", 1)
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 1)
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(f"lock:{key}")
+        catalog_cache.local_cache.clear()
+        self.assertEqual(catalog_cache.get_or_set(catalog_cache.CATALOG, 'test', self.produce), 2)
+
+    def test_cached_query_evaluates_querysets_once(self):
+        Genre.objects.create(name='Cached genre')
+        genre_names = catalog_cache.cached_query()(lambda: Genre.objects.values_list('name', flat=True))
+        with self.assertNumQueries(1):
+            self.assertEqual(genre_names(), ['Cached genre'])
+            self.assertEqual(genre_names(), ['Cached genre'])
+
+
+# Routes that are not plain reads, or that no seeded dataset can drive; everything else in the
+# URLconf must have a QUERY_COUNT_CASES entry (see test_every_route_is_covered).
+QUERY_COUNT_EXCLUDED = {
+    'books/hello': "debug stub",
+    'client/dashboard': "its template does not exist",
+    'books/add-to-cart/': "POST only",
+    'books/cart/update/<str:item_uuid>/': "POST only",
+    'books/cart/remove/<uuid:item_uuid>/': "POST only",
+    'books/cart/clear/': "POST only",
+    'admin-panel/books/restore/<uuid:uuid>/': "POST only",
+    'admin-panel/book/permanent-delete/<uuid:uuid>/': "POST only",
+    'admin-panel/orders/<int:order_id>/update-status/': "POST only",
+    'admin-panel/stocks/<uuid:book_uuid>/update-price/': "POST only",
+    'admin-panel/db-pool/': "reads pool statistics, not the database",
+    'admin-panel/books/import/rejects/<str:name>': "streams a file from storage; see books.CatalogImportTests",
+    'books/autocomplete/<str:kind>': "starts a background index build; see books.AutocompleteTests",
+    'admin-panel/autocomplete/<str:kind>': "starts a background index build; see books.AutocompleteTests",
+    'users/logout/': "ends the session",
+    'activate/<uidb64>/<token>/': "needs a signed token",
+    'reset/<uidb64>/<token>/': "needs a signed token",
+    '^media/(?P<path>.*)$': "static file serving",
+}
+EXCLUDED_PREFIXES = ('admin/', '^__debug__/', '__reload__/')
+
+# route -> (client, path builder); builders get the QueryCountTests instance for its fixtures
+QUERY_COUNT_CASES = {
+    '': ('customer', lambda t: '/'),
+    'about/': ('anonymous', lambda t: '/about/'),
+    'signup/': ('anonymous', lambda t: '/signup/'),
+    'login/': ('anonymous', lambda t: '/login/'),
+    'reset_password/': ('anonymous', lambda t: '/reset_password/'),
+    'reset_password_sent/': ('anonymous', lambda t: '/reset_password_sent/'),
+    'reset_password_complete/': ('anonymous', lambda t: '/reset_password_complete/'),
+    'books/bookstore': ('customer', lambda t: '/books/bookstore?sort=price_asc'),
+    'books/store/detail/<uuid>': ('customer', lambda t: f'/books/store/detail/{t.book.uuid}'),
+    'books/shopping-cart': ('customer', lambda t: '/books/shopping-cart'),
+    'books/checkout': ('customer', lambda t: '/books/checkout'),
+    'books/checkout/payment': ('customer', lambda t: '/books/checkout/payment'),
+    'books/checkout/order/complete': ('customer', lambda t: '/books/checkout/order/complete'),
+    'books/search/': ('admin', lambda t: '/books/search/?q=e'),
+    'carts/count/': ('customer', lambda t: '/carts/count/'),
+    'delivery/': ('customer', lambda t: '/delivery/'),
+    'orders/client/myorders': ('customer', lambda t: '/orders/client/myorders'),
+    'admin-panel/': ('admin', lambda t: '/admin-panel/'),
+    'admin-panel/books/': ('admin', lambda t: '/admin-panel/books/'),
+    'admin-panel/books/<uuid>': ('admin', lambda t: f'/admin-panel/books/{t.book.uuid}'),
+    'admin-panel/books/create/': ('admin', lambda t: '/admin-panel/books/create/'),
+    'admin-panel/books/edit/<uuid>': ('admin', lambda t: f'/admin-panel/books/edit/{t.book.uuid}'),
+    'admin-panel/books/delete/<uuid>/': ('admin', lambda t: f'/admin-panel/books/delete/{t.book.uuid}/'),
+    'admin-panel/search/': ('admin', lambda t: '/admin-panel/search/?q=e'),
+    'admin-panel/books/search/': ('admin', lambda t: '/admin-panel/books/search/?q=e'),
+    'admin-panel/books/recycle-bin/': ('admin', lambda t: '/admin-panel/books/recycle-bin/'),
+    'admin-panel/books/import/': ('admin', lambda t: '/admin-panel/books/import/'),
+    'admin-panel/search/authors': ('admin', lambda t: '/admin-panel/search/authors?q=a'),
+    'admin-panel/authors/': ('admin', lambda t: '/admin-panel/authors/'),
+    'admin-panel/authors/create/': ('admin', lambda t: '/admin-panel/authors/create/'),
+    'admin-panel/authors/edit/<uuid>': ('admin', lambda t: f'/admin-panel/authors/edit/{t.author.uuid}'),
+    'admin-panel/authors/<uuid>': ('admin', lambda t: f'/admin-panel/authors/{t.author.uuid}'),
+    'admin-panel/search/publishers': ('admin', lambda t: '/admin-panel/search/publishers?q=e'),
+    'admin-panel/publishers/': ('admin', lambda t: '/admin-panel/publishers/'),
+    'admin-panel/publishers/create/': ('admin', lambda t: '/admin-panel/publishers/create/'),
+    'admin-panel/publishers/edit/<uuid>': ('admin', lambda t: f'/admin-panel/publishers/edit/{t.publisher.uuid}'),
+    'admin-panel/publishers/<uuid>': ('admin', lambda t: f'/admin-panel/publishers/{t.publisher.uuid}'),
+    'admin-panel/<str:field_name>/options': ('admin',
+                                             lambda t: f'/admin-panel/publisher/options?selected[]={t.publisher.pk}'),
+    'admin-panel/choices/<str:field_name>': ('admin', lambda t: '/admin-panel/choices/authors?q=a&page=1'),
+    'admin-panel/search/genres': ('admin', lambda t: '/admin-panel/search/genres?q=e'),
+    'admin-panel/genres/': ('admin', lambda t: '/admin-panel/genres/'),
+    'admin-panel/genres/create/': ('admin', lambda t: '/admin-panel/genres/create/'),
+    'admin-panel/genres/edit/<uuid>': ('admin', lambda t: f'/admin-panel/genres/edit/{t.genre.uuid}'),
+    'admin-panel/genres/<uuid>': ('admin', lambda t: f'/admin-panel/genres/{t.genre.uuid}'),
+    'admin-panel/stocks/': ('admin', lambda t: '/admin-panel/stocks/'),
+    'admin-panel/orders/': ('admin', lambda t: '/admin-panel/orders/'),
+    'admin-panel/orders/<uuid:order_uuid>/': ('admin', lambda t: f'/admin-panel/orders/{t.order.uuid}/'),
+    'admin-panel/dashboard/': ('admin', lambda t: '/admin-panel/dashboard/'),
+    'admin-panel/stocks/<uuid:book_uuid>/': ('admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/'),
+    'admin-panel/stocks/<uuid:book_uuid>/restock/': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/restock/'),
+    'admin-panel/stocks/<uuid:book_uuid>/restock/edit/<uuid:batch_uuid>': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/restock/edit/{t.batch.uuid}'),
+    'admin-panel/stocks/<uuid:book_uuid>/batches/': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/batches/'),
+    'admin-panel/stock/batch/<uuid:batch_uuid>/sold/': (
+        'admin', lambda t: f'/admin-panel/stock/batch/{t.batch.uuid}/sold/'),
+    'admin-panel/stocks/<uuid:book_uuid>/stock-history/': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/stock-history/'),
+    'admin-panel/stocks/<uuid:book_uuid>/price-history/': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/price-history/'),
+    'admin-panel/stocks/<uuid:book_uuid>/reservation/': (
+        'admin', lambda t: f'/admin-panel/stocks/{t.stock.book.uuid}/reservation/'),
+}
+
+SMALL_DATASET = {'seed': 1, 'publishers': 2, 'authors': 3, 'genres': 2, 'subgenres': 1, 'books': 4,
+                 'max_batches': 1, 'users': 3, 'orders': 6, 'cart_ratio': 0}
+# Few authors, publishers and genres, so every list, detail page and relation gets longer
+LARGE_DATASET = {'seed': 2, 'publishers': 2, 'authors': 3, 'genres': 2, 'subgenres': 1, 'books': 40,
+                 'max_batches': 6, 'users': 10, 'orders': 120, 'cart_ratio': 0}
+
+
+def _url_routes(patterns, prefix=''):
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            yield from _url_routes(pattern.url_patterns, route)
+        else:
+            yield route
+
+
+def _sql_shape(sql):
+    # Collapse literals, IN lists and savepoint names so "the same query for another row" is one shape
+    sql = re.sub(r'SAVEPOINT "[^"]*"', 'SAVEPOINT ?', sql)
+    sql = re.sub(r"'[^']*'|\b\d+\b", '?', sql)
+    return re.sub(r"IN \(\?(, \?)*\)", 'IN (?)', sql)
+
+
+@override_settings(DATABASE_ROUTERS=[], DEBUG_TOOLBAR_CONFIG={'SHOW_TOOLBAR_CALLBACK': lambda request: False})
+class QueryCountTests(TestCase):
+    """
+        Every read-only route, and every Django admin changelist, must run the same number of
+        queries on a small and on a much larger dataset; a difference means a query per row.
+        """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email='querycount-admin@example.com', password=None,
+                                                  first_name='Query', last_name='Admin')
+        cls.customer = User.objects.create_user(email='querycount-customer@example.com', password=None,
+                                                first_name='Query', last_name='Customer')
+        User.objects.filter(pk=cls.customer.pk).update(is_active=True)
+
+    def setUp(self):
+        self.clients = {'anonymous': self.client_class(), 'admin': self.client_class(),
+                        'customer': self.client_class()}
+        self.clients['admin'].force_login(self.admin)
+        self.clients['customer'].force_login(self.customer)
+
+    def grow(self, dataset, orders, cart_items):
+        """
+            Seed a dataset, then point the fixtures at the rows with the most related rows and
+            give the customer `orders` orders and `cart_items` cart lines.
+            """
+        with redirect_stdout(io.StringIO()):
+            call_command('seed_bookstore', until='2025-12-31', stdout=io.StringIO(), **dataset)
+
+        self.book = Book.objects.annotate(n=Count('authors') + Count('genres')).order_by('-n', 'id').first()
+        self.author = Author.objects.annotate(n=Count('books')).order_by('-n', 'id').first()
+        self.publisher = Publisher.objects.annotate(n=Count('books')).order_by('-n', 'id').first()
+        self.genre = Genre.objects.annotate(n=Count('books')).order_by('-n', 'id').first()
+        self.stock = Stock.objects.annotate(n=Count('stock_history')).order_by('-n', 'id').first()
+        self.batch = StockBatch.objects.annotate(n=Count('reservations')).order_by('-n', 'id').first()
+        self.order = Order.objects.annotate(n=Count('items')).order_by('-n', 'id').first()
+
+        Order.objects.filter(pk__in=Order.objects.order_by('id').values('pk')[:orders]).update(user=self.customer)
+        address = DeliveryInfo.objects.filter(user=self.customer).first() or DeliveryInfo.objects.create(
+            user=self.customer, full_name='Query Customer', street_address='1 Test Marg', city='Kathmandu',
+            zip_code='44600', country='NP', phone_number='9800000000', is_default=True)
+        cart, _ = Cart.objects.get_or_create(user=self.customer)
+        cart.items.all().delete()
+        for stock in Stock.objects.select_related('book').order_by('id')[:cart_items]:
+            CartItem.objects.create(cart=cart, book=stock.book, quantity=1, unit_price=stock.current_price)
+
+        session = self.clients['customer'].session
+        session['delivery_uuid'] = str(address.uuid)
+        session.save()
+
+    def request(self, client, path):
+        if path == '/books/checkout/order/complete':
+            # The view consumes the order id the checkout leaves in the session
+            session = self.clients['customer'].session
+            session['order_uuid'] = str(Order.objects.filter(user=self.customer).latest('id').uuid)
+            session.save()
+        return self.clients[client].get(path)
+
+    def capture(self, client, path):
+        with redirect_stdout(io.StringIO()):
+            # Warm up first, so cached sessions and users count the same on both datasets
+            self.request(client, path)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.request(client, path)
+        self.assertLess(response.status_code, 500, path)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def cases(self):
+        for route, (client, build) in QUERY_COUNT_CASES.items():
+            yield route, client, build(self)
+        for model, model_admin in admin.site._registry.items():
+            meta = model._meta
+            yield f"admin changelist {meta.label}", 'admin', reverse(f'admin:{meta.app_label}_{meta.model_name}_changelist')
+
+    def test_every_route_is_covered(self):
+        routes = set(_url_routes(get_resolver().url_patterns))
+        missing = {
+            route for route in routes
+            if route not in QUERY_COUNT_CASES and route not in QUERY_COUNT_EXCLUDED
+            and not route.startswith(EXCLUDED_PREFIXES)
+        }
+        self.assertFalse(missing, f"Routes without a query count case or an exclusion: {sorted(missing)}")
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self.grow(SMALL_DATASET, orders=1, cart_items=1)
+        small = {route: self.capture(client, path) for route, client, path in self.cases()}
+
+        self.grow(LARGE_DATASET, orders=20, cart_items=8)
+        large = {route: self.capture(client, path) for route, client, path in self.cases()}
+
+        for route, queries in large.items():
+            with self.subTest(route=route):
+                before = Counter(_sql_shape(sql) for sql in small[route])
+                after = Counter(_sql_shape(sql) for sql in queries)
+                grown = [
+                    f"  {count - before[shape]:+d} x {next(q for q in queries if _sql_shape(q) == shape)}"
+                    for shape, count in after.items() if count > before[shape]
+                ]
+                self.assertEqual(
+                    len(small[route]), len(queries),
+                    f"{route}: {len(small[route])} queries with the small dataset, {len(queries)} with the "
+                    f"large one. Repeated queries:\n" + "\n".join(grown)
+                )
+
+
+@override_settings(EMAIL_BACKEND='src.core.mail.QueuedEmailBackend',
+                   EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   EMAIL_RATE_LIMIT_PER_SECOND=10, EMAIL_MAX_ATTEMPTS=2, EMAIL_SEND_LEASE_SECONDS=300)
+class EmailOutboxTests(TestCase):
+    """
+        Queued mail is leased in batches, sent outside any transaction at the rate limit, and retried on failure.
+        """
+
+    def setUp(self):
+        _discard_connection()
+        self.addCleanup(_discard_connection)
+        EmailMessage('Welcome', 'Hello', 'shop@example.com', ['first@example.com']).send()
+        mail.get_connection().send_messages([
+            EmailMessage(f"Notice {i}", 'Hello', 'shop@example.com', [f"reader{i}@example.com"]) for i in range(4)
+        ])
+
+    def test_batches_are_sent_outside_a_transaction_at_the_rate_limit(self):
+        self.assertEqual((OutgoingEmail.objects.filter(status='queued').count(), len(mail.outbox)), (5, 0))
+        # TestCase wraps the test in transactions of its own; any deeper one is the flush's
+        test_depth = len(connection.savepoint_ids)
+        depths = []
+        send = LocmemBackend.send_messages
+
+        def send_messages(backend, messages):
+            depths.append(len(connection.savepoint_ids))
+            return send(backend, messages)
+
+        clock = [1000.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with mock.patch.object(LocmemBackend, 'send_messages', send_messages), \
+                mock.patch.object(outbox.time, 'monotonic', lambda: clock[0]), \
+                mock.patch.object(outbox.time, 'sleep', side_effect=sleep) as slept, \
+                mock.patch.object(outbox, '_claim_batch', wraps=outbox._claim_batch) as claim:
+            self.assertEqual(flush_outbox(batch_size=2), {'sent': 5, 'retried': 0, 'dead': 0})
+
+        self.assertEqual([call.args[0] for call in claim.call_args_list], [2, 2, 2])
+        self.assertEqual(sorted(message.subject for message in mail.outbox),
+                         ['Notice 0', 'Notice 1', 'Notice 2', 'Notice 3', 'Welcome'])
+        self.assertEqual(depths, [test_depth] * 5)
+        # Five sends at 10 a second: the four after the first each wait 0.1s
+        self.assertEqual([round(call.args[0], 6) for call in slept.call_args_list], [0.1] * 4)
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    @override_settings(EMAIL_RATE_LIMIT_PER_SECOND=0)
+    def test_failed_sends_are_retried_then_dead_lettered(self):
+        send = LocmemBackend.send_messages
+
+        def send_messages(backend, messages):
+            if messages[0].subject == 'Notice 1':
+                raise ConnectionError('SMTP went away')
+            return send(backend, messages)
+
+        with mock.patch.object(LocmemBackend, 'send_messages', send_messages):
+            self.assertEqual(flush_outbox(), {'sent': 4, 'retried': 1, 'dead': 0})
+            failed = OutgoingEmail.objects.get(subject='Notice 1')
+            self.assertEqual((failed.status, failed.attempts, failed.last_error), ('queued', 1, 'SMTP went away'))
+            self.assertGreater(failed.next_attempt_at, timezone.now())
+
+            self.assertEqual(flush_outbox(), {'sent': 0, 'retried': 0, 'dead': 0})  # backing off
+            OutgoingEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(flush_outbox(), {'sent': 0, 'retried': 0, 'dead': 1})
+        self.assertEqual(OutgoingEmail.objects.get(pk=failed.pk).status, 'dead')
+        self.assertEqual(len(mail.outbox), 4)
+
+    @override_settings(EMAIL_RATE_LIMIT_PER_SECOND=0)
+    def test_rows_of_a_flush_that_died_are_sent_once_the_lease_runs_out(self):
+        OutgoingEmail.objects.filter(subject__in=['Welcome', 'Notice 0']).update(
+            status='sending', attempts=1, next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(flush_outbox(), {'sent': 3, 'retried': 0, 'dead': 0})
+
+        OutgoingEmail.objects.filter(subject='Welcome').update(next_attempt_at=timezone.now())
+        self.assertEqual(flush_outbox(), {'sent': 1, 'retried': 0, 'dead': 0})
+        self.assertEqual(OutgoingEmail.objects.get(subject='Welcome').attempts, 2)
+
+        # Its lease ran out on the last attempt: the message is not tried again
+        OutgoingEmail.objects.filter(subject='Notice 0').update(attempts=2, next_attempt_at=timezone.now())
+        self.assertEqual(flush_outbox(), {'sent': 0, 'retried': 0, 'dead': 1})
+        self.assertEqual(OutgoingEmail.objects.get(subject='Notice 0').last_error, 'Delivery lease expired')
+        self.assertEqual(len(mail.outbox), 4)
+
+
+class _RecordingHandler:
+    """
+        aiosmtpd handler that keeps the subject and client address of every message it accepts.
+        """
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append((message_from_bytes(envelope.content)['Subject'], session.peer))
+        return '250 Message accepted for delivery'
+
+
+@override_settings(EMAIL_BACKEND='src.core.mail.QueuedEmailBackend',
+                   EMAIL_DELIVERY_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                   EMAIL_HOST='127.0.0.1', EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                   EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', EMAIL_TIMEOUT=5,
+                   EMAIL_RATE_LIMIT_PER_SECOND=0, EMAIL_MAX_ATTEMPTS=2)
+class SmtpOutboxTests(TestCase):
+    """
+        flush_outbox() against a real SMTP server: one pooled connection, and no duplicates when the server restarts.
+        """
+
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.handler = _RecordingHandler()
+        self.start_server(port)
+        self.addCleanup(lambda: self.controller.stop())
+
+        port_override = override_settings(EMAIL_PORT=port)
+        port_override.enable()
+        self.addCleanup(port_override.disable)
+
+        _discard_connection()
+        self.addCleanup(_discard_connection)
+        mail.get_connection().send_messages([
+            EmailMessage(f"Notice {i}", 'Hello', 'shop@example.com', [f"reader{i}@example.com"]) for i in range(5)
+        ])
+
+    def start_server(self, port):
+        # A stopped Controller has closed its event loop, so every (re)start takes a new one
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=port)
+        self.controller.start()
+
+    def subjects(self):
+        return Counter(subject for subject, peer in self.handler.received)
+
+    def test_every_message_arrives_once_over_one_connection(self):
+        with mock.patch.object(outbox, '_claim_batch', wraps=outbox._claim_batch) as claim:
+            self.assertEqual(flush_outbox(batch_size=2), {'sent': 5, 'retried': 0, 'dead': 0})
+
+        self.assertEqual([call.args[0] for call in claim.call_args_list], [2, 2, 2])
+        self.assertEqual(self.subjects(), Counter(f"Notice {i}" for i in range(5)))
+        self.assertEqual(len({peer for subject, peer in self.handler.received}), 1)
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+    def test_a_server_restart_mid_flush_retries_without_duplicates(self):
+        restarted = []
+
+        def wait(limiter):
+            # Restart the server once two messages are in, with the pooled connection still open
+            if len(self.handler.received) == 2 and not restarted:
+                restarted.append(True)
+                self.controller.stop()
+                self.start_server(self.controller.port)
+
+        with mock.patch.object(outbox.RateLimiter, 'wait', wait):
+            self.assertEqual(flush_outbox(batch_size=2), {'sent': 4, 'retried': 1, 'dead': 0})
+
+        failed = OutgoingEmail.objects.get(subject='Notice 2')
+        self.assertEqual((failed.status, failed.attempts), ('queued', 1))
+        self.assertEqual(self.subjects(), Counter(['Notice 0', 'Notice 1', 'Notice 3', 'Notice 4']))
+
+        OutgoingEmail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(flush_outbox(batch_size=2), {'sent': 1, 'retried': 0, 'dead': 0})
+        self.assertEqual(self.subjects(), Counter(f"Notice {i}" for i in range(5)))
+        # The connection that failed is dropped; everything after the restart shares a new one
+        peers = [peer for subject, peer in self.handler.received]
+        self.assertEqual(len(set(peers[:2])), 1)
+        self.assertEqual(len(set(peers[2:])), 1)
+        self.assertNotEqual(peers[0], peers[2])
+        self.assertFalse(OutgoingEmail.objects.exclude(status='sent').exists())
+
+
+class RouteClassifierTests(TestCase):
+    """
+        The compiled route classifier gives every path the policy the old prefix-by-prefix scans did.
+        """
+
+    CASES = [
+        ('/', middleware.PUBLIC),
+        ('/\n', middleware.AUTHENTICATED),
+        ('/about/', middleware.PUBLIC),
+        ('/about/team/', middleware.CUSTOMER),
+        ('/static/css/base.css', middleware.PUBLIC),
+        ('/media/book_covers/dune.jpg', middleware.PUBLIC),
+        ('/__reload__/events/', middleware.PUBLIC),
+        ('/admin/', middleware.PUBLIC),
+        ('/admin/login/', middleware.PUBLIC),
+        ('/reset/MQ/set-password/', middleware.PUBLIC),
+        ('/activate/MQ/token/', middleware.PUBLIC),
+        ('/login/', middleware.GUEST_ONLY),
+        ('/login/\n', middleware.AUTHENTICATED),
+        ('/login/extra/', middleware.AUTHENTICATED),
+        ('/signup/', middleware.GUEST_ONLY),
+        ('/reset_password/', middleware.GUEST_ONLY),
+        ('/reset_password_sent/', middleware.GUEST_ONLY),
+        ('/reset_password_complete/', middleware.GUEST_ONLY),
+        ('/admin-panel/', middleware.ADMIN),
+        ('/admin-panel/books/import/', middleware.ADMIN),
+        ('/books/', middleware.CUSTOMER),
+        ('/books/9b2f0c1e-1f7a-4c1d-9a55-3c1f0a6c2d11/', middleware.CUSTOMER),
+        ('/carts/', middleware.CUSTOMER),
+        ('/delivery/add/', middleware.CUSTOMER),
+        ('/orders/history/', middleware.CUSTOMER),
+        ('/users/profile/', middleware.AUTHENTICATED),
+        ('/logout/', middleware.AUTHENTICATED),
+        ('', middleware.AUTHENTICATED),
+    ]
+
+    def test_policies_match_the_linear_scans(self):
+        for path, policy in self.CASES:
+            with self.subTest(path=path):
+                self.assertEqual(middleware.ROUTE_CLASSIFIER.classify(path), policy)
+                self.assertEqual(_linear_policy(path), policy)
+
+
+class SoftDeleteCascadeTests(TestCase):
+    """
+        Binning a book carries its stock tree along, restore brings back only what went with it, cart lines are dropped.
+        """
+
+    def setUp(self):
+        publisher = Publisher.objects.create(name='Cascade Press', founded_year=2000)
+        self.book = Book.objects.create(title='Cascaded', publisher=publisher, publication_date='2020-01-01')
+        self.stock = Stock.objects.create(book=self.book, current_price=Decimal('300.00'))
+        self.batches = [
+            StockBatch.objects.create(stock=self.stock, initial_quantity=5, remaining_quantity=5,
+                                      unit_cost=Decimal('100.00'), received_date='2024-01-01')
+            for _ in range(2)
+        ]
+        self.history = StockHistory.objects.create(stock=self.stock, batch=self.batches[0], change_type='restock',
+                                                   quantity_change=5)
+        self.prices = PriceHistory.objects.create(stock=self.stock, old_price=Decimal('250.00'),
+                                                  new_price=Decimal('300.00'), old_discount_percentage=0,
+                                                  new_discount_percentage=0)
+        user = User.objects.create_user(email='cascade@example.com', password=None, first_name='Cascade',
+                                        last_name='Shopper')
+        self.cart_item = CartItem.objects.create(cart=Cart.objects.create(user=user), book=self.book,
+                                                 unit_price=Decimal('300.00'))
+
+    def deleted_at(self, model, pk):
+        return model.all_objects.values_list('deleted_at', flat=True).get(pk=pk)
+
+    def assert_tree_deleted_at(self, value):
+        self.assertEqual(
+            [self.deleted_at(Book, self.book.pk), self.deleted_at(Stock, self.stock.pk),
+             self.deleted_at(StockHistory, self.history.pk), self.deleted_at(PriceHistory, self.prices.pk)]
+            + [self.deleted_at(StockBatch, batch.pk) for batch in self.batches],
+            [value] * 6,
+        )
+
+    def test_queryset_delete_and_restore_follow_the_cascade(self):
+        with CaptureQueriesContext(connection) as queries:
+            Book.all_objects.filter(pk=self.book.pk).delete()
+        # One UPDATE per table however many rows: book, stock, batches, stock history, price history
+        stamped = [q for q in queries if q['sql'].startswith('UPDATE') and '"deleted_at"' in q['sql']]
+        self.assertEqual(len(stamped), 5)
+        stamp = self.deleted_at(Book, self.book.pk)
+        self.assertIsNotNone(stamp)
+        self.assert_tree_deleted_at(stamp)
+        self.assertFalse(CartItem.objects.filter(pk=self.cart_item.pk).exists())
+
+        Book.all_objects.filter(pk=self.book.pk).restore()
+        self.assert_tree_deleted_at(None)
+        self.assertFalse(CartItem.objects.filter(pk=self.cart_item.pk).exists())
+
+    def test_restore_leaves_children_deleted_on_their_own(self):
+        StockBatch.all_objects.filter(pk=self.batches[1].pk).update(deleted_at=timezone.now() - timedelta(days=1))
+        earlier = self.deleted_at(StockBatch, self.batches[1].pk)
+
+        self.book.delete()
+        self.assertFalse(CartItem.objects.filter(pk=self.cart_item.pk).exists())
+        self.assertEqual(self.deleted_at(StockBatch, self.batches[1].pk), earlier)
+        self.assertEqual(self.deleted_at(StockBatch, self.batches[0].pk), self.book.deleted_at)
+
+        Book.all_objects.get(pk=self.book.pk).restore()
+        self.assertIsNone(self.deleted_at(Book, self.book.pk))
+        self.assertIsNone(self.deleted_at(StockBatch, self.batches[0].pk))
+        self.assertIsNone(self.deleted_at(StockHistory, self.history.pk))
+        self.assertEqual(self.deleted_at(StockBatch, self.batches[1].pk), earlier)
+
+    def test_children_deleted_within_the_window_are_restored(self):
+        stamp = timezone.now()
+        Stock.all_objects.filter(pk=self.stock.pk).delete(deleted_at=stamp - timedelta(milliseconds=300))
+        Book.all_objects.filter(pk=self.book.pk).update(deleted_at=stamp)
+        Book.all_objects.filter(pk=self.book.pk).restore()
+        self.assert_tree_deleted_at(None)
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """
+        With a second SQLite database as the replica: @replica_reads scopes read from it, a write or a
+        recent POST pins reads to the primary, and the pin never outlives its scope.
+        """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test case guards the aliases it knows about, and connected directly: the
+        # guard only stops connections that are not open yet. The router never migrates the replica.
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings[REPLICA_DB_ALIAS] = {
+            **connections.settings[DEFAULT_DB_ALIAS], 'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        connections[REPLICA_DB_ALIAS].connect()
+        with connections[REPLICA_DB_ALIAS].schema_editor() as editor:
+            editor.create_model(OutgoingEmail)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        for module in ('Project_B.db_router', 'Project_B.middleware'):
+            patcher = mock.patch(f"{module}.replica_enabled", return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        if connections[REPLICA_DB_ALIAS].connection is None:  # closed after each test
+            connections[REPLICA_DB_ALIAS].connect()
+        OutgoingEmail.objects.create(subject='Primary')
+        OutgoingEmail.objects.using(REPLICA_DB_ALIAS).create(subject='Replica')
+        self.addCleanup(OutgoingEmail.objects.using(REPLICA_DB_ALIAS).all().delete)
+
+    def names(self):
+        return set(OutgoingEmail.objects.values_list('subject', flat=True))
+
+    def test_reads_in_replica_scopes_go_to_the_replica(self):
+        self.assertEqual(self.names(), {'Primary'})
+        with use_replica():
+            self.assertEqual(self.names(), {'Replica'})
+            with transaction.atomic():
+                self.assertEqual(self.names(), {'Primary'})
+
+    def test_a_write_pins_the_rest_of_its_scope_only(self):
+        with use_replica():
+            OutgoingEmail.objects.create(subject='Written')
+            self.assertEqual(self.names(), {'Primary', 'Written'})
+        with use_replica():
+            self.assertEqual(self.names(), {'Replica'})
+
+        # A write outside of any scope (a Celery task, a command) pins nothing later on
+        OutgoingEmail.objects.create(subject='Task')
+        with use_replica():
+            self.assertEqual(self.names(), {'Replica'})
+
+    def test_middleware_pins_clients_that_wrote_recently(self):
+        def view(request):
+            if request.method == 'POST':
+                OutgoingEmail.objects.create(subject='Posted')
+            with use_replica():
+                return HttpResponse(','.join(sorted(self.names())))
+
+        pin = middleware.ReplicaPinMiddleware(view)
+        factory = RequestFactory()
+        self.assertEqual(pin(factory.get('/')).content, b'Replica')
+
+        response = pin(factory.post('/'))
+        self.assertEqual(response.content, b'Posted,Primary')
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+        pinned = factory.get('/')
+        pinned.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(pin(pinned).content, b'Posted,Primary')
+        self.assertEqual(pin(factory.get('/')).content, b'Replica')
+
+
+class RequestProfilingTests(TestCase):
+    """
+        RequestProfilingMiddleware and the admin page handing out profiling tokens.
+        """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='profiling-staff@example.com', password=None,
+                                             first_name='Profiling', last_name='Staff')
+        User.objects.filter(pk=cls.staff.pk).update(is_active=True, is_staff=True)
+        cls.permission = Permission.objects.get(content_type__app_label='core', codename='add_requestprofile')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        overrides = override_settings(PROFILING_DIR=directory, PROFILING_SAMPLE_RATE=0, PROFILING_KEEP=200)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def grant(self):
+        self.staff.user_permissions.add(self.permission)
+        return User.objects.get(pk=self.staff.pk)
+
+    def token_response(self, user):
+        request = RequestFactory().get('/admin/core/requestprofile/token/')
+        request.user = user
+        return admin.site._registry[RequestProfile].token_view(request)
+
+    def profiled_get(self, token=None):
+        headers = {settings.PROFILING_HEADER: token} if token else {}
+        return self.client.get('/about/', headers=headers)
+
+    def test_token_view_requires_the_add_permission(self):
+        with self.assertRaises(PermissionDenied):
+            self.token_response(User.objects.get(pk=self.staff.pk))
+
+        response = self.token_response(self.grant())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"{settings.PROFILING_HEADER}: ", response.content.decode())
+
+    def test_token_header_profiles_the_request(self):
+        token = make_token(self.grant())
+        response = self.profiled_get(token)
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        profile = RequestProfile.objects.get()
+        self.assertEqual((profile.path, profile.trigger, profile.status_code), ('/about/', 'staff', 200))
+        self.assertTrue(os.path.exists(profile.file_path))
+
+    def test_token_stops_working_without_the_permission(self):
+        token = make_token(self.grant())
+        self.staff.user_permissions.remove(self.permission)
+
+        for header in (token, 'forged:token', None):
+            with self.subTest(header=header):
+                self.assertNotIn('Server-Timing', self.profiled_get(header))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_sampled_requests_are_kept_quietly_and_pruned(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0, PROFILING_KEEP=1):
+            for _ in range(2):
+                self.assertNotIn('Server-Timing', self.profiled_get())
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.trigger, 'sample')
+        self.assertEqual(os.listdir(settings.PROFILING_DIR), [profile.profile_file])
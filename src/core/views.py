@@ -1,3 +1,23 @@
+import os
+
+from django.db import connections
+from django.http import JsonResponse
 from django.shortcuts import render
 
+
 # Create your views here.
+def pool_stats():
+    """
+        psycopg_pool statistics for every pooled database alias in this process.
+        """
+    stats = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            stats[connection.alias] = pool.get_stats()
+    return stats
+
+
+def db_pool_stats(request):
+    # Pools are per process: this reports the worker that served the request
+    return JsonResponse({'pid': os.getpid(), 'pools': pool_stats()})
@@ -1,7 +1,23 @@
 from django.contrib import admin
 
-from src.orders.models import Order, OrderItem
+from src.orders.models import Order, OrderItem, DailyBookSales, DailyPublisherSales, DailyGenreSales, \
+    SalesRollupState
+
 
 # Register your models here.
-admin.site.register(Order)
-admin.site.register(OrderItem)
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    # Order.__str__ names the user
+    list_select_related = ('user',)
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(admin.ModelAdmin):
+    # OrderItem.__str__ names the book and the order
+    list_select_related = ('book', 'order')
+
+
+admin.site.register(DailyBookSales)
+admin.site.register(DailyPublisherSales)
+admin.site.register(DailyGenreSales)
+admin.site.register(SalesRollupState)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from src.orders.views import OrderView, Order_detail_view
+from src.orders.views import OrderView, Order_detail_view, SalesDashboardView
 from . import views
 
 urlpatterns = [
@@ -8,5 +8,6 @@ urlpatterns = [
     path('orders/<int:order_id>/update-status/', views.update_order_status, name='update_order_status'),
     path('orders/<uuid:order_uuid>/', Order_detail_view.as_view(), name='order_detail_view'),
     path('orders/', OrderView.as_view(), name='admin_order_list'),
+    path('dashboard/', SalesDashboardView.as_view(), name='admin_dashboard'),
     # path('order/detail/<uuid>', StockDetailView.as_view(), name='stock_detail_view'),
 ]
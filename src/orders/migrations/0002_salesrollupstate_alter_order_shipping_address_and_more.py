@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+        ('orders', '0001_initial'),
+        ('shipping', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_history_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='shipping_address',
+            field=models.ForeignKey(blank=True, help_text='Shipping address for the order', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='shipping.deliveryinfo'),
+        ),
+        migrations.CreateModel(
+            name='DailyBookSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('cogs', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='books.book')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'book'), name='unique_daily_book_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyGenreSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('cogs', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('genre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='books.genre')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'genre'), name='unique_daily_genre_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPublisherSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('cogs', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('margin', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('publisher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='books.publisher')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'publisher'), name='unique_daily_publisher_sales')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_author_books_autho_created_5688b7_act_and_more'),
+        ('orders', '0002_salesrollupstate_alter_order_shipping_address_and_more'),
+        ('shipping', '0002_deliveryinfo_shipping_de_created_6fa799_act'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='orders_orde_created_420136_act'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['order_date', 'status'], name='orders_orde_order_d_873fdb_act'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='orders_orde_created_2a6616_act'),
+        ),
+    ]
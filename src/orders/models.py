@@ -83,3 +83,72 @@ class OrderItem(AbstractBaseModel):
 
     class Meta:
         unique_together = ('order', 'book')  # Prevents duplicate books in same order
+
+
+class SalesRollup(models.Model):
+    """
+        Abstract daily sales rollup row.
+        Rows are maintained incrementally by src.orders.services.refresh_sales_rollups
+        from 'sold' StockHistory events, so reports never scan OrderItem/StockReservation.
+        """
+    day = models.DateField(db_index=True)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    units = models.PositiveIntegerField(default=0)
+    cogs = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    margin = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class DailyBookSales(SalesRollup):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.book_id} sales on {self.day}"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book'], name='unique_daily_book_sales')
+        ]
+
+
+class DailyPublisherSales(SalesRollup):
+    publisher = models.ForeignKey('books.Publisher', on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.publisher_id} sales on {self.day}"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'publisher'], name='unique_daily_publisher_sales')
+        ]
+
+
+class DailyGenreSales(SalesRollup):
+    # A book listed under several genres is counted in full under each of them.
+    genre = models.ForeignKey('books.Genre', on_delete=models.CASCADE, related_name='daily_sales')
+
+    def __str__(self):
+        return f"{self.genre_id} sales on {self.day}"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'genre'], name='unique_daily_genre_sales')
+        ]
+
+
+class SalesRollupState(models.Model):
+    """
+        High-water mark for the sales rollups: the last 'sold' StockHistory id folded in.
+        """
+    name = models.CharField(max_length=50, unique=True)
+    last_history_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_history_id}"
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import takewhile
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from src.books.models import Book
+from src.orders.models import OrderItem, DailyBookSales, DailyPublisherSales, DailyGenreSales, SalesRollupState
+from src.stock.models import StockHistory
+
+SALES_ROLLUP_STATE = 'sales'
+
+ZERO = Decimal('0.00')
+DECIMAL = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _empty_totals():
+    return {'revenue': ZERO, 'units': 0, 'cogs': ZERO}
+
+
+def _collect_sold_events(events):
+    """
+        Fold a chunk of 'sold' StockHistory rows into {(day, book_id): totals}.
+        Revenue comes from the matching OrderItem (one per order/book), COGS from the batch unit cost.
+        """
+    order_ids = {e['order_id'] for e in events if e['order_id']}
+    book_ids = {e['stock__book_id'] for e in events}
+
+    prices = {
+        (item['order_id'], item['book_id']): item['unit_price'] - (item['discount_amount'] or ZERO)
+        for item in OrderItem.all_objects.filter(order_id__in=order_ids, book_id__in=book_ids).values(
+            'order_id', 'book_id', 'unit_price', 'discount_amount')
+    }
+
+    per_book = defaultdict(_empty_totals)
+    for event in events:
+        units = abs(event['quantity_change'])
+        unit_price = prices.get((event['order_id'], event['stock__book_id']), ZERO)
+        unit_cost = event['batch__unit_cost'] or ZERO
+
+        totals = per_book[(timezone.localdate(event['created_at']), event['stock__book_id'])]
+        totals['units'] += units
+        totals['revenue'] += unit_price * units
+        totals['cogs'] += unit_cost * units
+
+    return per_book
+
+
+def _regroup(per_book, book_to_keys):
+    grouped = defaultdict(_empty_totals)
+    for (day, book_id), totals in per_book.items():
+        for key in book_to_keys.get(book_id, ()):
+            row = grouped[(day, key)]
+            row['units'] += totals['units']
+            row['revenue'] += totals['revenue']
+            row['cogs'] += totals['cogs']
+    return grouped
+
+
+def _upsert_rollup(model, key_field, grouped):
+    """
+        Add grouped totals onto existing rollup rows, creating missing ones.
+        Callers hold the rollup state lock, so read-modify-write is safe here.
+        """
+    if not grouped:
+        return
+
+    days = {day for day, _ in grouped}
+    keys = {key for _, key in grouped}
+    existing = {
+        (row.day, getattr(row, key_field)): row
+        for row in model.objects.filter(day__in=days, **{f'{key_field}__in': keys})
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for (day, key), totals in grouped.items():
+        row = existing.get((day, key))
+        if row is None:
+            row = model(day=day, revenue=ZERO, units=0, cogs=ZERO, **{key_field: key})
+            to_create.append(row)
+        else:
+            to_update.append(row)
+
+        row.units += totals['units']
+        row.revenue += totals['revenue']
+        row.cogs += totals['cogs']
+        row.margin = row.revenue - row.cogs
+        row.updated_at = now
+
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(to_update, ['units', 'revenue', 'cogs', 'margin', 'updated_at'])
+
+
+def _apply_sold_events(events):
+    per_book = _collect_sold_events(events)
+    book_ids = {book_id for _, book_id in per_book}
+
+    book_publishers = defaultdict(list)
+    for book_id, publisher_id in Book.all_objects.filter(id__in=book_ids).values_list('id', 'publisher_id'):
+        book_publishers[book_id].append(publisher_id)
+
+    book_genres = defaultdict(list)
+    for book_id, genre_id in Book.genres.through.objects.filter(book_id__in=book_ids).values_list('book_id',
+                                                                                                  'genre_id'):
+        book_genres[book_id].append(genre_id)
+
+    _upsert_rollup(DailyBookSales, 'book_id', per_book)
+    _upsert_rollup(DailyPublisherSales, 'publisher_id', _regroup(per_book, book_publishers))
+    _upsert_rollup(DailyGenreSales, 'genre_id', _regroup(per_book, book_genres))
+
+
+def refresh_sales_rollups(batch_size=None):
+    """
+        Fold every new 'sold' StockHistory event into the daily rollups.
+
+        Work is done in chunks ordered by id; each chunk and its high-water mark commit
+        together under a row lock on SalesRollupState, so overlapping runs never double count.
+        The mark only moves across a run of settled events: the first one younger than
+        SALES_ROLLUP_SETTLE_SECONDS stops the run, so it and any slower transaction holding
+        a lower id are read again next time instead of being passed over.
+        Returns the number of events processed.
+        """
+    batch_size = batch_size or settings.SALES_ROLLUP_BATCH_SIZE
+    settled_before = timezone.now() - timedelta(seconds=settings.SALES_ROLLUP_SETTLE_SECONDS)
+    processed = 0
+
+    while True:
+        with transaction.atomic():
+            state, _ = SalesRollupState.objects.select_for_update().get_or_create(name=SALES_ROLLUP_STATE)
+
+            candidates = list(
+                StockHistory.all_objects.filter(
+                    change_type='sold',
+                    id__gt=state.last_history_id,
+                ).order_by('id').values(
+                    'id', 'quantity_change', 'created_at', 'order_id', 'stock__book_id', 'batch__unit_cost'
+                )[:batch_size]
+            )
+            events = list(takewhile(lambda event: event['created_at'] <= settled_before, candidates))
+
+            if not events:
+                break
+
+            _apply_sold_events(events)
+
+            state.last_history_id = events[-1]['id']
+            state.save(update_fields=['last_history_id', 'updated_at'])
+
+        processed += len(events)
+        if len(events) < batch_size:
+            break
+
+    return processed
+
+
+def _rollup_totals(queryset):
+    return queryset.aggregate(
+        revenue=Coalesce(Sum('revenue'), Value(ZERO, output_field=DECIMAL)),
+        units=Coalesce(Sum('units'), Value(0)),
+        cogs=Coalesce(Sum('cogs'), Value(ZERO, output_field=DECIMAL)),
+        margin=Coalesce(Sum('margin'), Value(ZERO, output_field=DECIMAL)),
+    )
+
+
+def _top_rows(queryset, label_field, limit):
+    return queryset.values(label_field).annotate(
+        revenue_total=Sum('revenue'),
+        units_total=Sum('units'),
+        margin_total=Sum('margin'),
+    ).order_by('-revenue_total')[:limit]
+
+
+def sales_summary(start, end, limit=10):
+    """
+        Sales report for [start, end] built only from the daily rollup tables.
+        """
+    book_rows = DailyBookSales.objects.filter(day__range=(start, end))
+
+    daily = book_rows.values('day').annotate(
+        revenue_total=Sum('revenue'),
+        units_total=Sum('units'),
+        cogs_total=Sum('cogs'),
+        margin_total=Sum('margin'),
+    ).order_by('day')
+
+    state = SalesRollupState.objects.filter(name=SALES_ROLLUP_STATE).first()
+
+    return {
+        'totals': _rollup_totals(book_rows),
+        'daily': daily,
+        'top_books': _top_rows(book_rows, 'book__title', limit),
+        'top_publishers': _top_rows(DailyPublisherSales.objects.filter(day__range=(start, end)),
+                                    'publisher__name', limit),
+        'top_genres': _top_rows(DailyGenreSales.objects.filter(day__range=(start, end)), 'genre__name', limit),
+        'refreshed_at': state.updated_at if state else None,
+    }
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from src.orders import services
+
+
+@shared_task
+def refresh_sales_rollups():
+    # Incremental: only 'sold' StockHistory rows past the stored high-water mark are read.
+    processed = services.refresh_sales_rollups()
+    print(f"[SALES ROLLUP] Sold events folded in: {processed}")
+
+    return f"Folded {processed} sold events into sales rollups."
@@ -1,3 +1,68 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from src.books.models import Book, Genre, Publisher
+from src.orders.models import DailyBookSales, DailyGenreSales, DailyPublisherSales, Order, OrderItem, SalesRollupState
+from src.orders.services import SALES_ROLLUP_STATE, refresh_sales_rollups
+from src.stock.models import Stock, StockBatch, StockHistory
+from src.users.models import User
+
+
+@override_settings(SALES_ROLLUP_SETTLE_SECONDS=60)
+class SalesRollupTests(TestCase):
+    """
+        'sold' stock history folds into the daily rollups once, and only past the settle window.
+        """
+
+    def setUp(self):
+        user = User.objects.create_user(email='rollup@example.com', password=None, first_name='Roll',
+                                        last_name='Up')
+        self.publisher = Publisher.objects.create(name='Rollup Press', founded_year=2000)
+        self.genre = Genre.objects.create(name='Rollup Genre')
+        self.book = Book.objects.create(title='Rolled', publisher=self.publisher, publication_date='2020-01-01')
+        self.book.genres.add(self.genre)
+        self.stock = Stock.objects.create(book=self.book, current_price=Decimal('500.00'))
+        self.batch = StockBatch.objects.create(stock=self.stock, initial_quantity=50, remaining_quantity=50,
+                                               unit_cost=Decimal('200.00'), received_date='2024-01-01')
+        self.order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=self.order, book=self.book, quantity=1, unit_price=Decimal('500.00'),
+                                 discount_amount=Decimal('50.00'))
+
+    def sold(self, units, age):
+        history = StockHistory.objects.create(stock=self.stock, batch=self.batch, change_type='sold',
+                                              quantity_change=-units, order=self.order)
+        StockHistory.all_objects.filter(pk=history.pk).update(created_at=timezone.now() - age)
+        return history
+
+    def book_totals(self):
+        row = DailyBookSales.objects.get(book=self.book)
+        return row.units, row.revenue, row.cogs, row.margin
+
+    def test_settled_events_are_rolled_up_once_in_chunks(self):
+        for units in (1, 2, 3):
+            self.sold(units, timedelta(minutes=10))
+        self.assertEqual(refresh_sales_rollups(batch_size=2), 3)
+        self.assertEqual(self.book_totals(),
+                         (6, Decimal('2700.00'), Decimal('1200.00'), Decimal('1500.00')))
+        self.assertEqual(DailyPublisherSales.objects.get(publisher=self.publisher).units, 6)
+        self.assertEqual(DailyGenreSales.objects.get(genre=self.genre).revenue, Decimal('2700.00'))
+
+        self.assertEqual(refresh_sales_rollups(batch_size=2), 0)
+        self.assertEqual(self.book_totals()[0], 6)
+
+    def test_unsettled_event_holds_back_the_mark(self):
+        settled = self.sold(1, timedelta(minutes=10))
+        late = self.sold(2, timedelta(seconds=5))
+        after = self.sold(4, timedelta(minutes=10))  # a higher id that settled first
+
+        self.assertEqual(refresh_sales_rollups(), 1)
+        self.assertEqual(SalesRollupState.objects.get(name=SALES_ROLLUP_STATE).last_history_id, settled.pk)
+        self.assertEqual(self.book_totals()[0], 1)
+
+        StockHistory.all_objects.filter(pk=late.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(refresh_sales_rollups(), 2)
+        self.assertEqual(SalesRollupState.objects.get(name=SALES_ROLLUP_STATE).last_history_id, after.pk)
+        self.assertEqual(self.book_totals()[0], 7)
@@ -2,17 +2,23 @@ import json
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render, redirect
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import View
 
+from Project_B.db_router import replica_reads
 from Project_B.utils import applying_sorting, ALLOWED_SORTS
 from src.books.pagination import paginate_queryset
 from src.orders.models import Order
+from src.orders.services import sales_summary
 from src.orders.utils import search_order
 from src.stock.services import StockService
+from src.stock.utils import validate_date_range
 
 
 @login_required
@@ -93,6 +99,7 @@ class MyOrders(View):
         })
 
 
+@method_decorator(replica_reads, name='get')
 class OrderView(View):
     def get(self, request):
         if not (request.user.is_superuser or request.user.is_staff):
@@ -150,3 +157,33 @@ class Order_detail_view(View):
             "order": order,
             "items": order.items.all()
         })
+
+
+@method_decorator(replica_reads, name='get')
+class SalesDashboardView(View):
+    def get(self, request):
+        if not (request.user.is_superuser or request.user.is_staff):
+            messages.error(request, "You are not authorized to view this page.")
+            return redirect('home')
+
+        today = timezone.localdate()
+        errors = {}
+        try:
+            start, end = validate_date_range(request.GET.get('sales_from'), request.GET.get('sales_to'))
+        except ValidationError as e:
+            errors = e.message_dict
+            start, end = None, None
+
+        if not (start and end):
+            # Month to date by default
+            start, end = today.replace(day=1), today
+
+        summary = sales_summary(start, end)
+
+        return render(request, 'orders/admin/admin_sales_dashboard.html', {
+            **summary,
+            'errors': errors,
+            'from_value': start.isoformat(),
+            'to_value': end.isoformat(),
+            'max_date': today.isoformat(),
+        })
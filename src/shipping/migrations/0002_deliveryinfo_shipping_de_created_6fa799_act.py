@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipping', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryinfo',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='shipping_de_created_6fa799_act'),
+        ),
+    ]
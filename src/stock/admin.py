@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from src.core.admin import SafeDeleteAdmin, DeletedListFilter
 from .models import Stock, StockBatch, StockHistory, PriceHistory, StockReservation
 
 
@@ -34,14 +35,19 @@ class StockReservationInline(admin.TabularInline):
 
 
 @admin.register(Stock)
-class StockAdmin(admin.ModelAdmin):
+class StockAdmin(SafeDeleteAdmin):
     list_display = ('book', 'current_price', 'current_discount_percentage', 'total_remaining_quantity', 'is_available',
                     'last_restock_date')
-    list_filter = ('is_available',)
+    list_filter = (DeletedListFilter, 'is_available')
     search_fields = ('book__title',)
     readonly_fields = ('total_remaining_quantity', 'is_available', 'last_restock_date')
     fields = ('book', 'current_price', 'current_discount_percentage')
     inlines = [StockBatchInline, StockHistoryInline, PriceHistoryInline, StockReservationInline]
+    list_select_related = ('book',)
+
+    def get_queryset(self, request):
+        # str(book) lists the authors; total_remaining_quantity sums prefetched batches
+        return super().get_queryset(request).prefetch_related('book__authors', 'batches')
 
 
 @admin.register(StockHistory)
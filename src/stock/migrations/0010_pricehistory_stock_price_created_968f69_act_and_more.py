@@ -0,0 +1,69 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_author_books_autho_created_5688b7_act_and_more'),
+        ('orders', '0003_order_orders_orde_created_420136_act_and_more'),
+        ('stock', '0009_alter_stockhistory_change_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='stock_price_created_968f69_act'),
+        ),
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['stock', '-created_at'], name='stock_price_stock_i_916b77_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='stock_stock_created_f99dd2_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['current_price'], name='stock_stock_current_a6cf7d_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='stock_stock_created_f95cfc_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['stock', 'received_date'], name='stock_stock_stock_i_96e648_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbatch',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['remaining_quantity'], name='stock_stock_remaini_dd1406_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhistory',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='stock_stock_created_be1b15_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhistory',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['stock', '-created_at'], name='stock_stock_stock_i_8f4ff8_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhistory',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['change_type'], name='stock_stock_change__88bc10_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='stock_stock_created_e4a8ec_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['order_item', 'is_active'], name='stock_stock_order_i_760373_act'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['batch'], name='stock_stock_batch_i_a3cd95_act'),
+        ),
+    ]
@@ -7,6 +7,7 @@ from django.db.models import Sum
 from django.utils import timezone
 
 from src.books.models import Book, Publisher
+from src.core.cache import PRICES, bump_on_commit
 from src.core.models import AbstractBaseModel
 from src.core.validators.dates import validate_date, validate_past_dates
 from src.core.validators.numbers import validate_minimum_stock, validate_positive_integer
@@ -24,6 +25,9 @@ class Stock(AbstractBaseModel):
     is_available = models.BooleanField(default=False)
     last_restock_date = models.DateField(blank=True, null=True)
 
+    # Reservations are left alone: they belong to orders, not to the catalog entry
+    soft_delete_cascade = ('batches', 'stock_history', 'price_history')
+
     def __str__(self):
         return f"Stock for {self.book.title}"
 
@@ -42,6 +46,10 @@ class Stock(AbstractBaseModel):
         if hasattr(self, '_cached_total_quantity'):
             return self._cached_total_quantity
 
+        # Listings prefetch 'batches' (or 'stock__batches') instead of running one SUM per row
+        if 'batches' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(batch.remaining_quantity for batch in self.batches.all())
+
         if self.pk:
             return self.batches.aggregate(total=Sum('remaining_quantity'))['total'] or 0
         return 0
@@ -57,15 +65,31 @@ class Stock(AbstractBaseModel):
                 1 - self.current_discount_percentage / 100
         ).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored price, for save() to tell whether it changed (None if deferred)
+        instance._loaded_price = instance.__dict__.get('current_price')
+        return instance
+
     def save(self, *args, **kwargs):
+        # Batches may have changed since they were prefetched; availability must see the database
+        getattr(self, '_prefetched_objects_cache', {}).pop('batches', None)
         quantity_ok = self.total_remaining_quantity > 1
         price_ok = self.current_price > 1
 
         new_is_available = quantity_ok and price_ok
 
+        # Availability transitions and price changes of available stock change the storefront's
+        # price statistics (src.stock.pricing), whichever path saves them (the Django admin too)
+        availability_changed = self._state.adding or new_is_available != self.is_available
+        price_changed = getattr(self, '_loaded_price', None) != self.current_price
         self.is_available = new_is_available
 
         super().save(*args, **kwargs)
+        if availability_changed or (new_is_available and price_changed):
+            bump_on_commit(PRICES, kwargs.get('using'))
+        self._loaded_price = self.current_price
 
 
 class StockBatch(AbstractBaseModel):
@@ -0,0 +1,47 @@
+from math import ceil
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Min
+from django.db.models.functions import Floor
+
+from src.core.cache import PRICES, get_or_set
+from src.stock.models import Stock
+
+
+def compute_price_stats(buckets=None):
+    """
+        Min and max price of available stock and a histogram of it: `buckets` equal ranges
+        from 0 up to the slider's ceiling (the max rounded up to a hundred). Two queries.
+        """
+    buckets = buckets or settings.PRICE_HISTOGRAM_BUCKETS
+    available = Stock.objects.filter(is_available=True)
+    bounds = available.aggregate(min_price=Min('current_price'), max_price=Max('current_price'),
+                                 count=Count('id'))
+
+    ceiling = ceil((bounds['max_price'] or 10000) / 100) * 100
+    width = max(1, ceil(ceiling / buckets))
+    counts = [0] * buckets
+    rows = available.annotate(bucket=Floor(F('current_price') / width)).values('bucket').annotate(n=Count('id'))
+    for row in rows:
+        counts[min(int(row['bucket']), buckets - 1)] += row['n']
+
+    return {
+        'min_price': bounds['min_price'],
+        'max_price': bounds['max_price'],
+        'count': bounds['count'],
+        'ceiling': ceiling,
+        'bucket_width': width,
+        'peak': max(counts),
+        'histogram': [
+            {'low': i * width, 'high': (i + 1) * width, 'count': n}
+            for i, n in enumerate(counts)
+        ],
+    }
+
+
+def price_stats():
+    """
+        compute_price_stats() from the cache. Kept until a price or availability changes
+        (the 'prices' namespace is bumped), not on every stock write.
+        """
+    return get_or_set(PRICES, 'stats', compute_price_stats, settings.PRICE_STATS_TIMEOUT)
@@ -1,3 +1,85 @@
-from django.test import TestCase
+import io
+from contextlib import redirect_stdout
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from src.books.models import Book, Publisher
+from src.core.cache import PRICES, generation as catalog_generation, local_cache
+from src.stock.models import Stock
+from src.stock.pricing import price_stats
+from src.stock.services import StockService
+from src.users.models import User
+
+
+@override_settings(PRICE_HISTOGRAM_BUCKETS=10)
+class PriceStatsTests(TestCase):
+    """
+        The cached slider statistics follow price changes and availability transitions.
+        """
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.admin = User.objects.create_superuser(email='prices-admin@example.com', password=None,
+                                                   first_name='Price', last_name='Admin')
+        publisher = Publisher.objects.create(name='Price Press', founded_year=2000)
+        self.stocks = []
+        with self.captureOnCommitCallbacks(execute=True), redirect_stdout(io.StringIO()):
+            for i, price in enumerate(['150.00', '950.00', '4200.00']):
+                book = Book.objects.create(title=f"Priced {i}", isbn=f"98{i:011d}", publisher=publisher,
+                                           publication_date='2020-01-01')
+                stock = Stock.objects.create(book=book, current_price=Decimal(price))
+                StockService.restock(stock=stock, initial_quantity=5, unit_cost=Decimal('100.00'), user=self.admin,
+                                      received_date=date(2024, 1, 1))
+                self.stocks.append(stock)
+
+    def test_histogram_counts_available_stock(self):
+        stats = price_stats()
+        self.assertEqual((stats['min_price'], stats['max_price'], stats['count']),
+                         (Decimal('150.00'), Decimal('4200.00'), 3))
+        self.assertEqual((stats['ceiling'], stats['bucket_width']), (4200, 420))
+        self.assertEqual([bucket['count'] for bucket in stats['histogram']], [1, 0, 1, 0, 0, 0, 0, 0, 0, 1])
+
+    def test_price_update_refreshes_statistics(self):
+        self.assertEqual(price_stats()['max_price'], Decimal('4200.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            StockService.update_price(self.stocks[0], '9000.00', '0', self.admin)
+        stats = price_stats()
+        self.assertEqual((stats['min_price'], stats['max_price'], stats['ceiling']),
+                         (Decimal('950.00'), Decimal('9000.00'), 9000))
+
+    def test_availability_transition_refreshes_statistics(self):
+        self.assertEqual(price_stats()['count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stocks[2].batches.update(remaining_quantity=0)
+            self.stocks[2].save()
+        stats = price_stats()
+        self.assertEqual((stats['count'], stats['max_price']), (2, Decimal('950.00')))
+
+    def test_admin_price_change_refreshes_statistics(self):
+        self.assertEqual(price_stats()['max_price'], Decimal('4200.00'))
+        self.client.force_login(self.admin)
+        stock = self.stocks[2]
+        url = reverse('admin:stock_stock_change', args=[stock.pk])
+        # The inlines are posted back as they were rendered
+        data = {'book': stock.book_id, 'current_price': '5100.00', 'current_discount_percentage': '0'}
+        for inline in self.client.get(url).context['inline_admin_formsets']:
+            formset = inline.formset
+            data.update({f'{formset.prefix}-TOTAL_FORMS': len(formset.initial_forms),
+                         f'{formset.prefix}-INITIAL_FORMS': len(formset.initial_forms)})
+            for form in formset.initial_forms:
+                data.update({form.add_prefix(name): form[name].value() or '' for name in form.fields})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(price_stats()['max_price'], Decimal('5100.00'))
+
+        # Saving without a price change keeps the cached statistics
+        generation = catalog_generation(PRICES)
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.get(pk=stock.pk).save()
+        self.assertEqual(catalog_generation(PRICES), generation)
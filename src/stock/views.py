@@ -14,8 +14,11 @@ from django.shortcuts import get_object_or_404, render
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import View
 
+from Project_B.db_router import replica_reads
+
 from .forms import RestockForm, PriceUpdateForm
 from .models import Book, StockHistory, PriceHistory
 from .models import StockBatch
@@ -81,6 +84,7 @@ def stock_detail(request, book_uuid):
     return render(request, 'books/admin/Stock/admin_stock_detail_view.html', context)
 
 
+@method_decorator(replica_reads, name='get')
 class StockBatchListView(View):
     def get(self, request, book_uuid):
         book = get_object_or_404(
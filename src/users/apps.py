@@ -1,5 +1,6 @@
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete, m2m_changed
 
 
 def create_initial_roles(sender, **kwargs):
@@ -35,3 +36,16 @@ class UsersConfig(AppConfig):
 
     def ready(self):
         post_migrate.connect(create_initial_roles, sender=self)
+
+        # Keep CachedModelBackend's cached users and permission sets fresh
+        from django.contrib.auth.models import Group
+        from src.users import backends
+
+        User = self.get_model('User')
+        post_save.connect(backends.user_changed, sender=User)
+        post_delete.connect(backends.user_changed, sender=User)
+        user_logged_out.connect(backends.user_signed_out)
+        m2m_changed.connect(backends.user_relations_changed, sender=User.groups.through)
+        m2m_changed.connect(backends.user_relations_changed, sender=User.user_permissions.through)
+        m2m_changed.connect(backends.group_permissions_changed, sender=Group.permissions.through)
+        pre_delete.connect(backends.group_deleted, sender=Group)
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def _perms_key(user_id):
+    return f"auth:perms:{user_id}"
+
+
+def invalidate_user_cache(user_ids):
+    """
+        Drop the cached User rows and permission sets for the given ids.
+        """
+    keys = []
+    for user_id in user_ids:
+        keys += [_user_key(user_id), _perms_key(user_id)]
+    if keys:
+        cache.delete_many(keys)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+        ModelBackend that keeps the session's User row and its permission set in the cache.
+
+        An authenticated request normally costs a user SELECT plus, on the first has_perm(),
+        two permission queries. Both are served from the cache for AUTH_USER_CACHE_TIMEOUT
+        seconds and dropped by the signal handlers below whenever the user, their groups
+        or their permissions change, and on logout.
+        Within one request the permission set is also kept on the user instance (_perm_cache),
+        exactly like ModelBackend does.
+        """
+
+    def get_user(self, user_id):
+        user = cache.get(_user_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(_user_key(user_id), user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            perms = cache.get(_perms_key(user_obj.pk))
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(_perms_key(user_obj.pk), perms, settings.AUTH_USER_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
+
+
+def user_changed(sender, instance, **kwargs):
+    # post_save / post_delete on User
+    invalidate_user_cache([instance.pk])
+
+
+def user_signed_out(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user_cache([user.pk])
+
+
+def user_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # m2m_changed on User.groups and User.user_permissions, from either side
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_cache([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_cache(pk_set)
+    elif action == 'pre_clear':
+        # pk_set is None for clear(); collect the members while they are still linked
+        invalidate_user_cache(instance.user_set.values_list('pk', flat=True))
+
+
+def group_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # m2m_changed on Group.permissions: every member of the touched groups has a stale set
+    User = get_user_model()
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_user_cache(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_user_cache(User.objects.filter(groups__in=pk_set).values_list('pk', flat=True))
+    elif action == 'pre_clear':
+        invalidate_user_cache(User.objects.filter(groups__permissions=instance).values_list('pk', flat=True))
+
+
+def group_deleted(sender, instance, **kwargs):
+    # pre_delete on Group: membership rows are removed without an m2m_changed signal
+    invalidate_user_cache(instance.user_set.values_list('pk', flat=True))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_user_deleted_by_alter_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'date_joined'], name='users_user_is_acti_b9727e_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_user_users_user_is_acti_b9727e_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['created_at'], name='users_user_created_d7eb09_act'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['is_active', 'date_joined'], name='users_user_is_acti_81f8f0_act'),
+        ),
+    ]
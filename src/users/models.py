@@ -63,3 +63,9 @@ class User(AbstractBaseModel,AbstractBaseUser,PermissionsMixin):
 
    def __str__(self):
        return self.email
+
+   class Meta:
+       indexes = [
+           # cleanup_expired_users scans unactivated accounts by join date
+           models.Index(fields=['is_active', 'date_joined']),
+       ]
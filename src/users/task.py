@@ -5,7 +5,8 @@ from datetime import timedelta
 from celery import shared_task
 from django.conf import settings
 from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
-from django.core.mail import send_mail
+from django.core.mail import send_mail, get_connection, EmailMessage
+from django.db import transaction
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes
@@ -15,9 +16,11 @@ from .models import User
 from .utils import AccountActivationTokenGenerator  # Import custom generator
 
 
-@shared_task
-def send_activation_email(user_email):
-    user = User.objects.get(email=user_email)
+def queue_activation_email(user):
+    """
+        Build the activation email for an already-loaded user and hand it to EMAIL_BACKEND.
+        With the queued backend this is a single INSERT in the caller's transaction.
+        """
     token_generator = AccountActivationTokenGenerator()  # Custom generator for 24-hour timeout
     uid = urlsafe_base64_encode(force_bytes(user.pk))  # Base64 encode user ID
     token = token_generator.make_token(user)  # Generate secure token
@@ -29,30 +32,71 @@ def send_activation_email(user_email):
 
 
 @shared_task
-def cleanup_expired_users():
-    # expiration_time = timezone.now() - timedelta(hours=24)  # 24 hours ago
+def send_activation_email(user_email):
+    # Kept for tasks already sitting in the broker; signups now call queue_activation_email directly.
+    user = User.objects.get(email=user_email)
+    queue_activation_email(user)
+
+
+def _expiry_message(user, connection):
+    subject = 'Activation Link Expired'
+    message = (
+        f"Hi {user.first_name},\n\n"
+        "Your activation link has expired. Please signup again to create a new account.\n\n"
+        "Ignore this message if you already activated your account."
+    )
+    return EmailMessage(subject, message, settings.EMAIL_HOST_USER, [user.email], connection=connection)
+
+
+@shared_task
+def cleanup_expired_users(batch_size=None):
+    """
+        Notify and delete unactivated users whose activation window has passed.
+
+        Runs as a chunked pipeline ordered by pk:
+        - each chunk is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so an overlapping beat run
+          skips rows another run is working on instead of mailing them twice;
+        - the chunk's notifications go out over one mail connection reused for the whole run;
+        - the chunk is deleted (with its cascades) in the same short transaction, which is the
+          progress record: a committed chunk is gone, a failed one is retried on the next run.
+        """
+    batch_size = batch_size or settings.USER_CLEANUP_BATCH_SIZE
     expiration_time = timezone.now() - timedelta(hours=settings.USER_EXPIRATION_HOURS)  # 24 hours ago
     # expiration_time = timezone.now() - timedelta(seconds=settings.USER_EXPIRATION_SECONDS)
     expired_users = User.objects.filter(
         is_active=False,  # Unactivated
+        date_joined__lt=expiration_time,  # Older than 24 hours
         password__startswith=UNUSABLE_PASSWORD_PREFIX,  # No password set (raw password is unusable before set_password)
-        date_joined__lt=expiration_time  # Older than 24 hours
-    )
+    ).order_by('pk')
+
+    count = 0
+    last_pk = 0
+    connection = get_connection()
+    connection.open()
+    try:
+        while True:
+            with transaction.atomic():
+                users = list(
+                    expired_users.filter(pk__gt=last_pk)
+                    .select_for_update(skip_locked=True)
+                    .only('pk', 'email', 'first_name', 'date_joined')[:batch_size]
+                )
+                if not users:
+                    break
+
+                connection.send_messages([_expiry_message(u, connection) for u in users])
+                User.objects.filter(pk__in=[u.pk for u in users]).delete()
 
-    # Print users for testing
-    for u in expired_users:
-        subject = 'Activation Link Expired'
-        message = (
-            f"Hi {u.first_name},\n\n"
-            "Your activation link has expired. Please signup again to create a new account.\n\n"
-            "Ignore this message if you already activated your account."
-        )
-        send_mail(subject, message, settings.EMAIL_HOST_USER, [u.email])
+            for u in users:
+                print(f"[CLEANUP] Expired user notified: {u.email}, joined at {u.date_joined}")
 
-        print(f"[CLEANUP] Expired user notified: {u.email}, joined at {u.date_joined}")
+            count += len(users)
+            last_pk = users[-1].pk
+            if len(users) < batch_size:
+                break
+    finally:
+        connection.close()
 
-    count = expired_users.count()
-    expired_users.delete()  # Bulk delete
     print(f"[CLEANUP] Total expired users deleted: {count}")
 
     return f"Deleted {count} expired unactivated users."  # For logging
@@ -1,3 +1,99 @@
-from django.test import TestCase
+import io
+from contextlib import redirect_stdout
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from src.users.backends import CachedModelBackend
+from src.users.models import User
+from src.users.task import cleanup_expired_users
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', USER_EXPIRATION_HOURS=24)
+class ExpiredUserCleanupTests(TestCase):
+    """
+        Unactivated accounts past their activation window are mailed once and deleted, chunk by chunk.
+        """
+
+    def create(self, email, age, **kwargs):
+        return User.objects.create_user(email=email, password=None, first_name=email.split('@')[0],
+                                        last_name='User', is_active=False,
+                                        date_joined=timezone.now() - age, **kwargs)
+
+    def test_expired_users_are_notified_over_one_connection_and_deleted(self):
+        expired = [self.create(f"expired{i}@example.com", timedelta(hours=30)) for i in range(5)]
+        fresh = self.create('fresh@example.com', timedelta(hours=1))
+        activated = self.create('activated@example.com', timedelta(hours=30))
+        activated.set_password('a-real-password')
+        activated.save()
+
+        connections = []
+
+        def connection_factory(*args, **kwargs):
+            connection = get_connection(*args, **kwargs)
+            connection.send_messages = mock.Mock(wraps=connection.send_messages)
+            connections.append(connection)
+            return connection
+
+        with mock.patch('src.users.task.get_connection', connection_factory), redirect_stdout(io.StringIO()):
+            result = cleanup_expired_users(batch_size=2)
+
+        self.assertEqual(result, "Deleted 5 expired unactivated users.")
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), sorted(u.email for u in expired))
+        self.assertEqual(len(connections), 1)
+        self.assertEqual([len(call.args[0]) for call in connections[0].send_messages.call_args_list], [2, 2, 1])
+        self.assertFalse(User.objects.filter(pk__in=[u.pk for u in expired]).exists())
+        self.assertEqual(set(User.objects.filter(pk__in=[fresh.pk, activated.pk]).values_list('pk', flat=True)),
+                         {fresh.pk, activated.pk})
+
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(cleanup_expired_users(batch_size=2), "Deleted 0 expired unactivated users.")
+        self.assertEqual(len(mail.outbox), 5)
+
+
+class CachedModelBackendTests(TestCase):
+    """
+        Session users and their permission sets come from the cache until the user, a group or a permission changes.
+        """
+
+    def setUp(self):
+        cache.clear()
+        self.backend = CachedModelBackend()
+        self.group = Group.objects.create(name='Cached Editors')
+        self.group.permissions.add(Permission.objects.get(codename='add_book'))
+        self.user = User.objects.create_user(email='cached@example.com', password=None, first_name='Cached',
+                                             last_name='User')
+        self.user.groups.add(self.group)
+
+    def test_warm_user_and_permissions_cost_no_queries(self):
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm('books.add_book'))
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertTrue(user.has_perm('books.add_book'))
+            self.assertFalse(user.has_perm('books.delete_book'))
+
+    def test_user_and_group_changes_invalidate_the_cache(self):
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('books.delete_book'))
+        self.group.permissions.add(Permission.objects.get(codename='delete_book'))
+        self.assertTrue(self.backend.get_user(self.user.pk).has_perm('books.delete_book'))
+
+        self.user.groups.remove(self.group)
+        self.assertFalse(self.backend.get_user(self.user.pk).has_perm('books.add_book'))
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, 'Renamed')
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_sessions_from_before_the_cached_backend_stay_signed_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get('/')
+        self.assertEqual(response.wsgi_request.user, self.user)
@@ -8,7 +8,7 @@ from django.views import View
 
 from src.users.form import UserForm, LoginForm, SetPasswordForm
 from .models import User
-from .task import send_activation_email
+from .task import queue_activation_email
 from .utils import AccountActivationTokenGenerator
 
 
@@ -30,12 +30,8 @@ class UserCreateView(View):
                     user.is_active = False
                     user.save()
 
-                    # Try enqueue task
-                    try:
-                        send_activation_email.delay(user.email)
-                    except Exception as e:
-                        # Log the error but don't prevent signup
-                        print("Could not enqueue activation email:", e)
+                    # Buffered in the email outbox with this transaction; flush-email-outbox delivers it
+                    queue_activation_email(user)
 
                 return redirect('password_reset_done')
             except Exception as e: